@@ -0,0 +1,37 @@
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import yaml
+
+CONFIG_PATH = Path(__file__).parent / 'config.yaml'
+
+_ENV_REFERENCE = re.compile(r"\$\{(\w+)\}")
+
+def _expand(value: Any) -> Any:
+    """Replace ${VAR} references in strings with environment variables."""
+    if isinstance(value, str):
+        return _ENV_REFERENCE.sub(lambda m: os.environ.get(m.group(1), m.group(0)), value)
+    if isinstance(value, dict):
+        return {key: _expand(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_expand(item) for item in value]
+    return value
+
+def load_config(path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Load the application configuration.
+
+    Args:
+        path: Configuration file (default: STASIS_CONFIG_PATH, then
+            config/config.yaml)
+
+    Returns:
+        Dict[str, Any]: Configuration with ${VAR} references expanded
+    """
+    config_path = Path(path or os.environ.get('STASIS_CONFIG_PATH') or CONFIG_PATH)
+    if not config_path.exists():
+        return {}
+    with open(config_path, 'r') as f:
+        return _expand(yaml.safe_load(f) or {})
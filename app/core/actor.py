@@ -1,13 +1,52 @@
-from dataclasses import dataclass, field
+import json
+from dataclasses import dataclass, field, fields
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple, Union
 from uuid import UUID, uuid4
 
 from .metadata import Metadata
-from .reference import Reference
-from .validation import validate_actor_data
+from .reference import Reference, last_key_change
+from .serialization import (
+    as_uuid,
+    intern,
+    intern_items,
+    intern_list,
+    load_uuid,
+    loads,
+    parse_datetime,
+    parse_optional_datetime,
+)
+from .tracking import SLOTS, next_stamp, track
+from .validation import (
+    ACTOR_SECTIONS,
+    ValidationPolicy,
+    current_policy,
+    validate_actor_data,
+    validate_actor_section,
+    validation_policy,
+)
 
-@dataclass
+# Schema section each field is serialized into. Fields missing here (name,
+# references, uuid) are not covered by a section schema.
+FIELD_SECTIONS = {
+    "actor_id": "identification",
+    "aliases": "identification",
+    "first_observed": "identification",
+    "last_observed": "identification",
+    "confidence_level": "identification",
+    "capability_level": "technical",
+    "tools_malware": "technical",
+    "infrastructure": "technical",
+    "target_sectors": "behavioral",
+    "geographic_targeting": "behavioral",
+    "attack_patterns": "behavioral",
+    "motivation": "strategic",
+    "goals": "strategic",
+    "relationships": "strategic",
+    "metadata": "metadata",
+}
+
+@dataclass(**SLOTS)
 class ThreatActor:
     """
     Core threat actor class representing a single threat actor entity.
@@ -16,7 +55,7 @@ class ThreatActor:
     name: str
     metadata: Metadata
     references: List[Reference] = field(default_factory=list)
-    uuid: UUID = field(default_factory=uuid4)
+    uuid: Union[UUID, bytes] = field(default_factory=uuid4)
     
     # Core identification
     aliases: List[str] = field(default_factory=list)
@@ -39,24 +78,191 @@ class ThreatActor:
     goals: List[str] = field(default_factory=list)
     relationships: List[Dict] = field(default_factory=list)
 
+    # Serialization caches: section dicts that are still current, the last
+    # to_json_bytes() output with the stamp it was built at, and the stamp of
+    # the last change to the actor's own fields.
+    _sections: Dict[str, Dict] = field(default_factory=dict, init=False, repr=False, compare=False)
+    _json: Optional[Tuple[int, bytes]] = field(default=None, init=False, repr=False, compare=False)
+    _stamp: int = field(default=0, init=False, repr=False, compare=False)
+    # References by content_key, built on first use, and the stamp it was
+    # built at: a later content_key change of any indexed reference (see
+    # reference.last_key_change()) makes it stale.
+    _reference_index: Optional[Dict[str, Reference]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _reference_stamp: int = field(default=0, init=False, repr=False, compare=False)
+    # (metadata version, checksum) of the stored record the actor was
+    # loaded from or saved as, for compare-and-swap saves to a shared
+    # ActorDatabase; None for an actor that was never stored.
+    _stored: Optional[Tuple[str, str]] = field(default=None, init=False, repr=False, compare=False)
+
+    def __setattr__(self, name: str, value) -> None:
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+            return
+        # Lists and dicts are wrapped so in-place changes (e.g. appends from
+        # EnrichmentService) invalidate the caches as well.
+        section = FIELD_SECTIONS.get(name, "references" if name == "references" else None)
+        object.__setattr__(self, name, track(value, self, section))
+        self._touch(section)
+
+    def _touch(self, section: Optional[str] = None) -> None:
+        """Mark a section, and the serialized actor, as changed."""
+        sections = getattr(self, "_sections", None)
+        if sections is None:
+            return
+        if section is not None:
+            sections.pop(section, None)
+        if section == "references":
+            object.__setattr__(self, "_reference_index", None)
+        object.__setattr__(self, "_stamp", next_stamp())
+
+    def __getstate__(self) -> Dict:
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.init}
+
+    def __setstate__(self, state: Dict) -> None:
+        self._sections = {}
+        self._json = None
+        self._reference_index = None
+        self._stored = None
+        for name, value in state.items():
+            setattr(self, name, value)
+
     def __post_init__(self):
-        """Validate actor data against schema after initialization."""
-        validate_actor_data(self.to_dict())
+        """
+        Validate actor data against schema after initialization, following
+        the active validation_policy().
+        """
+        if current_policy() is not ValidationPolicy.TRUSTED:
+            validate_actor_data(self.to_dict())
+
+    @classmethod
+    def from_dict(cls, data: Dict,
+                  policy: Optional[Union[ValidationPolicy, str]] = None,
+                  compact_uuids: bool = False) -> "ThreatActor":
+        """
+        Rebuild a threat actor from to_dict() output.
+
+        Vocabulary values (capability level, motivation, sectors, technique
+        IDs, tool and relationship types) are interned so actors share them.
+
+        Args:
+            data: Threat actor dictionary
+            policy: Validation policy for construction (default: the active
+                validation_policy())
+            compact_uuids: Keep UUIDs as 16 raw bytes instead of UUID objects
+
+        Returns:
+            ThreatActor: Rebuilt actor
+        """
+        identification = data["core_identification"]
+        technical = data["technical_profile"]
+        behavioral = data["behavioral_analysis"]
+        strategic = data["strategic_context"]
+
+        values = {
+            "actor_id": data["actor_id"],
+            "name": data["name"],
+            "metadata": Metadata.from_dict(data["metadata"]),
+            "references": [
+                Reference.from_dict(ref, compact_uuids) for ref in data.get("references", [])
+            ],
+            "aliases": identification.get("aliases", []),
+            "first_observed": parse_datetime(identification["first_observed"]),
+            "last_observed": parse_optional_datetime(identification.get("last_observed")),
+            "confidence_level": identification.get("confidence_level", 0),
+            "capability_level": intern(technical.get("capability_level")),
+            "tools_malware": intern_items(technical.get("tools_malware", []), "type"),
+            "infrastructure": technical.get("infrastructure", {}),
+            "target_sectors": intern_list(behavioral.get("target_sectors", [])),
+            "geographic_targeting": behavioral.get("geographic_targeting", {}),
+            "attack_patterns": intern_items(
+                behavioral.get("attack_patterns", []), "technique_id", "technique_name", "tactic"
+            ),
+            "motivation": intern(strategic.get("motivation")),
+            "goals": strategic.get("goals", []),
+            "relationships": intern_items(
+                strategic.get("relationships", []), "related_actor", "relationship_type"
+            )
+        }
+        if data.get("uuid"):
+            values["uuid"] = load_uuid(data["uuid"], compact_uuids)
+
+        if policy is None:
+            return cls(**values)
+        with validation_policy(policy):
+            return cls(**values)
+
+    @classmethod
+    def from_json_bytes(cls, content: Union[bytes, str],
+                        policy: Optional[Union[ValidationPolicy, str]] = None,
+                        compact_uuids: bool = False) -> "ThreatActor":
+        """Rebuild a threat actor from to_json_bytes() output."""
+        return cls.from_dict(loads(content), policy, compact_uuids)
 
     def add_reference(self, reference: Reference) -> None:
-        """Add a new reference with validation."""
-        if reference not in self.references:
-            self.references.append(reference)
+        """
+        Add a new reference with validation.
+
+        A reference citing the same report as an existing one (same
+        content_key) is not added again; its fields_referenced are merged
+        into the existing reference instead.
+        """
+        if self._add_reference(reference):
             self._update_metadata()
 
-    def update_field(self, field_name: str, value: any, reference: Reference) -> None:
-        """Update a field with proper validation and reference tracking."""
+    def _add_reference(self, reference: Reference) -> bool:
+        """Add or merge a reference without a version bump; True if anything changed."""
+        index = self._references_by_key()
+        key = reference.content_key
+        existing = index.get(key)
+        if existing is None:
+            self.references.append(reference)
+            # The append invalidated the index; it only gained this entry.
+            index[key] = reference
+            reference._indexed = True
+            self._reference_index = index
+            return True
+
+        known = set(existing.fields_referenced)
+        new_fields = [f for f in reference.fields_referenced if f not in known]
+        if new_fields:
+            existing.fields_referenced.extend(new_fields)
+            return True
+        return False
+
+    def _references_by_key(self) -> Dict[str, Reference]:
+        """
+        Index of references by content_key, built on first use and again
+        after a held reference's source, url, date or title changed.
+        """
+        if self._reference_index is None or self._reference_stamp < last_key_change():
+            index = {}
+            for ref in self.references:
+                ref._indexed = True
+                index.setdefault(ref.content_key, ref)
+            self._reference_index = index
+            self._reference_stamp = next_stamp()
+        return self._reference_index
+
+    def update_field(self, field_name: str, value: any, reference: Reference,
+                     validate_all: bool = False) -> None:
+        """
+        Update a field with proper validation and reference tracking.
+
+        Only the schema section the field belongs to is re-serialized and
+        validated unless validate_all is set.
+        """
         if hasattr(self, field_name):
             old_value = getattr(self, field_name)
             setattr(self, field_name, value)
             
             try:
-                validate_actor_data(self.to_dict())
+                if validate_all:
+                    validate_actor_data(self.to_dict())
+                elif field_name in FIELD_SECTIONS:
+                    section = FIELD_SECTIONS[field_name]
+                    validate_actor_section(section, self.section_dict(section))
                 self.add_reference(reference)
             except ValueError as e:
                 setattr(self, field_name, old_value)
@@ -66,36 +272,128 @@ class ThreatActor:
         else:
             raise AttributeError(f"Field {field_name} does not exist")
 
+    def batch_update(self, updates: Dict[str, Any], reference: Reference,
+                     validate_all: bool = False) -> None:
+        """
+        Update several fields as one change.
+
+        Each affected schema section is validated once (or the whole actor
+        with validate_all), the reference is recorded once with the updated
+        fields merged into its fields_referenced, and the version is bumped
+        once. If validation (or setting a field) fails every field is
+        restored and nothing is recorded.
+
+        Args:
+            updates: New values by field name
+            reference: Reference for the update
+            validate_all: Validate the whole actor instead of the sections
+
+        Raises:
+            AttributeError: If a field does not exist
+            ValueError: If the updated actor fails validation
+        """
+        for field_name in updates:
+            if field_name.startswith("_") or not hasattr(self, field_name):
+                raise AttributeError(f"Field {field_name} does not exist")
+
+        old_values = {name: getattr(self, name) for name in updates}
+        try:
+            for field_name, value in updates.items():
+                setattr(self, field_name, value)
+            if validate_all:
+                validate_actor_data(self.to_dict())
+            else:
+                sections = {FIELD_SECTIONS[name] for name in updates if name in FIELD_SECTIONS}
+                for section in sorted(sections):
+                    validate_actor_section(section, self.section_dict(section))
+        except Exception as e:
+            # Whatever failed, no field keeps its new value.
+            for field_name, value in old_values.items():
+                setattr(self, field_name, value)
+            if isinstance(e, ValueError):
+                raise ValueError(f"Invalid batch update of {', '.join(updates)}: {str(e)}")
+            raise
+
+        known = set(reference.fields_referenced)
+        reference.fields_referenced.extend(name for name in updates if name not in known)
+        self._add_reference(reference)
+        self._update_metadata()
+
     def to_dict(self) -> Dict:
-        """Convert the threat actor to a dictionary format."""
-        return {
+        """
+        Convert the threat actor to a dictionary format.
+
+        Section dictionaries are cached until a field in that section
+        changes; nested lists and dicts are shared with the actor.
+        """
+        data = {
             "actor_id": self.actor_id,
             "name": self.name, 
-            "metadata": self.metadata.to_dict(),
+            "uuid": str(as_uuid(self.uuid)),
+            "metadata": self.section_dict("metadata"),
             "references": [ref.to_dict() for ref in self.references],
-            "core_identification": {
+        }
+        for key, section in ACTOR_SECTIONS.items():
+            if key not in data:
+                data[key] = self.section_dict(section)
+        return data
+
+    def to_json_bytes(self) -> bytes:
+        """
+        Serialize the actor to indented JSON, reusing the previous result
+        if nothing has changed since.
+        """
+        stamp = self._content_stamp()
+        if self._json is None or self._json[0] != stamp:
+            self._json = (stamp, json.dumps(self.to_dict(), indent=2).encode())
+        return self._json[1]
+
+    def _content_stamp(self) -> int:
+        """Latest change stamp across the actor, its metadata and references."""
+        return max(
+            self._stamp,
+            self.metadata._stamp,
+            max((ref._stamp for ref in self.references), default=0)
+        )
+
+    def section_dict(self, section: str) -> Dict:
+        """Convert a single schema section of the actor to dictionary format."""
+        if section == "metadata":
+            return self.metadata.to_dict()
+        cached = self._sections.get(section)
+        if cached is None:
+            cached = self._build_section(section)
+            self._sections[section] = cached
+        return dict(cached)
+
+    def _build_section(self, section: str) -> Dict:
+        if section == "identification":
+            return {
                 "actor_id": self.actor_id,
                 "aliases": self.aliases,
                 "first_observed": self.first_observed.isoformat(),
                 "last_observed": self.last_observed.isoformat() if self.last_observed else None,
                 "confidence_level": self.confidence_level
-            },
-            "technical_profile": {
+            }
+        elif section == "technical":
+            return {
                 "capability_level": self.capability_level,
                 "tools_malware": self.tools_malware,
                 "infrastructure": self.infrastructure
-            },
-            "behavioral_analysis": {
+            }
+        elif section == "behavioral":
+            return {
                 "target_sectors": self.target_sectors,
                 "geographic_targeting": self.geographic_targeting,
                 "attack_patterns": self.attack_patterns
-            },
-            "strategic_context": {
+            }
+        elif section == "strategic":
+            return {
                 "motivation": self.motivation,
                 "goals": self.goals,
                 "relationships": self.relationships
             }
-        }
+        raise KeyError(f"Unknown section {section}")
 
     def _update_metadata(self) -> None:
         """Update metadata when changes are made."""
@@ -105,7 +403,7 @@ class ThreatActor:
     def validate(self) -> bool:
         """Validate the entire threat actor object."""
         try:
-            validate_actor_data(self.to_dict())
+            validate_actor_data(self.to_dict(), ValidationPolicy.STRICT)
             return True
         except ValueError as e:
             raise ValueError(f"Validation failed: {str(e)}")
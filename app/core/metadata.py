@@ -1,8 +1,15 @@
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 from datetime import datetime
 from typing import Dict, List, Optional
 
-@dataclass
+from .serialization import intern, parse_datetime
+from .tracking import SLOTS, next_stamp, track
+
+# Revision history entries kept inline in an actor; older entries are
+# handed to the database's change journal.
+DEFAULT_HISTORY_LIMIT = 50
+
+@dataclass(**SLOTS)
 class Metadata:
     """
     Metadata class for tracking changes and versioning.
@@ -14,6 +21,80 @@ class Metadata:
     tlp_level: str = field(default="AMBER")
     confidence_score: int = field(default=0)
     revision_history: List[Dict] = field(default_factory=list)
+    history_limit: int = field(default=DEFAULT_HISTORY_LIMIT, repr=False, compare=False)
+
+    # Cached to_dict() output and the stamp of the last change.
+    _cache: Optional[Dict] = field(default=None, init=False, repr=False, compare=False)
+    _stamp: int = field(default=0, init=False, repr=False, compare=False)
+    # History entries trimmed from the inline tail that are not journaled yet.
+    _evicted: List[Dict] = field(default_factory=list, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self._trim_history()
+
+    def __setattr__(self, name: str, value) -> None:
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+            return
+        if name == "revision_history":
+            value = track(value, self)
+        object.__setattr__(self, name, value)
+        self._touch()
+        if name == "history_limit" and hasattr(self, "_evicted"):
+            self._trim_history()
+
+    def _touch(self, key: Optional[str] = None) -> None:
+        """Invalidate the cached dictionary after a change."""
+        object.__setattr__(self, "_cache", None)
+        object.__setattr__(self, "_stamp", next_stamp())
+
+    def __getstate__(self) -> Dict:
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.init}
+
+    def __setstate__(self, state: Dict) -> None:
+        self._evicted = []
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._cache = None
+
+    def _trim_history(self) -> None:
+        """Move entries beyond history_limit from the inline tail to _evicted."""
+        excess = len(self.revision_history) - max(self.history_limit, 0)
+        if excess > 0:
+            self._evicted.extend(self.revision_history[:excess])
+            del self.revision_history[:excess]
+
+    @property
+    def evicted_history(self) -> List[Dict]:
+        """History entries trimmed from the inline tail and not yet journaled."""
+        return list(self._evicted)
+
+    def pop_evicted_history(self) -> List[Dict]:
+        """
+        Take the history entries trimmed from the inline tail since the last
+        call, oldest first, for appending to a change journal.
+        """
+        evicted = self._evicted
+        self._evicted = []
+        return evicted
+
+    @classmethod
+    def from_dict(cls, data: Dict, history_limit: int = DEFAULT_HISTORY_LIMIT) -> "Metadata":
+        """
+        Rebuild metadata from to_dict() output. A revision history longer
+        than history_limit (e.g. saved before the limit existed) is trimmed,
+        and the older entries are kept for the journal.
+        """
+        return cls(
+            created=parse_datetime(data["created"]),
+            modified=parse_datetime(data["modified"]),
+            version=data.get("version", "1.0.0"),
+            creator=intern(data.get("creator", "STASIS")),
+            tlp_level=intern(data.get("tlp_level", "AMBER")),
+            confidence_score=data.get("confidence_score", 0),
+            revision_history=data.get("revision_history", []),
+            history_limit=history_limit
+        )
 
     def version_update(self, update_type: str) -> None:
         """
@@ -38,15 +119,23 @@ class Metadata:
             "timestamp": datetime.now().isoformat(),
             "type": update_type
         })
+        self._trim_history()
 
     def to_dict(self) -> Dict:
-        """Convert metadata to dictionary format."""
-        return {
-            "created": self.created.isoformat(),
-            "modified": self.modified.isoformat(),
-            "version": self.version,
-            "creator": self.creator,
-            "tlp_level": self.tlp_level,
-            "confidence_score": self.confidence_score,
-            "revision_history": self.revision_history
-        }
+        """
+        Convert metadata to dictionary format.
+
+        The result is cached until a field changes; nested lists are shared
+        with the object.
+        """
+        if self._cache is None:
+            self._cache = {
+                "created": self.created.isoformat(),
+                "modified": self.modified.isoformat(),
+                "version": self.version,
+                "creator": self.creator,
+                "tlp_level": self.tlp_level,
+                "confidence_score": self.confidence_score,
+                "revision_history": self.revision_history
+            }
+        return dict(self._cache)
@@ -1,9 +1,24 @@
-from dataclasses import dataclass, field
+import hashlib
+from dataclasses import dataclass, field, fields
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Union
 from uuid import UUID, uuid4
 
-@dataclass
+from .serialization import as_uuid, intern, intern_list, load_uuid, parse_datetime
+from .tracking import SLOTS, next_stamp, track
+
+# Fields that make up Reference.content_key.
+_KEY_FIELDS = ("source", "url", "date", "title")
+
+# Stamp of the last change to the content_key of a reference held in an
+# actor's reference index: indexes built before it are stale.
+_last_key_change = 0
+
+def last_key_change() -> int:
+    """Stamp of the last content_key change of an indexed reference (0 if none)."""
+    return _last_key_change
+
+@dataclass(**SLOTS)
 class Reference:
     """
     Reference class for tracking sources and citations.
@@ -11,7 +26,7 @@ class Reference:
     source: str
     url: Optional[str] = None
     date: datetime = field(default_factory=datetime.now)
-    reference_id: UUID = field(default_factory=uuid4)
+    reference_id: Union[UUID, bytes] = field(default_factory=uuid4)
     title: Optional[str] = None
     description: Optional[str] = None
     type: str = "external"
@@ -19,20 +34,91 @@ class Reference:
     tags: List[str] = field(default_factory=list)
     fields_referenced: List[str] = field(default_factory=list)
 
+    # Cached to_dict() output and the stamp of the last change.
+    _cache: Optional[Dict] = field(default=None, init=False, repr=False, compare=False)
+    _stamp: int = field(default=0, init=False, repr=False, compare=False)
+    # Whether an actor's reference index holds this reference by its
+    # content_key (see ThreatActor._references_by_key()).
+    _indexed: bool = field(default=False, init=False, repr=False, compare=False)
+
+    def __setattr__(self, name: str, value) -> None:
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+            return
+        if name in ("tags", "fields_referenced"):
+            value = track(value, self)
+        object.__setattr__(self, name, value)
+        self._touch()
+        if name in _KEY_FIELDS and getattr(self, "_indexed", False):
+            global _last_key_change
+            _last_key_change = next_stamp()
+
+    def _touch(self, key: Optional[str] = None) -> None:
+        """Invalidate the cached dictionary after a change."""
+        object.__setattr__(self, "_cache", None)
+        object.__setattr__(self, "_stamp", next_stamp())
+
+    def __getstate__(self) -> Dict:
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.init}
+
+    def __setstate__(self, state: Dict) -> None:
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._cache = None
+
+    @classmethod
+    def from_dict(cls, data: Dict, compact_uuids: bool = False) -> "Reference":
+        """
+        Rebuild a reference from to_dict() output.
+
+        Source, type, tag and field names are interned. With compact_uuids
+        the reference_id is kept as 16 raw bytes instead of a UUID object.
+        """
+        return cls(
+            source=intern(data["source"]),
+            url=data.get("url"),
+            date=parse_datetime(data["date"]),
+            reference_id=load_uuid(data["reference_id"], compact_uuids),
+            title=data.get("title"),
+            description=data.get("description"),
+            type=intern(data.get("type", "external")),
+            confidence=data.get("confidence", 0),
+            tags=intern_list(data.get("tags", [])),
+            fields_referenced=intern_list(data.get("fields_referenced", []))
+        )
+
+    @property
+    def content_key(self) -> str:
+        """
+        Key identifying the cited report: a hash of source, URL and day, as
+        in helpers.generate_reference_id. The title stands in for a missing
+        URL, and the time of day is ignored since dates default to now().
+        """
+        locator = self.url or self.title or ""
+        content = f"{self.source}{locator}{self.date.date().isoformat()}"
+        return hashlib.md5(content.encode()).hexdigest()
+
     def to_dict(self) -> Dict:
-        """Convert reference to dictionary format."""
-        return {
-            "reference_id": str(self.reference_id),
-            "source": self.source,
-            "url": self.url,
-            "date": self.date.isoformat(),
-            "title": self.title,
-            "description": self.description,
-            "type": self.type,
-            "confidence": self.confidence,
-            "tags": self.tags,
-            "fields_referenced": self.fields_referenced
-        }
+        """
+        Convert reference to dictionary format.
+
+        The result is cached until a field changes; nested lists are shared
+        with the object.
+        """
+        if self._cache is None:
+            self._cache = {
+                "reference_id": str(as_uuid(self.reference_id)),
+                "source": self.source,
+                "url": self.url,
+                "date": self.date.isoformat(),
+                "title": self.title,
+                "description": self.description,
+                "type": self.type,
+                "confidence": self.confidence,
+                "tags": self.tags,
+                "fields_referenced": self.fields_referenced
+            }
+        return dict(self._cache)
 
     def validate(self) -> bool:
         """Validate reference data."""
@@ -0,0 +1,452 @@
+import hashlib
+import itertools
+import json
+import os
+import re
+import tempfile
+from collections.abc import Mapping, Sequence
+from jsonschema import Draft7Validator
+from pathlib import Path
+from referencing import Registry
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urldefrag, urljoin
+
+COMPILER_VERSION = "1"
+
+CACHE_DIR = Path(__file__).parent.parent / 'data' / 'cache' / 'validators'
+
+# Keywords that only annotate a schema and never fail validation. "format" is
+# included because validators are built without a format checker.
+_ANNOTATIONS = {
+    "$schema", "$id", "$comment", "title", "description", "default", "examples",
+    "definitions", "format", "contentEncoding", "contentMediaType", "readOnly",
+    "writeOnly", "version",
+}
+
+# Validation keywords the compiler knows how to translate.
+_KEYWORDS = {
+    "type", "enum", "const", "required", "properties", "patternProperties",
+    "additionalProperties", "minProperties", "maxProperties", "dependencies",
+    "propertyNames", "items", "additionalItems", "minItems", "maxItems",
+    "uniqueItems", "contains", "minLength", "maxLength", "pattern",
+    "minimum", "maximum", "exclusiveMinimum", "exclusiveMaximum",
+    "allOf", "anyOf", "oneOf", "not", "if", "then", "else",
+}
+
+_TYPE_CHECKS = {
+    "string": "isinstance({v}, str)",
+    "object": "isinstance({v}, dict)",
+    "array": "isinstance({v}, list)",
+    "boolean": "isinstance({v}, bool)",
+    "null": "{v} is None",
+    "number": "(isinstance({v}, (int, float)) and not isinstance({v}, bool))",
+    "integer": "((isinstance({v}, int) and not isinstance({v}, bool))"
+               " or (isinstance({v}, float) and {v}.is_integer()))",
+}
+
+class UnsupportedSchema(Exception):
+    """Raised when a schema uses a construct the compiler cannot translate."""
+
+def _unbool(value, true=object(), false=object()):
+    if value is True:
+        return true
+    elif value is False:
+        return false
+    return value
+
+def _equal(one, two) -> bool:
+    """JSON equality that keeps booleans distinct from 0 and 1."""
+    if one is two:
+        return True
+    if isinstance(one, str) or isinstance(two, str):
+        return one == two
+    if isinstance(one, Sequence) and isinstance(two, Sequence):
+        return len(one) == len(two) and all(_equal(i, j) for i, j in zip(one, two))
+    if isinstance(one, Mapping) and isinstance(two, Mapping):
+        return one.keys() == two.keys() and all(_equal(one[k], two[k]) for k in one)
+    return _unbool(one) == _unbool(two)
+
+def _unique(items) -> bool:
+    seen = []
+    for item in items:
+        if any(_equal(item, other) for other in seen):
+            return False
+        seen.append(item)
+    return True
+
+class _Compiler:
+    """
+    Translates one schema and everything it references into Python source.
+
+    Every subschema becomes a function returning True when the instance is
+    valid. Referenced schemas are compiled once per resolved URI, which also
+    makes recursive references work.
+    """
+    def __init__(self, registry: Registry):
+        self.registry = registry
+        self.counter = itertools.count()
+        self.constants: List[str] = []
+        self.functions: List[str] = []
+        self.refs: Dict[str, str] = {}
+
+    def _name(self, prefix: str) -> str:
+        return f"_{prefix}{next(self.counter)}"
+
+    def _constant(self, value: Any) -> str:
+        name = self._name("c")
+        if isinstance(value, frozenset):
+            # Sorted so generated source is identical from run to run.
+            self.constants.append(f"{name} = frozenset({sorted(value)!r})")
+        else:
+            self.constants.append(f"{name} = {value!r}")
+        return name
+
+    def _pattern(self, pattern: str) -> str:
+        name = self._name("re")
+        self.constants.append(f"{name} = re.compile({pattern!r})")
+        return name
+
+    def _ref(self, ref: str, base_uri: str) -> str:
+        uri = urljoin(base_uri, ref)
+        if uri not in self.refs:
+            resolved = self.registry.resolver(base_uri).lookup(ref)
+            name = self._name("ref")
+            self.refs[uri] = name
+            self.function(resolved.contents, urldefrag(uri).url, name)
+        return self.refs[uri]
+
+    def function(self, schema: Any, base_uri: str, name: Optional[str] = None) -> Optional[str]:
+        """
+        Compile a schema into a function and return its name, or None when
+        the schema accepts everything and no call is needed.
+        """
+        if schema is True or (isinstance(schema, dict) and not schema):
+            if name is None:
+                return None
+            self.functions.append(f"def {name}(data):\n    return True\n")
+            return name
+        if schema is False:
+            name = name or self._name("v")
+            self.functions.append(f"def {name}(data):\n    return False\n")
+            return name
+        if not isinstance(schema, dict):
+            raise UnsupportedSchema(f"Schema must be an object or boolean: {schema!r}")
+
+        if "$ref" in schema:
+            # Draft 7 ignores keywords next to $ref.
+            target = self._ref(schema["$ref"], base_uri)
+            if name is None:
+                return target
+            self.functions.append(f"def {name}(data):\n    return {target}(data)\n")
+            return name
+
+        if "$id" in schema:
+            base_uri = urljoin(base_uri, schema["$id"])
+
+        name = name or self._name("v")
+        body = self._body(schema, base_uri)
+        self.functions.append(
+            f"def {name}(data):\n" + "".join(f"    {line}\n" for line in body) + "    return True\n"
+        )
+        return name
+
+    def _body(self, schema: Dict, base_uri: str) -> List[str]:
+        # Keywords jsonschema doesn't know are ignored by both paths.
+        unsupported = (set(schema) - _ANNOTATIONS - _KEYWORDS) & set(Draft7Validator.VALIDATORS)
+        if unsupported:
+            raise UnsupportedSchema(f"Unsupported keywords: {sorted(unsupported)}")
+
+        body = []
+
+        if "type" in schema:
+            types = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+            if any(t not in _TYPE_CHECKS for t in types):
+                raise UnsupportedSchema(f"Unsupported type: {schema['type']!r}")
+            check = " or ".join(_TYPE_CHECKS[t].format(v="data") for t in types)
+            body.append(f"if not ({check}):")
+            body.append("    return False")
+
+        if "enum" in schema:
+            values = schema["enum"]
+            if all(isinstance(v, str) for v in values):
+                enum = self._constant(frozenset(values))
+                body.append(f"if not (isinstance(data, str) and data in {enum}):")
+            else:
+                enum = self._constant(values)
+                body.append(f"if not any(_equal(data, value) for value in {enum}):")
+            body.append("    return False")
+
+        if "const" in schema:
+            const = self._constant(schema["const"])
+            body.append(f"if not _equal(data, {const}):")
+            body.append("    return False")
+
+        body.extend(self._object(schema, base_uri))
+        body.extend(self._array(schema, base_uri))
+        body.extend(self._string(schema))
+        body.extend(self._number(schema))
+        body.extend(self._combinators(schema, base_uri))
+        return body
+
+    def _object(self, schema: Dict, base_uri: str) -> List[str]:
+        lines = []
+        for key in schema.get("required", []):
+            lines.append(f"if {key!r} not in data:")
+            lines.append("    return False")
+
+        properties = schema.get("properties", {})
+        for key, subschema in properties.items():
+            check = self.function(subschema, base_uri)
+            if check:
+                lines.append(f"if {key!r} in data and not {check}(data[{key!r}]):")
+                lines.append("    return False")
+
+        patterns = [
+            (self._pattern(pattern), self.function(subschema, base_uri))
+            for pattern, subschema in schema.get("patternProperties", {}).items()
+        ]
+        additional = schema.get("additionalProperties", True)
+        if patterns or additional is not True:
+            known = self._constant(frozenset(properties))
+            lines.append("for key, value in data.items():")
+            if patterns:
+                lines.append("    matched = False")
+                for regex, check in patterns:
+                    lines.append(f"    if {regex}.search(key):")
+                    lines.append("        matched = True")
+                    if check:
+                        lines.append(f"        if not {check}(value):")
+                        lines.append("            return False")
+                extra = f"key not in {known} and not matched"
+            else:
+                extra = f"key not in {known}"
+            if additional is False:
+                lines.append(f"    if {extra}:")
+                lines.append("        return False")
+            elif additional is not True:
+                check = self.function(additional, base_uri)
+                if check:
+                    lines.append(f"    if {extra} and not {check}(value):")
+                    lines.append("        return False")
+
+        if "minProperties" in schema:
+            lines.append(f"if len(data) < {schema['minProperties']!r}:")
+            lines.append("    return False")
+        if "maxProperties" in schema:
+            lines.append(f"if len(data) > {schema['maxProperties']!r}:")
+            lines.append("    return False")
+
+        for key, dependency in schema.get("dependencies", {}).items():
+            if isinstance(dependency, list):
+                missing = " or ".join(f"{d!r} not in data" for d in dependency)
+                if missing:
+                    lines.append(f"if {key!r} in data and ({missing}):")
+                    lines.append("    return False")
+            else:
+                check = self.function(dependency, base_uri)
+                if check:
+                    lines.append(f"if {key!r} in data and not {check}(data):")
+                    lines.append("    return False")
+
+        if "propertyNames" in schema:
+            check = self.function(schema["propertyNames"], base_uri)
+            if check:
+                lines.append(f"if not all({check}(key) for key in data):")
+                lines.append("    return False")
+
+        return self._guard("isinstance(data, dict)", lines)
+
+    def _array(self, schema: Dict, base_uri: str) -> List[str]:
+        lines = []
+        items = schema.get("items", True)
+        if isinstance(items, list):
+            for index, subschema in enumerate(items):
+                check = self.function(subschema, base_uri)
+                if check:
+                    lines.append(f"if len(data) > {index} and not {check}(data[{index}]):")
+                    lines.append("    return False")
+            check = self.function(schema.get("additionalItems", True), base_uri)
+            if check:
+                lines.append(f"for item in data[{len(items)}:]:")
+                lines.append(f"    if not {check}(item):")
+                lines.append("        return False")
+        else:
+            check = self.function(items, base_uri)
+            if check:
+                lines.append("for item in data:")
+                lines.append(f"    if not {check}(item):")
+                lines.append("        return False")
+
+        if "minItems" in schema:
+            lines.append(f"if len(data) < {schema['minItems']!r}:")
+            lines.append("    return False")
+        if "maxItems" in schema:
+            lines.append(f"if len(data) > {schema['maxItems']!r}:")
+            lines.append("    return False")
+        if schema.get("uniqueItems"):
+            lines.append("if not _unique(data):")
+            lines.append("    return False")
+        if "contains" in schema:
+            check = self.function(schema["contains"], base_uri)
+            if check:
+                lines.append(f"if not any({check}(item) for item in data):")
+            else:
+                lines.append("if not data:")
+            lines.append("    return False")
+
+        return self._guard("isinstance(data, list)", lines)
+
+    def _string(self, schema: Dict) -> List[str]:
+        lines = []
+        if "minLength" in schema:
+            lines.append(f"if len(data) < {schema['minLength']!r}:")
+            lines.append("    return False")
+        if "maxLength" in schema:
+            lines.append(f"if len(data) > {schema['maxLength']!r}:")
+            lines.append("    return False")
+        if "pattern" in schema:
+            lines.append(f"if not {self._pattern(schema['pattern'])}.search(data):")
+            lines.append("    return False")
+        return self._guard("isinstance(data, str)", lines)
+
+    def _number(self, schema: Dict) -> List[str]:
+        lines = []
+        bounds = (
+            ("minimum", "<"), ("maximum", ">"),
+            ("exclusiveMinimum", "<="), ("exclusiveMaximum", ">="),
+        )
+        for keyword, operator in bounds:
+            if keyword in schema:
+                lines.append(f"if data {operator} {schema[keyword]!r}:")
+                lines.append("    return False")
+        return self._guard(_TYPE_CHECKS["number"].format(v="data"), lines)
+
+    def _combinators(self, schema: Dict, base_uri: str) -> List[str]:
+        lines = []
+        for subschema in schema.get("allOf", []):
+            check = self.function(subschema, base_uri)
+            if check:
+                lines.append(f"if not {check}(data):")
+                lines.append("    return False")
+
+        if "anyOf" in schema:
+            checks = [self.function(s, base_uri) for s in schema["anyOf"]]
+            if all(checks):
+                lines.append(f"if not ({' or '.join(f'{c}(data)' for c in checks)}):")
+                lines.append("    return False")
+
+        if "oneOf" in schema:
+            checks = [self.function(s, base_uri) for s in schema["oneOf"]]
+            calls = ", ".join(f"{c}(data)" if c else "True" for c in checks)
+            lines.append(f"if sum(({calls},)) != 1:")
+            lines.append("    return False")
+
+        if "not" in schema:
+            check = self.function(schema["not"], base_uri)
+            lines.append(f"if {check}(data):" if check else "if True:")
+            lines.append("    return False")
+
+        if "if" in schema:
+            condition = self.function(schema["if"], base_uri)
+            then = self.function(schema.get("then", True), base_uri)
+            otherwise = self.function(schema.get("else", True), base_uri)
+            if then or otherwise:
+                lines.append(f"if {f'{condition}(data)' if condition else 'True'}:")
+                lines.append(f"    if {'not ' + then + '(data)' if then else 'False'}:")
+                lines.append("        return False")
+                lines.append(f"elif {'not ' + otherwise + '(data)' if otherwise else 'False'}:")
+                lines.append("    return False")
+        return lines
+
+    @staticmethod
+    def _guard(condition: str, lines: List[str]) -> List[str]:
+        if not lines:
+            return []
+        return [f"if {condition}:"] + [f"    {line}" for line in lines]
+
+def generate_source(schema_name: str, schema: Dict, registry: Registry) -> str:
+    """
+    Generate Python source for a module exposing validate(data) -> bool.
+
+    Raises:
+        UnsupportedSchema: If the schema uses a construct that cannot be compiled
+    """
+    compiler = _Compiler(registry)
+    entry = compiler.function(schema, schema.get("$id", ""), compiler._name("v"))
+    return "\n".join([
+        f"# Generated from schema '{schema_name}' by core.schema_compiler. Do not edit.",
+        "",
+        *compiler.constants,
+        "",
+        *compiler.functions,
+        f"validate = {entry}",
+        "",
+    ])
+
+def schema_digest(schemas: Dict[str, Dict]) -> str:
+    """Hash schema contents together with the compiler version."""
+    content = json.dumps(schemas, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{COMPILER_VERSION}:{content}".encode()).hexdigest()
+
+def load_validator(schema_name: str, schema: Dict, registry: Registry, digest: str,
+                   cache_dir: Optional[Path] = None) -> Callable[[Any], bool]:
+    """
+    Load a compiled validator from the disk cache, generating it on a miss.
+
+    Args:
+        schema_name: Name of the schema
+        schema: Schema contents
+        registry: Registry used to resolve $ref links
+        digest: Hash of the schema contents (see schema_digest)
+        cache_dir: Directory holding generated modules
+
+    Returns:
+        Callable[[Any], bool]: Function returning True for valid data
+
+    Raises:
+        UnsupportedSchema: If the schema uses a construct that cannot be compiled
+    """
+    cache_dir = Path(cache_dir) if cache_dir else CACHE_DIR
+    path = cache_dir / f"{schema_name}-{digest[:16]}.py"
+
+    if path.exists():
+        source = path.read_text()
+    else:
+        source = generate_source(schema_name, schema, registry)
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                f.write(source)
+            os.replace(tmp_path, path)
+        except OSError:
+            # The cache is an optimization; compile in memory if it can't be written.
+            pass
+
+    namespace = {"re": re, "_equal": _equal, "_unique": _unique}
+    exec(compile(source, str(path), "exec"), namespace)
+    return namespace["validate"]
+
+def build_validators(registry=None, cache_dir: Optional[Path] = None) -> Dict[str, bool]:
+    """
+    Compile the validator for every actor section ahead of time.
+
+    Returns:
+        Dict[str, bool]: Section name mapped to whether it could be compiled
+    """
+    from .validation import SECTION_SCHEMAS, get_schema_registry
+
+    registry = registry or get_schema_registry()
+    if cache_dir:
+        # Through configure(), so validators already compiled in memory are
+        # compiled again and written to the new cache.
+        registry.configure(schema_dir=registry.schema_dir, cache_dir=Path(cache_dir),
+                           compile_validators=registry.compile_validators)
+    return {
+        section: registry.compiled(section) is not None
+        for section in SECTION_SCHEMAS
+    }
+
+if __name__ == "__main__":
+    for section, compiled in build_validators().items():
+        print(f"{section}: {'compiled' if compiled else 'jsonschema fallback'}")
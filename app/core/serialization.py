@@ -0,0 +1,67 @@
+import json
+import sys
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Union
+from uuid import UUID
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+@lru_cache(maxsize=65536)
+def parse_datetime(value: str) -> datetime:
+    """
+    Parse an ISO 8601 timestamp as written by isoformat().
+
+    Results are cached; stored actors repeat the same timestamps (reference
+    dates, observation dates) many times.
+    """
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def parse_optional_datetime(value: Optional[str]) -> Optional[datetime]:
+    """Parse an ISO 8601 timestamp that may be missing."""
+    return parse_datetime(value) if value else None
+
+def loads(content: Union[bytes, str]) -> Any:
+    """Decode JSON, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+def intern(value: Any) -> Any:
+    """
+    Intern a string so equal values share one object. Anything else is
+    returned unchanged.
+    """
+    return sys.intern(value) if type(value) is str else value
+
+def intern_list(values: Iterable) -> List:
+    """Intern every string in a list of vocabulary terms."""
+    return [intern(value) for value in values]
+
+def intern_items(items: List[Dict], *keys: str) -> List[Dict]:
+    """
+    Intern the given vocabulary keys of every dict in a list, in place
+    (values only change identity, never content).
+    """
+    for item in items:
+        if isinstance(item, dict):
+            for key in keys:
+                value = item.get(key)
+                if type(value) is str:
+                    item[key] = sys.intern(value)
+    return items
+
+def load_uuid(value: str, compact: bool = False) -> Union[UUID, bytes]:
+    """
+    Parse a UUID string, as its 16 raw bytes when compact is set. The bytes
+    form takes about half the memory of a UUID object.
+    """
+    uuid = UUID(value)
+    return uuid.bytes if compact else uuid
+
+def as_uuid(value: Union[UUID, bytes]) -> UUID:
+    """Return a UUID for a value stored by load_uuid()."""
+    return value if isinstance(value, UUID) else UUID(bytes=value)
@@ -0,0 +1,163 @@
+import itertools
+import sys
+from typing import Any, Optional
+
+# dataclass() options for the core model classes: __slots__ instead of a
+# per-instance __dict__ where the interpreter supports it (3.10+).
+SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+# Every change anywhere gets a larger stamp than all earlier changes, so the
+# highest stamp over an actor and its parts moves whenever any of them does.
+_stamps = itertools.count(1)
+
+def next_stamp() -> int:
+    """Get a new, globally increasing change stamp."""
+    return next(_stamps)
+
+def track(value: Any, owner: Any, key: Optional[str] = None) -> Any:
+    """
+    Wrap lists and dicts (recursively) so mutating them calls
+    owner._touch(key). Other values are returned unchanged.
+    """
+    if isinstance(value, list):
+        if type(value) is TrackedList and value._owner is owner and value._key == key:
+            return value
+        return TrackedList(value, owner, key)
+    if isinstance(value, dict):
+        if type(value) is TrackedDict and value._owner is owner and value._key == key:
+            return value
+        return TrackedDict(value, owner, key)
+    return value
+
+class TrackedList(list):
+    """
+    List that reports in-place changes to the object holding it, so direct
+    appends invalidate cached serializations like assignments do.
+    """
+    __slots__ = ("_owner", "_key")
+
+    def __init__(self, iterable=(), owner: Any = None, key: Optional[str] = None):
+        super().__init__([
+            track(value, owner, key) if isinstance(value, (list, dict)) else value
+            for value in iterable
+        ])
+        self._owner = owner
+        self._key = key
+
+    def _changed(self) -> None:
+        if self._owner is not None:
+            self._owner._touch(self._key)
+
+    def __reduce_ex__(self, protocol):
+        # Copies and pickles are plain lists, detached from the owner.
+        return (list, (list(self),))
+
+    def append(self, value):
+        super().append(track(value, self._owner, self._key))
+        self._changed()
+
+    def extend(self, values):
+        super().extend(track(value, self._owner, self._key) for value in values)
+        self._changed()
+
+    def insert(self, index, value):
+        super().insert(index, track(value, self._owner, self._key))
+        self._changed()
+
+    def remove(self, value):
+        super().remove(value)
+        self._changed()
+
+    def pop(self, index=-1):
+        value = super().pop(index)
+        self._changed()
+        return value
+
+    def clear(self):
+        super().clear()
+        self._changed()
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self._changed()
+
+    def reverse(self):
+        super().reverse()
+        self._changed()
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            value = [track(v, self._owner, self._key) for v in value]
+        else:
+            value = track(value, self._owner, self._key)
+        super().__setitem__(index, value)
+        self._changed()
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._changed()
+
+    def __iadd__(self, values):
+        self.extend(values)
+        return self
+
+    def __imul__(self, count):
+        super().__imul__(count)
+        self._changed()
+        return self
+
+class TrackedDict(dict):
+    """Dict counterpart of TrackedList."""
+    __slots__ = ("_owner", "_key")
+
+    def __init__(self, mapping=(), owner: Any = None, key: Optional[str] = None):
+        if not isinstance(mapping, dict):
+            mapping = dict(mapping)
+        super().__init__({
+            k: track(v, owner, key) if isinstance(v, (list, dict)) else v
+            for k, v in mapping.items()
+        })
+        self._owner = owner
+        self._key = key
+
+    def _changed(self) -> None:
+        if self._owner is not None:
+            self._owner._touch(self._key)
+
+    def __reduce_ex__(self, protocol):
+        return (dict, (dict(self),))
+
+    def __setitem__(self, name, value):
+        super().__setitem__(name, track(value, self._owner, self._key))
+        self._changed()
+
+    def __delitem__(self, name):
+        super().__delitem__(name)
+        self._changed()
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        self._changed()
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        self._changed()
+        return item
+
+    def clear(self):
+        super().clear()
+        self._changed()
+
+    def update(self, *args, **kwargs):
+        super().update((k, track(v, self._owner, self._key)) for k, v in dict(*args, **kwargs).items())
+        self._changed()
+
+    def setdefault(self, name, default=None):
+        if name not in self:
+            self[name] = default
+        return super().__getitem__(name)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
@@ -1,59 +1,468 @@
+import hashlib
 import json
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from enum import Enum
 import jsonschema
+from jsonschema import Draft7Validator
+from jsonschema.exceptions import best_match
 from pathlib import Path
-from typing import Dict, Any
+from referencing import Registry, Resource
+from referencing.exceptions import Unresolvable
+from referencing.jsonschema import DRAFT7
+from typing import Dict, Any, Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .schema_compiler import UnsupportedSchema, load_validator, schema_digest
+
+SCHEMA_DIR = Path(__file__).parent.parent.parent / 'schemas'
+
+# Section names used by the actor model and the schema each one is checked
+# against. The schemas in schemas/stasis/ describe ThreatActor.to_dict()
+# documents; the UTAMF schemas beside them describe the exchange format.
+SECTION_SCHEMAS = {
+    "identification": "actor-identification",
+    "technical": "actor-technical",
+    "behavioral": "actor-behavioral",
+    "strategic": "actor-strategic",
+    "metadata": "actor-metadata",
+}
+
+# Keys of ThreatActor.to_dict() and the section each one holds.
+ACTOR_SECTIONS = {
+    "core_identification": "identification",
+    "technical_profile": "technical",
+    "behavioral_analysis": "behavioral",
+    "strategic_context": "strategic",
+    "metadata": "metadata",
+}
+
+class SchemaRegistry:
+    """
+    Thread-safe cache of parsed schemas and pre-built validators.
+
+    Schema files are read once, registered under their ``$id`` so relative
+    ``$ref`` links between files resolve, and a ``Draft7Validator`` is built
+    the first time each schema is requested. When compile_validators is set,
+    schemas are also translated into generated Python functions (see
+    core.schema_compiler) that are cached on disk by content hash.
+    """
+    def __init__(self, schema_dir: Optional[Path] = None, cache_dir: Optional[Path] = None,
+                 compile_validators: bool = True):
+        self.schema_dir = Path(schema_dir) if schema_dir else SCHEMA_DIR
+        self.cache_dir = cache_dir
+        self.compile_validators = compile_validators
+        self._lock = threading.RLock()
+        self._schemas: Optional[Dict[str, Dict]] = None
+        self._registry: Optional[Registry] = None
+        self._digest: Optional[str] = None
+        self._validators: Dict[str, Draft7Validator] = {}
+        self._compiled: Dict[str, Optional[Callable[[Any], bool]]] = {}
+
+    def _load(self) -> None:
+        """Read every schema file and build the $ref registry."""
+        with self._lock:
+            if self._schemas is not None:
+                return
+
+            schemas = {}
+            resources = []
+            for schema_file in sorted(self.schema_dir.glob('**/*.json')):
+                with open(schema_file, 'r') as f:
+                    schema = json.load(f)
+                schemas[schema_file.stem] = schema
+                uri = schema.get('$id', schema_file.resolve().as_uri())
+                resources.append(
+                    (uri, Resource.from_contents(schema, default_specification=DRAFT7))
+                )
+            digest = schema_digest(schemas)
+
+            # Section names take precedence over a schema file of the same
+            # name (UTAMF core/identification.json stays reachable by $ref).
+            for section, schema_name in SECTION_SCHEMAS.items():
+                if schema_name in schemas:
+                    schemas[section] = schemas[schema_name]
+
+            self._registry = Registry().with_resources(resources).crawl()
+            self._digest = digest
+            self._schemas = schemas
+
+    @property
+    def schemas(self) -> Dict[str, Dict]:
+        """All loaded schemas keyed by name."""
+        if self._schemas is None:
+            self._load()
+        return self._schemas
+
+    def validator(self, schema_name: str) -> Draft7Validator:
+        """
+        Get the compiled validator for a schema.
+
+        Raises:
+            KeyError: If schema not found
+        """
+        validator = self._validators.get(schema_name)
+        if validator is not None:
+            return validator
+
+        with self._lock:
+            validator = self._validators.get(schema_name)
+            if validator is None:
+                if schema_name not in self.schemas:
+                    raise KeyError(f"Schema {schema_name} not found")
+                schema = self.schemas[schema_name]
+                Draft7Validator.check_schema(schema)
+                validator = Draft7Validator(schema, registry=self._registry)
+                self._validators[schema_name] = validator
+            return validator
+
+    def compiled(self, schema_name: str) -> Optional[Callable[[Any], bool]]:
+        """
+        Get the generated validator for a schema.
+
+        Returns:
+            Optional[Callable[[Any], bool]]: Function returning True for valid
+            data, or None if the schema could not be compiled
+
+        Raises:
+            KeyError: If schema not found
+        """
+        if schema_name in self._compiled:
+            return self._compiled[schema_name]
+
+        with self._lock:
+            if schema_name not in self._compiled:
+                if schema_name not in self.schemas:
+                    raise KeyError(f"Schema {schema_name} not found")
+                check = None
+                if self.compile_validators:
+                    try:
+                        check = load_validator(schema_name, self.schemas[schema_name],
+                                               self._registry, self._digest, self.cache_dir)
+                    except (UnsupportedSchema, Unresolvable):
+                        check = None
+                self._compiled[schema_name] = check
+            return self._compiled[schema_name]
+
+    def settings(self) -> Dict[str, Any]:
+        """Constructor arguments that rebuild this registry, e.g. in a worker process."""
+        return {
+            "schema_dir": self.schema_dir,
+            "cache_dir": self.cache_dir,
+            "compile_validators": self.compile_validators,
+        }
+
+    def configure(self, schema_dir: Optional[Path] = None, cache_dir: Optional[Path] = None,
+                  compile_validators: bool = True) -> None:
+        """Change the registry's settings and reload schemas on next use."""
+        with self._lock:
+            self.schema_dir = Path(schema_dir) if schema_dir else SCHEMA_DIR
+            self.cache_dir = cache_dir
+            self.compile_validators = compile_validators
+            self.invalidate()
+
+    def invalidate(self) -> None:
+        """Drop all cached schemas and validators so they are reloaded on next use."""
+        with self._lock:
+            self._schemas = None
+            self._registry = None
+            self._digest = None
+            self._validators = {}
+            self._compiled = {}
+
+_registry = SchemaRegistry()
+
+def get_schema_registry() -> SchemaRegistry:
+    """Get the process-wide schema registry."""
+    return _registry
+
+def invalidate_schemas() -> None:
+    """Force the process-wide registry to reload schemas from disk."""
+    _registry.invalidate()
 
 class SchemaValidator:
     """
     Validator class for checking data against JSON schemas.
     """
-    def __init__(self):
-        self.schemas = {}
-        self._load_schemas()
+    def __init__(self, registry: Optional[SchemaRegistry] = None):
+        self.registry = registry or get_schema_registry()
 
-    def _load_schemas(self) -> None:
-        """Load all JSON schemas from the schemas directory."""
-        schema_dir = Path(__file__).parent.parent / 'data' / 'schemas'
-        for schema_file in schema_dir.glob('**/*.json'):
-            with open(schema_file, 'r') as f:
-                schema_name = schema_file.stem
-                self.schemas[schema_name] = json.load(f)
+    @property
+    def schemas(self) -> Dict[str, Dict]:
+        return self.registry.schemas
 
     def validate_data(self, data: Dict[str, Any], schema_name: str) -> bool:
         """
         Validate data against a specific schema.
-        
+
         Args:
             data: Dictionary containing the data to validate
             schema_name: Name of the schema to validate against
-            
+
         Returns:
             bool: True if validation successful
-            
+
         Raises:
             ValueError: If validation fails
             KeyError: If schema not found
         """
         if schema_name not in self.schemas:
             raise KeyError(f"Schema {schema_name} not found")
-            
-        try:
-            jsonschema.validate(instance=data, schema=self.schemas[schema_name])
+
+        if self.is_valid(data, schema_name):
             return True
-        except jsonschema.exceptions.ValidationError as e:
-            raise ValueError(f"Validation error: {str(e)}")
 
-def validate_actor_data(data: Dict[str, Any]) -> bool:
+        error = best_match(self.registry.validator(schema_name).iter_errors(data))
+        if error is not None:
+            raise ValueError(f"Validation error: {str(error)}")
+        return True
+
+    def is_valid(self, data: Dict[str, Any], schema_name: str) -> bool:
+        """
+        Check data against a schema, preferring the generated validator.
+
+        Raises:
+            KeyError: If schema not found
+        """
+        check = self.registry.compiled(schema_name)
+        if check is not None:
+            return check(data)
+        return self.registry.validator(schema_name).is_valid(data)
+
+    def iter_errors(self, data: Dict[str, Any], schema_name: str) -> Iterator[jsonschema.ValidationError]:
+        """
+        Yield every violation of a schema instead of stopping at the first.
+
+        Raises:
+            KeyError: If schema not found
+        """
+        return self.registry.validator(schema_name).iter_errors(data)
+
+@dataclass
+class ValidationIssue:
+    """A single schema violation inside an actor document."""
+    section: str
+    pointer: str
+    message: str
+    validator: str
+
+    def to_dict(self) -> Dict:
+        return {
+            "section": self.section,
+            "pointer": self.pointer,
+            "message": self.message,
+            "validator": self.validator
+        }
+
+@dataclass
+class ValidationReport:
+    """All schema violations found for one actor."""
+    index: int
+    actor_id: Optional[str]
+    errors: List[ValidationIssue] = field(default_factory=list)
+
+    @property
+    def valid(self) -> bool:
+        return not self.errors
+
+    def to_dict(self) -> Dict:
+        return {
+            "index": self.index,
+            "actor_id": self.actor_id,
+            "valid": self.valid,
+            "errors": [error.to_dict() for error in self.errors]
+        }
+
+def _json_pointer(parts: Iterable[Any]) -> str:
+    """Build an RFC 6901 JSON pointer from path components."""
+    return "".join(
+        "/" + str(part).replace("~", "~0").replace("/", "~1") for part in parts
+    )
+
+def iter_actor_errors(data: Dict[str, Any],
+                      validator: Optional[SchemaValidator] = None) -> Iterator[ValidationIssue]:
+    """
+    Yield every schema violation in a threat actor document.
+
+    Pointers are relative to the document root, e.g.
+    ``/core_identification/confidence_level``.
+    """
+    validator = validator or SchemaValidator()
+    for key, section in ACTOR_SECTIONS.items():
+        if key not in data:
+            yield ValidationIssue(section, _json_pointer([key]),
+                                  f"'{key}' is a required property", "required")
+            continue
+        if validator.is_valid(data[key], section):
+            continue
+        for error in validator.iter_errors(data[key], section):
+            yield ValidationIssue(
+                section,
+                _json_pointer([key, *error.absolute_path]),
+                error.message,
+                error.validator
+            )
+
+def init_schema_worker(settings: Dict[str, Any]) -> None:
+    """
+    Process pool initializer: configure the worker's process-wide registry
+    like the caller's (see SchemaRegistry.settings).
+    """
+    _registry.configure(**settings)
+
+def _report(args, validator: Optional[SchemaValidator] = None) -> ValidationReport:
+    index, data = args
+    actor_id = data.get("actor_id") if isinstance(data, dict) else None
+    return ValidationReport(index, actor_id, list(iter_actor_errors(data, validator)))
+
+class ValidationPolicy(str, Enum):
+    """
+    How validate_actor_data treats a document.
+
+    STRICT validates and raises on the first error. DEFERRED validates but
+    queues errors on the active validation_policy() context, which raises
+    them together when it exits; passing it to a validation function
+    outside such a block is an error. TRUSTED skips validation; use it only
+    for data STASIS wrote itself (see content_checksum).
+    """
+    STRICT = "strict"
+    DEFERRED = "deferred"
+    TRUSTED = "trusted"
+
+class DeferredValidationError(ValueError):
+    """Validation errors collected under the deferred policy."""
+    def __init__(self, errors: List[Tuple[Optional[str], str]]):
+        self.errors = errors
+        super().__init__(
+            f"{len(errors)} deferred validation error(s): "
+            + "; ".join(f"{actor_id}: {message}" for actor_id, message in errors)
+        )
+
+@dataclass
+class ValidationContext:
+    """State of an active validation_policy() block."""
+    policy: ValidationPolicy
+    errors: List[Tuple[Optional[str], str]] = field(default_factory=list)
+
+_context: ContextVar[Optional[ValidationContext]] = ContextVar("validation_context", default=None)
+
+@contextmanager
+def validation_policy(policy: Union[ValidationPolicy, str]) -> Iterator[ValidationContext]:
+    """
+    Apply a validation policy to every actor validated inside the block.
+
+    Raises:
+        DeferredValidationError: On exit, if the policy is deferred and any
+        validation failed inside the block
+    """
+    context = ValidationContext(ValidationPolicy(policy))
+    token = _context.set(context)
+    try:
+        yield context
+    finally:
+        _context.reset(token)
+    if context.policy is ValidationPolicy.DEFERRED and context.errors:
+        raise DeferredValidationError(context.errors)
+
+def current_policy() -> ValidationPolicy:
+    """Get the policy of the innermost validation_policy() block (default: strict)."""
+    context = _context.get()
+    return context.policy if context else ValidationPolicy.STRICT
+
+def content_checksum(content: Union[bytes, Dict[str, Any]]) -> str:
+    """
+    Checksum stored actor content so trusted loads can tell whether a record
+    is still exactly what STASIS validated and wrote.
+    """
+    if not isinstance(content, bytes):
+        content = json.dumps(content, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+def _apply_policy(policy: Optional[Union[ValidationPolicy, str]], actor_id: Optional[str],
+                  check: Callable[[], Any]) -> bool:
+    """
+    Run a validation check under the given or current policy.
+
+    Raises:
+        RuntimeError: If the deferred policy is requested outside a
+            validation_policy() block, which would have nowhere to queue
+            errors
+    """
+    policy = ValidationPolicy(policy) if policy else current_policy()
+    if policy is ValidationPolicy.TRUSTED:
+        return True
+
+    context = _context.get()
+    if policy is ValidationPolicy.DEFERRED:
+        if context is None:
+            raise RuntimeError("Deferred validation needs an active validation_policy() block")
+        try:
+            check()
+        except ValueError as e:
+            context.errors.append((actor_id, str(e)))
+            return False
+        return True
+
+    check()
+    return True
+
+def validate_actor_data(data: Dict[str, Any],
+                        policy: Optional[Union[ValidationPolicy, str]] = None) -> bool:
     """
     Validate threat actor data against all relevant schemas.
+
+    Args:
+        data: Threat actor dictionary (see ThreatActor.to_dict)
+        policy: Validation policy (default: the active validation_policy())
+
+    Returns:
+        bool: True if valid or skipped, False if an error was deferred
     """
     validator = SchemaValidator()
-    
-    # Validate each component
-    validator.validate_data(data["core_identification"], "identification")
-    validator.validate_data(data["technical_profile"], "technical")
-    validator.validate_data(data["behavioral_analysis"], "behavioral")
-    validator.validate_data(data["strategic_context"], "strategic")
-    validator.validate_data(data["metadata"], "metadata")
-    
-    return True
+
+    def check():
+        # Validate each component
+        for key, section in ACTOR_SECTIONS.items():
+            validator.validate_data(data[key], section)
+
+    return _apply_policy(policy, data.get("actor_id"), check)
+
+def validate_many(actors: Iterable[Any], max_workers: Optional[int] = None,
+                  chunksize: int = 64,
+                  registry: Optional[SchemaRegistry] = None) -> List[ValidationReport]:
+    """
+    Validate many actors and collect every violation of each one.
+
+    Args:
+        actors: ThreatActor objects or their to_dict() dictionaries
+        max_workers: Size of the process pool (default: CPU count, 1 runs inline)
+        chunksize: Number of actors sent to a worker at a time
+        registry: Schema registry to validate against (default: process-wide)
+
+    Returns:
+        List[ValidationReport]: One report per actor, in input order
+    """
+    registry = registry or get_schema_registry()
+    documents = [
+        (index, actor.to_dict() if hasattr(actor, "to_dict") else actor)
+        for index, actor in enumerate(actors)
+    ]
+
+    if max_workers == 1 or len(documents) <= chunksize:
+        validator = SchemaValidator(registry)
+        return [_report(document, validator) for document in documents]
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_schema_worker,
+                             initargs=(registry.settings(),)) as executor:
+        return list(executor.map(_report, documents, chunksize=chunksize))
+
+def validate_actor_section(section: str, data: Dict[str, Any],
+                           policy: Optional[Union[ValidationPolicy, str]] = None) -> bool:
+    """
+    Validate a single threat actor section (identification, technical,
+    behavioral, strategic or metadata).
+    """
+    return _apply_policy(policy, data.get("actor_id"),
+                         lambda: SchemaValidator().validate_data(data, section))
@@ -2,6 +2,7 @@ from typing import Dict, Any, Optional
 import requests
 from core.actor import ThreatActor
 from core.reference import Reference
+from utils.indexes import TrigramIndex
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -9,9 +10,22 @@ logger = get_logger(__name__)
 class EnrichmentService:
     """Service for enriching threat actor data from external sources."""
     
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], name_index: Optional[TrigramIndex] = None):
+        """
+        Args:
+            config: Service configuration
+            name_index: Name index to update when aliases are added
+                (e.g. ActorDatabase.names), so enriched actors are found by
+                their new aliases before they are saved
+        """
         self.config = config
         self.api_keys = config.get('api_keys', {})
+        self.name_index = name_index
+
+    def _reindex_names(self, actor: ThreatActor) -> None:
+        """Refresh the actor's entry in the name index, if any."""
+        if self.name_index is not None:
+            self.name_index.update(actor.actor_id, [actor.name, *actor.aliases])
 
     def enrich_actor(self, actor: ThreatActor) -> bool:
         """
@@ -97,6 +111,7 @@ class EnrichmentService:
                 for alias in mitre_data['aliases']:
                     if alias not in actor.aliases:
                         actor.aliases.append(alias)
+                self._reindex_names(actor)
 
             actor.add_reference(reference)
 
@@ -228,5 +243,8 @@ class EnrichmentService:
                         else:
                             current = getattr(current, path)
 
+            if {'name', 'aliases'} & set(mapping.values()):
+                self._reindex_names(actor)
+
         except Exception as e:
             logger.error(f"Error updating actor with custom data: {str(e)}")
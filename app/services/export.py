@@ -1,7 +1,9 @@
 from typing import Dict, Any, Optional
 import json
+from uuid import uuid4
 from stix2 import ThreatActor as StixActor
 from core.actor import ThreatActor
+from core.serialization import as_uuid
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -42,13 +44,13 @@ class ExportService:
 
     def _export_json(self, actor: ThreatActor) -> str:
         """Export actor as JSON string."""
-        return json.dumps(actor.to_dict(), indent=2)
+        return actor.to_json_bytes().decode()
 
     def _export_stix(self, actor: ThreatActor) -> str:
         """Export actor as STIX 2.1 JSON string."""
         try:
             stix_actor = StixActor(
-                id=f"threat-actor--{actor.uuid}",
+                id=f"threat-actor--{as_uuid(actor.uuid)}",
                 name=actor.name,
                 description=actor.description if hasattr(actor, 'description') else "",
                 aliases=actor.aliases,
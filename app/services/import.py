@@ -8,14 +8,21 @@ from core.metadata import Metadata
 from core.reference import Reference
 from utils.logger import get_logger
 from utils.helpers import sanitize_data
+from utils.indexes import TrigramIndex
 
 logger = get_logger(__name__)
 
 class ImportService:
     """Service for importing threat actor data from various sources."""
 
-    def __init__(self):
+    def __init__(self, name_index: Optional[TrigramIndex] = None):
+        """
+        Args:
+            name_index: Name index to update when merged data adds aliases
+                (e.g. ActorDatabase.names)
+        """
         self.supported_formats = ['json', 'stix', 'csv']
+        self.name_index = name_index
 
     def import_actor(self, data: Any, format: str) -> Optional[ThreatActor]:
         """
@@ -316,6 +323,9 @@ class ImportService:
                     merged_list = list(set(existing_list + new_list))
                     setattr(existing, field, merged_list)
 
+            if 'aliases' in new_data and self.name_index is not None:
+                self.name_index.update(existing.actor_id, [existing.name, *existing.aliases])
+
             # Update scalar fields if new data has higher confidence
             scalar_fields = ['capability_level', 'motivation']
             for field in scalar_fields:
@@ -0,0 +1,99 @@
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+# Modules import each other as core.* and utils.*, with app/ on the path.
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.actor import ThreatActor  # noqa: E402
+from core.metadata import Metadata  # noqa: E402
+from core.reference import Reference  # noqa: E402
+
+def make_actor(actor_id: str = "TA0001", name: str = "APT Example", **fields) -> ThreatActor:
+    """A valid actor with every section filled in."""
+    values = {
+        "aliases": ["Example Group"],
+        "first_observed": datetime(2019, 3, 1),
+        "confidence_level": 3,
+        "capability_level": "Advanced",
+        "tools_malware": [{"name": "Mimikatz", "type": "tool"}],
+        "infrastructure": {"domains": ["example.org"]},
+        "target_sectors": ["Energy", "Government"],
+        "geographic_targeting": {"US": {"confidence": 3}},
+        "attack_patterns": [{"technique_id": "T1566", "technique_name": "Phishing",
+                             "first_observed": "2019-03-01T00:00:00"}],
+        "motivation": "Cyber Espionage",
+        "goals": ["Intelligence collection"],
+        "relationships": [{"related_actor": "TA0002", "relationship_type": "shares-tools",
+                           "first_observed": "2020-01-01T00:00:00"}],
+    }
+    values.update(fields)
+    return ThreatActor(actor_id=actor_id, name=name, metadata=Metadata(), **values)
+
+def make_reference(source: str = "Vendor Report", **fields) -> Reference:
+    fields.setdefault("url", "https://example.org/report")
+    fields.setdefault("date", datetime(2023, 12, 1))
+    return Reference(source=source, **fields)
+
+def random_actor(rng: random.Random, index: int = 0) -> ThreatActor:
+    """A valid actor with randomly filled, optional and timezone-aware fields."""
+    def timestamp() -> datetime:
+        value = datetime(2015, 1, 1) + timedelta(seconds=rng.randint(0, 300_000_000),
+                                                 microseconds=rng.choice([0, rng.randint(0, 999_999)]))
+        return value.replace(tzinfo=timezone.utc) if rng.random() < 0.3 else value
+
+    metadata = Metadata(created=timestamp(), modified=timestamp(),
+                        tlp_level=rng.choice(["WHITE", "GREEN", "AMBER", "RED"]),
+                        confidence_score=rng.randint(0, 5))
+    for _ in range(rng.randint(0, 3)):
+        metadata.version_update(rng.choice(["major", "minor", "patch"]))
+    references = [
+        Reference(source=f"Source {rng.randint(0, 5)}", url=rng.choice([None, f"https://example.org/{n}"]),
+                  date=timestamp(), title=rng.choice([None, "Report"]), confidence=rng.randint(0, 5),
+                  tags=rng.sample(["apt", "ransomware", "espionage"], rng.randint(0, 2)),
+                  fields_referenced=rng.sample(["aliases", "goals", "motivation"], rng.randint(0, 2)))
+        for n in range(rng.randint(0, 5))
+    ]
+    return ThreatActor(
+        actor_id=f"TA{index:04d}", name=f"Group {index}", metadata=metadata, references=references,
+        aliases=[f"Alias {index}-{n}" for n in range(rng.randint(0, 3))],
+        first_observed=timestamp(), last_observed=rng.choice([None, timestamp()]),
+        confidence_level=rng.randint(0, 5),
+        capability_level=rng.choice([None, "Basic", "Intermediate", "Advanced"]),
+        tools_malware=[{"name": rng.choice(["PlugX", "Cobalt Strike"]), "type": rng.choice(["RAT", "tool"])}
+                       for _ in range(rng.randint(0, 2))],
+        infrastructure=rng.choice([{}, {"c2": ["198.51.100.7"], "domains": ["example.net"]}]),
+        target_sectors=rng.sample(["Energy", "Defense", "Financial", "Healthcare"], rng.randint(0, 3)),
+        geographic_targeting=rng.choice([{}, {"USA": {"confidence": 3}, "DEU": {}}]),
+        attack_patterns=[{"technique_id": f"T{rng.randint(1000, 1999)}", "tactic": rng.choice([None, "initial-access"]),
+                          "first_observed": timestamp().isoformat()}
+                         for _ in range(rng.randint(0, 4))],
+        motivation=rng.choice([None, "Cyber Espionage", "Financial Gain"]),
+        goals=rng.sample(["Intelligence collection", "Revenue", "Disruption"], rng.randint(0, 2)),
+        relationships=[{"related_actor": f"TA{rng.randint(0, 99):04d}", "relationship_type": "shares-tools"}
+                       for _ in range(rng.randint(0, 2))],
+    )
+
+@pytest.fixture
+def actor() -> ThreatActor:
+    return make_actor()
+
+@pytest.fixture
+def db_factory(tmp_path):
+    """Open ActorDatabases on a temporary data directory, closing them afterwards."""
+    from utils.database import ActorDatabase
+
+    opened = []
+
+    def factory(**kwargs) -> ActorDatabase:
+        kwargs.setdefault("data_dir", str(tmp_path / "data"))
+        db = ActorDatabase(**kwargs)
+        opened.append(db)
+        return db
+
+    yield factory
+    for db in opened:
+        db.close()
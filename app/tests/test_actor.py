@@ -0,0 +1,76 @@
+from datetime import datetime
+
+from core.actor import ThreatActor
+
+from .conftest import make_actor, make_reference
+
+def test_add_reference_merges_same_report(actor):
+    actor.add_reference(make_reference(fields_referenced=["aliases"]))
+    actor.add_reference(make_reference(fields_referenced=["aliases", "goals"]))
+    actor.add_reference(make_reference(fields_referenced=["goals"]))
+    assert len(actor.references) == 1
+    assert actor.references[0].fields_referenced == ["aliases", "goals"]
+    # The last merge changed nothing, so it bumped no version.
+    assert len(actor.metadata.revision_history) == 2
+
+def test_reference_index_follows_mutated_references(actor):
+    held = make_reference(url="https://example.org/old")
+    actor.add_reference(held)
+    held.url = "https://example.org/new"
+
+    # The old report is no longer cited, the new one is.
+    actor.add_reference(make_reference(url="https://example.org/old"))
+    assert [ref.url for ref in actor.references] == ["https://example.org/new", "https://example.org/old"]
+    actor.add_reference(make_reference(url="https://example.org/new", fields_referenced=["goals"]))
+    assert len(actor.references) == 2 and held.fields_referenced == ["goals"]
+
+    held.date = datetime(2024, 1, 1)
+    actor.add_reference(make_reference(url="https://example.org/new", date=datetime(2024, 1, 1), title="Same"))
+    assert len(actor.references) == 2
+
+def test_shared_reference_mutation_invalidates_every_actor():
+    first, second = make_actor("TA0001"), make_actor("TA0002")
+    shared = make_reference(url="https://example.org/shared")
+    first.add_reference(shared)
+    second.add_reference(shared)
+    shared.source = "CERT Advisory"
+
+    for actor in (first, second):
+        actor.add_reference(make_reference(url="https://example.org/shared"))
+        assert len(actor.references) == 2
+
+def test_sections_are_rebuilt_only_after_a_change(actor, monkeypatch):
+    built = []
+    build = ThreatActor._build_section
+    monkeypatch.setattr(ThreatActor, "_build_section",
+                        lambda self, section: built.append(section) or build(self, section))
+    # Validating the new actor built every section already.
+    actor.to_dict()
+    actor.section_dict("technical")
+    assert built == []
+
+    actor.target_sectors.append("Defense")
+    data = actor.to_dict()
+    assert built == ["behavioral"]
+    assert data["behavioral_analysis"]["target_sectors"] == ["Energy", "Government", "Defense"]
+
+def test_serialized_json_follows_nested_mutations(actor):
+    cached = actor.to_json_bytes()
+    assert actor.to_json_bytes() is cached
+
+    changes = [
+        lambda: actor.attack_patterns[0].update(tactic="initial-access"),
+        lambda: actor.geographic_targeting["US"].__setitem__("confidence", 5),
+        lambda: actor.relationships.append({"related_actor": "TA0003", "relationship_type": "uses"}),
+        lambda: actor.infrastructure.setdefault("ips", []).append("198.51.100.7"),
+        lambda: actor.metadata.revision_history.append({"version": "1.0.1", "timestamp": "2024-01-01T00:00:00"}),
+        lambda: actor.references.append(make_reference()),
+        lambda: actor.references[0].tags.append("apt"),
+        lambda: setattr(actor, "motivation", "Financial Gain"),
+    ]
+    for change in changes:
+        before = actor.to_json_bytes()
+        change()
+        after = actor.to_json_bytes()
+        assert after != before
+        assert after == ThreatActor.from_json_bytes(after).to_json_bytes()
@@ -0,0 +1,61 @@
+from utils.cache import LRUCache
+
+from .conftest import make_actor
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert list(cache) == ["a", "c"]
+    # peek() does not count as a use.
+    assert cache.peek("a") == 1
+    cache.put("d", 4)
+    assert list(cache) == ["c", "d"]
+    assert cache.get("b") is None
+    assert cache.stats() == {"entries": 2, "weight": 2, "hits": 1, "misses": 1, "evictions": 2}
+
+def test_weight_bound_keeps_the_newest_entry():
+    cache = LRUCache(max_weight=100)
+    cache.put("a", 1, weight=40)
+    cache.put("b", 2, weight=40)
+    # Replacing an entry updates its weight and recency.
+    cache.put("a", 3, weight=50)
+    assert list(cache) == ["b", "a"] and cache.stats()["weight"] == 90
+    cache.put("c", 4, weight=30)
+    assert list(cache) == ["a", "c"] and cache.stats()["weight"] == 80
+    cache.put("huge", 5, weight=500)
+    assert list(cache) == ["huge"]
+    cache.discard("huge")
+    assert cache.stats()["weight"] == 0 and cache.evictions == 3
+
+def test_database_hydrates_on_demand_and_evicts(db_factory):
+    db = db_factory()
+    actors = [make_actor(f"TA{n:04d}", f"Group {n}") for n in range(5)]
+    assert db.save_actors(actors)
+    db.close()
+
+    db = db_factory(cache_size=2)
+    assert len(db.actors) == 0 and len(db.index) == 5
+    for actor in actors:
+        assert db.get_actor(actor.actor_id).to_dict() == actor.to_dict()
+    assert list(db.actors) == ["TA0003", "TA0004"]
+    assert db.get_actor("TA0004") is db.get_actor("TA0004")
+    assert db.cache_stats()["evictions"] == 3 and db.cache_stats()["hits"] >= 2
+    # Scans do not displace the cached actors.
+    assert len(db.search_actors(capability_level="Advanced")) == 5
+    assert list(db.actors) == ["TA0003", "TA0004"]
+
+def test_database_cache_bounded_by_bytes(db_factory):
+    db = db_factory()
+    actors = [make_actor(f"TA{n:04d}", f"Group {n}") for n in range(4)]
+    assert db.save_actors(actors)
+    size = len(actors[0].to_json_bytes())
+    db.close()
+
+    db = db_factory(cache_size=None, cache_bytes=2 * size + size // 2)
+    for actor in actors:
+        db.get_actor(actor.actor_id)
+    assert list(db.actors) == ["TA0002", "TA0003"]
+    assert db.cache_stats()["weight"] <= 2 * size + size // 2
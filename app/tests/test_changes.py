@@ -0,0 +1,110 @@
+import asyncio
+import threading
+
+from core.reference import Reference
+from utils.changes import ChangeFeed, Cursor
+
+from .conftest import make_actor, make_reference
+
+def _append(feed, *actor_ids):
+    return feed.append((actor_id, "save", "1.0.0", [{"op": "add", "path": "", "value": {}}])
+                       for actor_id in actor_ids)
+
+def test_cursor_resume(tmp_path):
+    feed = ChangeFeed(tmp_path / "changes", segment_entries=2)
+    _append(feed, "TA0001", "TA0002", "TA0003")
+    cursor = Cursor(tmp_path / "consumer.cursor")
+    for change in feed.changes(cursor.position, limit=2):
+        cursor.commit(change.seq)
+    feed.close()
+
+    # A restarted consumer and feed carry on after the committed change.
+    feed = ChangeFeed(tmp_path / "changes", segment_entries=2)
+    _append(feed, "TA0004")
+    cursor = Cursor(tmp_path / "consumer.cursor")
+    assert cursor.position == 2
+    assert [(change.seq, change.actor_id) for change in feed.changes(cursor.position)] == \
+        [(3, "TA0003"), (4, "TA0004")]
+    feed.close()
+
+def test_torn_tail_is_truncated(tmp_path):
+    feed = ChangeFeed(tmp_path / "changes")
+    _append(feed, "TA0001", "TA0002")
+    feed.close()
+    segment = next((tmp_path / "changes").glob("changes-*.log"))
+    intact = segment.read_bytes()
+    with open(segment, "ab") as f:
+        f.write(b'{"seq": 3, "actor_id": "TA00')
+
+    feed = ChangeFeed(tmp_path / "changes")
+    assert feed.last_seq == 2
+    assert segment.read_bytes() == intact
+    assert [change.seq for change in _append(feed, "TA0003")] == [3]
+    assert [change.actor_id for change in feed.changes()] == ["TA0001", "TA0002", "TA0003"]
+    feed.close()
+
+def test_subscribe_receives_backlog_and_new_changes(tmp_path):
+    feed = ChangeFeed(tmp_path / "changes")
+    _append(feed, "TA0001")
+
+    async def consume():
+        received = []
+        # Appended from another thread once the subscriber caught up.
+        timer = threading.Timer(0.05, _append, (feed, "TA0002", "TA0003"))
+        async for change in feed.subscribe():
+            received.append(change.actor_id)
+            if len(received) == 1:
+                timer.start()
+            if len(received) == 3:
+                break
+        return received
+
+    assert asyncio.run(asyncio.wait_for(consume(), 5)) == ["TA0001", "TA0002", "TA0003"]
+    feed.close()
+
+def test_iterate_stops_after_timeout(tmp_path):
+    feed = ChangeFeed(tmp_path / "changes")
+    _append(feed, "TA0001", "TA0002")
+    assert [change.seq for change in feed.iterate(after=1, timeout=0.01)] == [2]
+    feed.close()
+
+def test_retention_prunes_sealed_segments(tmp_path):
+    feed = ChangeFeed(tmp_path / "changes", segment_entries=2, retention=3)
+    for n in range(10):
+        _append(feed, f"TA{n:04d}")
+    seqs = [change.seq for change in feed.changes()]
+    assert seqs[-1] == 10
+    assert 3 <= len(seqs) < 10 and seqs == list(range(seqs[0], 11))
+    feed.close()
+
+def test_database_feed_is_optional(db_factory, tmp_path):
+    db = db_factory()
+    assert db.changes is None
+    assert db.save_actor(make_actor())
+    assert db.add_reference("TA0001", make_reference(url="https://example.org/other"))
+    assert not (tmp_path / "data" / "changes").exists()
+
+def test_database_feed_records_change_types(db_factory):
+    db = db_factory(change_feed=True)
+    assert db.versions is not None
+    assert db.save_actor(make_actor())
+    reference = Reference(source="Vendor Report", url="https://example.org/goals")
+    assert db.update_actor("TA0001", "goals", ["Revenue"], reference)
+    changes = list(db.changes.changes())
+    assert [(change.seq, change.type) for change in changes] == [(1, "save"), (2, "update")]
+    assert {"op": "replace", "path": "/strategic_context/goals/0", "value": "Revenue"} in changes[1].patch
+
+def test_database_feed_patches_are_deltas(db_factory):
+    db = db_factory(change_feed=True)
+    assert db.save_actor(make_actor())
+    db.close()
+
+    # Reopened, the next save is still diffed against the stored version.
+    db = db_factory(change_feed=True)
+    actor = db.get_actor("TA0001")
+    actor.motivation = "Financial Gain"
+    assert db.save_actor(actor)
+    first, second = db.changes.changes()
+    assert [op["path"] for op in first.patch] == [""]
+    assert {"op": "replace", "path": "/strategic_context/motivation", "value": "Financial Gain"} in second.patch
+    assert all(op["path"].startswith(("/strategic_context/", "/metadata/")) for op in second.patch)
@@ -0,0 +1,116 @@
+import json
+
+import pytest
+
+from .conftest import make_actor
+
+def _save_actors(db, count):
+    actors = [make_actor(f"TA{i:04d}", f"Group {i}") for i in range(count)]
+    assert db.save_actors(actors)
+    return actors
+
+def test_parallel_load_all(db_factory, tmp_path):
+    db = db_factory()
+    actors = _save_actors(db, 80)
+    db.close()
+    # Unindexed records are validated in the loader processes.
+    (tmp_path / "data" / "index.log").unlink()
+
+    reopened = db_factory(cache_size=None)
+    reopened.actors.clear()
+    seen = []
+    report = reopened.load_all(max_workers=2, chunksize=8,
+                               progress=lambda done, total: seen.append((done, total)))
+    assert (report.total, report.loaded, report.errors) == (80, 80, {})
+    assert seen[-1] == (80, 80)
+    assert reopened.get_actor("TA0042").to_dict() == actors[42].to_dict()
+
+def test_load_all_reports_invalid_records(db_factory, tmp_path):
+    db = db_factory()
+    _save_actors(db, 3)
+    db.close()
+    record = tmp_path / "data" / "actors" / "TA0001.json"
+    record.write_bytes(record.read_bytes().replace(b'"confidence_level": 3', b'"confidence_level": 9'))
+
+    reopened = db_factory(cache_size=None)
+    reopened.actors.clear()
+    report = reopened.load_all(max_workers=1)
+    assert report.loaded == 2
+    assert list(report.errors) == ["TA0001"]
+
+def test_search_criteria_dict_and_match_mode(db_factory):
+    db = db_factory()
+    db.save_actors([
+        make_actor("TA0001", capability_level="Basic", target_sectors=["Energy"]),
+        make_actor("TA0002", capability_level="Advanced", target_sectors=["Finance"]),
+        make_actor("TA0003", capability_level="Advanced", target_sectors=["Energy"]),
+    ])
+    ids = lambda actors: [actor.actor_id for actor in actors]
+    assert ids(db.search_actors({"target_sectors": "Energy"}, capability_level="Advanced")) == ["TA0003"]
+    assert ids(db.search_actors({"target_sectors": "Energy"}, match="any",
+                                capability_level="Basic")) == ["TA0001", "TA0003"]
+    with pytest.raises(TypeError):
+        db.search_actors("any", target_sectors="Energy")
+
+def _versions(history):
+    return [tuple(map(int, entry["version"].split("."))) for entry in history]
+
+def test_metadata_evicts_beyond_history_limit():
+    metadata = make_actor().metadata
+    metadata.history_limit = 3
+    for _ in range(5):
+        metadata.version_update("patch")
+    assert [entry["version"] for entry in metadata.revision_history] == ["1.0.3", "1.0.4", "1.0.5"]
+    assert [entry["version"] for entry in metadata.evicted_history] == ["1.0.1", "1.0.2"]
+    assert [entry["version"] for entry in metadata.pop_evicted_history()] == ["1.0.1", "1.0.2"]
+    assert metadata.evicted_history == []
+    # Lowering the limit evicts at once.
+    metadata.history_limit = 1
+    assert [entry["version"] for entry in metadata.pop_evicted_history()] == ["1.0.3", "1.0.4"]
+
+def test_revision_history_spans_journal_and_tail(db_factory, tmp_path):
+    db = db_factory(history_limit=4)
+    actor = make_actor()
+    for n in range(10):
+        actor.metadata.version_update("minor" if n % 3 else "patch")
+        assert db.save_actor(actor)
+    history = db.get_revision_history("TA0001")
+    assert len(history) == 10 and len(actor.metadata.revision_history) == 4
+    assert history[-4:] == actor.metadata.revision_history
+    assert _versions(history) == sorted(set(_versions(history)))
+    journal = (tmp_path / "data" / "journal" / "TA0001.jsonl").read_text().splitlines()
+    assert [json.loads(line) for line in journal] == history[:6]
+    db.close()
+
+    # Reopened with a lower limit: the stored tail is trimmed on load, and
+    # the trimmed entries reach the journal with the next save.
+    db = db_factory(history_limit=2)
+    assert db.get_revision_history("TA0001") == history
+    actor = db.get_actor("TA0001")
+    assert len(actor.metadata.revision_history) == 2
+    actor.metadata.version_update("major")
+    assert db.save_actor(actor)
+    db.actors.clear()
+    reloaded = db.get_revision_history("TA0001")
+    assert reloaded[:10] == history and len(reloaded) == 11
+    assert _versions(reloaded) == sorted(set(_versions(reloaded)))
+    assert len(db.get_actor("TA0001").metadata.revision_history) == 2
+
+def test_torn_journal_line_is_skipped(db_factory, tmp_path):
+    db = db_factory(history_limit=1)
+    actor = make_actor()
+    for _ in range(3):
+        actor.metadata.version_update("patch")
+        assert db.save_actor(actor)
+    journal = tmp_path / "data" / "journal" / "TA0001.jsonl"
+    # An append interrupted mid-line.
+    with open(journal, "ab") as f:
+        f.write(b'{"version": "1.0.')
+    assert [entry["version"] for entry in db.get_revision_history("TA0001")] == ["1.0.1", "1.0.2", "1.0.3"]
+
+    # Later entries start on a line of their own.
+    for _ in range(2):
+        actor.metadata.version_update("patch")
+        assert db.save_actor(actor)
+    assert [entry["version"] for entry in db.get_revision_history("TA0001")] == \
+        ["1.0.1", "1.0.2", "1.0.3", "1.0.4", "1.0.5"]
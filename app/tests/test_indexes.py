@@ -0,0 +1,194 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from utils.indexes import (AnyOf, HashIndex, IntervalIndex, InvertedIndex, Range, SortedIndex, match_value,
+                           sort_key)
+
+from .conftest import make_actor
+
+def _matches(value, condition):
+    """Search semantics: None matches a missing value, AnyOf any option."""
+    if isinstance(condition, AnyOf):
+        return any(_matches(value, option) for option in condition.values)
+    if condition is None:
+        return value is None
+    return value is not None and match_value(value, condition)
+
+def _brute_force(values, condition):
+    return {actor_id for actor_id, value in values.items() if _matches(value, condition)}
+
+def test_sorted_index_matches_brute_force():
+    rng = random.Random(3)
+    start = datetime(2015, 1, 1)
+    values = {}
+    for n in range(300):
+        value = rng.choice([None, start + timedelta(days=rng.randint(0, 3000))])
+        if value is not None and rng.random() < 0.3:
+            value = value.replace(tzinfo=timezone(timedelta(hours=rng.randint(-8, 8)))).isoformat()
+        values[f"TA{n:04d}"] = value
+    index = SortedIndex()
+    index.build(list(values.items())[:200])
+    for actor_id, value in list(values.items())[200:]:
+        index.add(actor_id, value)
+    # Updates remove the old entry.
+    for actor_id in list(values)[::7]:
+        index.remove(actor_id, values[actor_id])
+        values[actor_id] = start
+        index.add(actor_id, start)
+
+    conditions = [None, start, Range(start, None), Range(None, "2018-06-01"),
+                  Range("2016-01-01", "2017-01-01T12:00:00+02:00"), Range(), AnyOf(start, None)]
+    for _ in range(20):
+        low = start + timedelta(days=rng.randint(0, 3000))
+        conditions.append(Range(low, low + timedelta(days=rng.randint(0, 600))))
+    for condition in conditions:
+        assert index.lookup(condition) == _brute_force(values, condition), condition
+        assert index.estimate(condition) >= len(index.lookup(condition))
+
+def test_sorted_index_with_mixed_types():
+    index = SortedIndex()
+    values = {"TA0001": 3, "TA0002": "3", "TA0003": 4.5, "TA0004": "high",
+              "TA0005": datetime(2020, 1, 1), "TA0006": 1, "TA0007": ["list"]}
+    index.build(list(values.items())[:3])
+    for actor_id, value in list(values.items())[3:]:
+        index.add(actor_id, value)
+
+    assert index.lookup(3) == {"TA0001"}
+    assert index.lookup("3") == {"TA0002"}
+    assert index.lookup(Range(2, None)) == {"TA0001", "TA0003"}
+    assert index.lookup(Range(None, 4)) == {"TA0001", "TA0006"}
+    assert index.lookup(Range("a", None)) == {"TA0004"}
+    assert index.lookup(Range(None, "2021-01-01")) == {"TA0005"}
+    # Bounds of different kinds match nothing, as in match_value().
+    assert index.lookup(Range(1, "z")) == set()
+    assert match_value(3, Range(1, "z")) is False
+    assert len(index.lookup(Range())) == 7
+    index.remove("TA0002", "3")
+    assert index.lookup("3") == set()
+
+def test_sort_key_only_parses_timestamps():
+    assert sort_key("2021-03-04T05:06:07+01:00") == datetime(2021, 3, 4, 4, 6, 7)
+    assert sort_key("2021-03-04") == datetime(2021, 3, 4)
+    # Strings that fromisoformat() would also accept stay strings.
+    for text in ["20210304", "2021", "APT 28", "2021-03-04 and more", ""]:
+        assert sort_key(text) == text
+    assert sort_key(5) == 5
+
+def test_hash_and_inverted_indexes():
+    names, sectors = HashIndex(), InvertedIndex()
+    for actor_id, name, values in [("TA0001", "A", ["Energy", "Defense"]), ("TA0002", "B", ["Energy"]),
+                                   ("TA0003", "A", [])]:
+        names.add(actor_id, name)
+        sectors.add(actor_id, values)
+    assert names.lookup("A") == {"TA0001", "TA0003"}
+    assert names.lookup(AnyOf("A", "B", "C")) == {"TA0001", "TA0002", "TA0003"}
+    assert sectors.lookup("Energy") == {"TA0001", "TA0002"}
+    assert sectors.lookup(["Energy", "Defense"]) == {"TA0001"}
+    assert sectors.estimate(["Energy", "Defense"]) == 1
+    sectors.remove("TA0001", ["Energy", "Defense"])
+    assert sectors.lookup("Defense") == set() and "Defense" not in sectors.postings
+
+@pytest.mark.parametrize("match", ["all", "any"])
+def test_search_agrees_with_a_scan(db_factory, match):
+    rng = random.Random(11)
+    db = db_factory()
+    actors = [
+        make_actor(f"TA{n:04d}", f"Group {n}",
+                   confidence_level=rng.randint(0, 5),
+                   capability_level=rng.choice([None, "Basic", "Advanced"]),
+                   target_sectors=rng.sample(["Energy", "Defense", "Financial"], rng.randint(0, 2)),
+                   first_observed=datetime(2015, 1, 1) + timedelta(days=rng.randint(0, 3000)))
+        for n in range(60)
+    ]
+    assert db.save_actors(actors)
+    searches = [
+        {"confidence_level": Range(2, 4), "target_sectors": "Energy"},
+        {"capability_level": AnyOf("Basic", None), "first_observed": Range("2018-01-01", None)},
+        {"target_sectors": ["Energy", "Defense"], "goals": "Intelligence collection"},
+        {"confidence_level": Range(9, None), "capability_level": "Advanced"},
+    ]
+    for criteria in searches:
+        def matches(actor):
+            checks = [_matches(getattr(actor, key), value) for key, value in criteria.items()]
+            return all(checks) if match == "all" else any(checks)
+
+        expected = [actor.actor_id for actor in actors if matches(actor)]
+        assert [actor.actor_id for actor in db.search_actors(criteria, match=match)] == expected, criteria
+
+def _overlapping(windows, low, high):
+    """Keys whose [start, end] window overlaps [low, high], scanning every window."""
+    return {key for key, (start, end) in windows.items()
+            if (high is None or start <= high) and (low is None or end is None or end >= low)}
+
+def test_interval_index_matches_brute_force():
+    rng = random.Random(17)
+    base = datetime(2015, 1, 1)
+
+    def moment():
+        return base + timedelta(seconds=rng.choice([0, 1, 86_400, rng.randint(0, 300_000_000)]))
+
+    windows = {}
+    for n in range(300):
+        start = moment()
+        # Open windows, instants and windows from a second to years long.
+        end = rng.choice([None, start, start + timedelta(seconds=rng.choice([1, 3600, rng.randint(0, 10 ** 8)]))])
+        windows[f"TA{n:04d}"] = (start, end)
+    initial = dict(windows)
+    built, grown = IntervalIndex(), IntervalIndex()
+    built.build((key, start, end) for key, (start, end) in windows.items())
+    for key, (start, end) in windows.items():
+        grown.add(key, start, end)
+    # Replace some windows and drop others.
+    for key in rng.sample(sorted(windows), 60):
+        if rng.random() < 0.5:
+            del windows[key]
+            grown.remove(key)
+        else:
+            start = moment()
+            windows[key] = (start, rng.choice([None, start + timedelta(days=rng.randint(0, 900))]))
+            grown.add(key, *windows[key])
+    grown.remove("TA9999")
+    assert len(grown) == len(windows)
+
+    queries = [(None, None), (base, None), (None, base)]
+    for _ in range(200):
+        low = moment()
+        queries.append((low, rng.choice([low, low + timedelta(seconds=rng.randint(0, 10 ** 8))])))
+    for low, high in queries:
+        assert built.overlap(low, high) == _overlapping(initial, low, high), (low, high)
+        assert grown.overlap(low, high) == _overlapping(windows, low, high), (low, high)
+    assert grown.overlap(base.isoformat(), "2016-01-01") == grown.overlap(base, datetime(2016, 1, 1))
+    for start, _ in list(windows.values())[:20]:
+        assert grown.stab(start) == _overlapping(windows, start, start)
+
+def test_active_actors_and_windows(db_factory):
+    db = db_factory()
+    assert db.save_actors([
+        make_actor("TA0001", "Alpha", first_observed=datetime(2016, 1, 1), last_observed=datetime(2018, 1, 1),
+                   attack_patterns=[{"technique_id": "T1566", "first_observed": "2016-02-01T00:00:00",
+                                     "last_observed": "2016-06-01T00:00:00"}],
+                   relationships=[]),
+        make_actor("TA0002", "Beta", first_observed=datetime(2019, 1, 1), last_observed=None,
+                   attack_patterns=[{"technique_id": "T1059", "first_observed": "2020-01-01T00:00:00"}]),
+        make_actor("TA0003", "Gamma", first_observed=datetime(2010, 1, 1), last_observed=datetime(2012, 1, 1),
+                   attack_patterns=[]),
+    ])
+    ids = lambda actors: [actor.actor_id for actor in actors]
+    assert ids(db.active_actors("2017-01-01", "2017-01-01")) == ["TA0001"]
+    assert ids(db.active_actors(datetime(2017, 6, 1))) == ["TA0001", "TA0002"]
+    assert ids(db.active_actors(None, "2011-01-01")) == ["TA0003"]
+    assert ids(db.active_actors("2030-01-01")) == ["TA0002"]
+    assert db.active_windows("technique", "2016-03-01", "2016-03-01") == [("TA0001", "T1566")]
+    assert db.active_windows("technique", "2021-01-01") == [("TA0002", "T1059")]
+    assert db.active_windows("relationship", None, "2020-01-01") == [("TA0002", "TA0002"), ("TA0003", "TA0002")]
+    assert db.active_windows("relationship", None, "2019-12-31") == []
+
+    # Saving an actor moves its windows.
+    actor = db.get_actor("TA0003")
+    actor.last_observed = datetime(2017, 6, 1)
+    assert db.save_actor(actor)
+    assert ids(db.active_actors("2017-01-01", "2017-01-01")) == ["TA0001", "TA0003"]
+    with pytest.raises(ValueError):
+        db.active_windows("actor")
@@ -0,0 +1,65 @@
+import copy
+
+import pytest
+
+from utils.patch import apply_patch, make_patch, merge
+
+BASE = {
+    "name": "APT Example",
+    "aliases": ["Example Group"],
+    "technical": {"capability_level": "Advanced", "tools": [{"name": "Mimikatz"}]},
+    "goals": ["Intelligence collection"],
+    "confidence": 3,
+}
+
+def _edit(**changes):
+    document = copy.deepcopy(BASE)
+    for path, value in changes.items():
+        target = document
+        *parents, key = path.split("__")
+        for parent in parents:
+            target = target[parent]
+        target[key] = value
+    return document
+
+def test_patch_round_trip():
+    new = _edit(name="Renamed", aliases=["Other", "Example Group", "Third"], confidence=3.0)
+    patch = make_patch(BASE, new)
+    assert apply_patch(BASE, patch) == new
+    # 3 -> 3.0 is a change in JSON.
+    assert {"op": "replace", "path": "/confidence", "value": 3.0} in patch
+    assert make_patch(BASE, copy.deepcopy(BASE)) == []
+
+def test_merge_disjoint_changes():
+    ours = _edit(name="Renamed", technical__capability_level="Basic")
+    theirs = _edit(goals=["Revenue"], confidence=4)
+    snapshot = copy.deepcopy(theirs)
+    merged = merge(BASE, ours, theirs)
+    assert merged == _edit(name="Renamed", technical__capability_level="Basic", goals=["Revenue"], confidence=4)
+    assert theirs == snapshot
+    assert merge(BASE, ours, theirs, in_place=True) is theirs
+
+def test_merge_same_change_and_appends():
+    # The same change on both sides is made once.
+    assert merge(BASE, _edit(confidence=5), _edit(confidence=5)) == _edit(confidence=5)
+    # Items appended on both sides: ours after theirs, shared ones once.
+    ours = _edit(aliases=["Example Group", "Ours"], goals=["Intelligence collection", "Revenue"])
+    theirs = _edit(aliases=["Example Group", "Theirs"], goals=["Intelligence collection", "Revenue"])
+    assert merge(BASE, ours, theirs) == _edit(aliases=["Example Group", "Theirs", "Ours"],
+                                              goals=["Intelligence collection", "Revenue"])
+
+@pytest.mark.parametrize("ours, theirs", [
+    # The same value.
+    (_edit(confidence=4), _edit(confidence=5)),
+    # A value and one inside it.
+    (_edit(technical={"capability_level": "Basic"}), _edit(technical__capability_level="Minimal")),
+    (_edit(technical__tools=[{"name": "PlugX"}]), _edit(technical={})),
+    # A list the other side appended to: the indexes would shift.
+    (_edit(aliases=[]), _edit(aliases=["Example Group", "Theirs"])),
+    (_edit(aliases=["Renamed"]), _edit(aliases=["Example Group", "Theirs"])),
+])
+def test_merge_conflicts(ours, theirs):
+    with pytest.raises(ValueError):
+        merge(BASE, ours, theirs)
+    with pytest.raises(ValueError):
+        merge(BASE, theirs, ours)
@@ -0,0 +1,109 @@
+"""
+Tests of utils.postgres against a throwaway PostgreSQL database, named by
+STASIS_TEST_POSTGRES_DSN (e.g. postgresql://postgres@localhost/postgres).
+Each test works in a schema of its own, dropped afterwards. Skipped when
+asyncpg is not installed or no server is configured.
+"""
+import asyncio
+import os
+import uuid
+
+import pytest
+
+asyncpg = pytest.importorskip("asyncpg")
+
+from utils.indexes import AnyOf  # noqa: E402
+from utils.postgres import PostgresActorStore  # noqa: E402
+
+from .conftest import make_actor, make_reference  # noqa: E402
+
+DSN = os.environ.get("STASIS_TEST_POSTGRES_DSN")
+
+@pytest.fixture
+def schema():
+    if not DSN:
+        pytest.skip("STASIS_TEST_POSTGRES_DSN is not set")
+    name = f"stasis_test_{uuid.uuid4().hex[:12]}"
+
+    async def execute(statement):
+        connection = await asyncpg.connect(DSN)
+        try:
+            await connection.execute(statement)
+        finally:
+            await connection.close()
+
+    try:
+        asyncio.run(execute(f"CREATE SCHEMA {name}"))
+    except (OSError, asyncpg.PostgresError) as e:
+        pytest.skip(f"PostgreSQL is not available: {e}")
+    yield name
+    asyncio.run(execute(f"DROP SCHEMA {name} CASCADE"))
+
+def run(schema, test):
+    """Run an async test body with a store whose tables live in the schema."""
+    async def main():
+        async with PostgresActorStore(DSN, max_connections=4,
+                                      server_settings={"search_path": schema}) as store:
+            await test(store)
+    asyncio.run(main())
+
+def test_save_and_get_round_trip(schema):
+    async def test(store):
+        actor = make_actor()
+        actor.add_reference(make_reference())
+        assert await store.save_actor(actor)
+        loaded = await store.get_actor(actor.actor_id)
+        assert loaded is not None
+        assert loaded.to_dict() == actor.to_dict()
+        assert await store.get_actor("TA9999") is None
+    run(schema, test)
+
+def test_saves_never_go_back_a_version(schema):
+    async def test(store):
+        actor = make_actor()
+        assert await store.save_actor(actor)
+        # Saving the same content again succeeds.
+        assert await store.save_actor(actor)
+        stale = make_actor(capability_level="Basic")
+        actor.update_field("capability_level", "Intermediate", make_reference())
+        assert await store.save_actor(actor)
+        assert not await store.save_actor(stale)
+        assert (await store.get_actor(actor.actor_id)).capability_level == "Intermediate"
+    run(schema, test)
+
+def test_copy_actors_keeps_the_newest_version(schema):
+    async def test(store):
+        actors = [make_actor(f"TA{i:04d}", f"Group {i}") for i in range(50)]
+        newer = make_actor("TA0007", "Group 7")
+        newer.update_field("confidence_level", 5, make_reference())
+        assert await store.copy_actors([*actors, newer]) == 50
+        assert (await store.get_actor("TA0007")).confidence_level == 5
+        # Older versions do not replace stored ones.
+        assert await store.copy_actors(actors[5:10]) == 4
+        assert (await store.get_actor("TA0007")).confidence_level == 5
+    run(schema, test)
+
+def test_search_actors(schema):
+    async def test(store):
+        await store.copy_actors([
+            make_actor("TA0001", "One", capability_level="Basic", target_sectors=["Energy"]),
+            make_actor("TA0002", "Two", capability_level="Advanced", target_sectors=["Finance"]),
+            make_actor("TA0003", "Three", capability_level="Advanced", target_sectors=["Energy", "Finance"]),
+        ])
+        ids = lambda actors: [actor.actor_id for actor in actors]
+        assert ids(await store.search_actors(target_sectors="Energy")) == ["TA0001", "TA0003"]
+        assert ids(await store.search_actors(target_sectors=["Energy", "Finance"])) == ["TA0003"]
+        assert ids(await store.search_actors({"capability_level": "Advanced"}, name="Two")) == ["TA0002"]
+        assert ids(await store.search_actors(capability_level=AnyOf("Basic", "Intermediate"))) == ["TA0001"]
+        assert ids(await store.search_actors(match="any", name="One", target_sectors="Finance")) \
+            == ["TA0001", "TA0002", "TA0003"]
+        with pytest.raises(ValueError):
+            await store.search_actors(infrastructure={})
+    run(schema, test)
+
+def test_iter_actors_streams_in_order(schema):
+    async def test(store):
+        await store.copy_actors(make_actor(f"TA{i:04d}", f"Group {i}") for i in range(30))
+        ids = [actor.actor_id async for actor in store.iter_actors(prefetch=7)]
+        assert ids == [f"TA{i:04d}" for i in range(30)]
+    run(schema, test)
@@ -0,0 +1,106 @@
+from datetime import datetime
+
+import pytest
+
+from utils.query import Field, compile_predicate, parse_query
+
+from .conftest import make_actor
+
+SECTORS = ["Energy", "Finance", "Government", "Healthcare"]
+
+def _actors():
+    return [
+        make_actor(
+            f"TA{i:04d}", f"Group {i}",
+            aliases=[f"APT{i}", f"Cluster {i % 3}"],
+            confidence_level=i % 6,
+            capability_level=["Basic", "Intermediate", "Advanced"][i % 3],
+            target_sectors=[SECTORS[i % 4], SECTORS[(i + 1) % 4]],
+            first_observed=datetime(2015 + i % 9, 1 + i % 12, 1),
+            last_observed=datetime(2024, 1, 1 + i % 28) if i % 4 else None,
+            attack_patterns=[{"technique_id": f"T{1000 + (i * 7 + j) % 20}", "technique_name": "x"}
+                             for j in range(2)],
+        )
+        for i in range(30)
+    ]
+
+@pytest.fixture
+def populated(db_factory):
+    db = db_factory()
+    actors = _actors()
+    assert db.save_actors(actors)
+    return db, actors
+
+def _ids(actors):
+    return [actor.actor_id for actor in actors]
+
+def test_list_fields_match_through_any_item(actor):
+    assert compile_predicate(parse_query("aliases == 'Example Group'"))(actor)
+    assert not compile_predicate(parse_query("aliases != 'Example Group'"))(actor)
+    assert compile_predicate(parse_query("target_sectors in {Energy, Finance}"))(actor)
+    assert not compile_predicate(parse_query("target_sectors in {Finance}"))(actor)
+    assert compile_predicate(parse_query("attack_patterns.technique_id == T1566"))(actor)
+
+QUERIES = [
+    ("aliases == APT7", lambda a: "APT7" in a.aliases),
+    ("aliases != APT7", lambda a: "APT7" not in a.aliases),
+    ("target_sectors in {Energy, Finance}",
+     lambda a: bool({"Energy", "Finance"} & set(a.target_sectors))),
+    ("confidence_level >= 4 AND target_sectors contains Energy AND first_observed > 2019-01-01",
+     lambda a: a.confidence_level >= 4 and "Energy" in a.target_sectors
+     and a.first_observed > datetime(2019, 1, 1)),
+    ("capability_level == Advanced OR (aliases contains 'Cluster 1' AND NOT confidence_level < 3)",
+     lambda a: a.capability_level == "Advanced" or ("Cluster 1" in a.aliases and a.confidence_level >= 3)),
+    ("last_observed == null AND attack_patterns.technique_id in {T1000, T1007}",
+     lambda a: a.last_observed is None
+     and any(p["technique_id"] in ("T1000", "T1007") for p in a.attack_patterns)),
+]
+
+@pytest.mark.parametrize("query, expected", QUERIES)
+def test_query_matches_python_predicates(populated, query, expected):
+    db, actors = populated
+    assert _ids(db.query(query)) == sorted(a.actor_id for a in actors if expected(a))
+
+def test_query_builder_sort_and_paging(populated):
+    db, actors = populated
+    predicate = (Field("confidence_level") >= 2) & Field("target_sectors").contains("Energy")
+    matching = [a for a in actors if a.confidence_level >= 2 and "Energy" in a.target_sectors]
+    assert len(matching) > 5
+
+    by_date = sorted(matching, key=lambda a: (a.first_observed, a.actor_id), reverse=True)
+    assert _ids(db.query(predicate, sort="first_observed", descending=True, limit=3, offset=1)) \
+        == _ids(by_date[1:4])
+
+    # Not a summary field: sorted after loading.
+    by_technique = sorted(matching, key=lambda a: (a.attack_patterns[0]["technique_id"],
+                                                   a.actor_id))
+    assert _ids(db.query(predicate, sort="attack_patterns.technique_id", limit=4, offset=2)) \
+        == _ids(by_technique[2:6])
+    assert _ids(db.query(predicate, sort="attack_patterns.technique_id")) == _ids(by_technique)
+
+@pytest.mark.parametrize("query", ["confidence_level >>= 4", "a == 1 AND", "(a == 1", "x in 1"])
+def test_malformed_queries_are_rejected(populated, query):
+    db, _ = populated
+    with pytest.raises(ValueError):
+        db.query(query)
+
+def test_sort_by_nested_field_puts_missing_values_last(db_factory):
+    db = db_factory()
+    actors = [make_actor(f"TA{i:04d}", relationships=[] if i % 3 == 0 else
+                         [{"related_actor": f"TA{(i * 5) % 7:04d}", "relationship_type": "x"}])
+              for i in range(12)]
+    assert db.save_actors(actors)
+    db.actors.clear()
+
+    present = sorted((a for a in actors if a.relationships),
+                     key=lambda a: (a.relationships[0]["related_actor"], a.actor_id))
+    missing = [a for a in actors if not a.relationships]
+    for descending in (False, True):
+        ordered = (present[::-1] if descending else present) + missing
+        query = "confidence_level >= 0"
+        sort = "relationships.related_actor"
+        assert _ids(db.query(query, sort=sort, descending=descending)) == _ids(ordered)
+        assert _ids(db.query(query, sort=sort, descending=descending, limit=5, offset=6)) \
+            == _ids(ordered[6:11])
+        assert _ids(db.query(query, sort=sort, descending=descending, offset=7)) == _ids(ordered[7:])
+    assert len(db.actors) == 0
@@ -0,0 +1,192 @@
+"""
+Differential tests: generated validators (core.schema_compiler) must agree
+with jsonschema's Draft7Validator on every instance.
+"""
+import json
+import random
+import shutil
+from urllib.parse import urldefrag, urljoin
+
+import pytest
+
+from core.validation import ACTOR_SECTIONS, SCHEMA_DIR, SECTION_SCHEMAS, SchemaRegistry
+
+from .conftest import make_actor
+
+BASE = "https://example.org/schemas/"
+
+def _registry(tmp_path, schemas):
+    schema_dir = tmp_path / "schemas"
+    schema_dir.mkdir()
+    for name, schema in schemas.items():
+        (schema_dir / f"{name}.json").write_text(json.dumps(dict(schema, **{"$id": BASE + f"{name}.json"})))
+    return SchemaRegistry(schema_dir, cache_dir=tmp_path / "cache")
+
+def _assert_agrees(registry, name, instances):
+    compiled = registry.compiled(name)
+    assert compiled is not None, f"{name} was not compiled"
+    reference = registry.validator(name)
+    for instance in instances:
+        assert compiled(instance) == reference.is_valid(instance), instance
+
+KEYWORD_CASES = {
+    "if_then_else": (
+        {
+            "type": "object",
+            "if": {"properties": {"kind": {"const": "tool"}}, "required": ["kind"]},
+            "then": {"required": ["name"]},
+            "else": {"properties": {"name": {"type": "null"}}},
+        },
+        [{}, {"kind": "tool"}, {"kind": "tool", "name": "x"}, {"kind": "malware", "name": "x"},
+         {"kind": "malware", "name": None}, {"name": 1}, [], "tool"],
+    ),
+    "one_of": (
+        {"oneOf": [{"type": "integer"}, {"type": "number", "minimum": 2}, {"type": "string", "maxLength": 2}]},
+        [0, 1, 2, 2.5, 3, -1.5, "ab", "abc", None, True, [1]],
+    ),
+    "pattern_and_additional_properties": (
+        {
+            "type": "object",
+            "properties": {"id": {"type": "string"}},
+            "patternProperties": {"^x-": {"type": "integer"}, "^x-s": {"minimum": 10}},
+            "additionalProperties": {"type": "boolean"},
+        },
+        [{}, {"id": "a"}, {"id": 1}, {"x-a": 1}, {"x-a": "1"}, {"x-s": 5}, {"x-s": 12},
+         {"other": True}, {"other": 1}, {"id": "a", "x-b": 2, "flag": False}],
+    ),
+    "no_additional_properties": (
+        {"type": "object", "properties": {"a": {}}, "patternProperties": {"^b": {}},
+         "additionalProperties": False},
+        [{}, {"a": 1}, {"b1": None}, {"c": 1}, {"a": 1, "bc": 2, "d": 3}],
+    ),
+    "unique_items": (
+        {"type": "array", "uniqueItems": True},
+        [[], [1, True], [0, False], [1, 1.0], [True, True], [None, False, 0, ""],
+         [{"a": 1}, {"a": True}], [{"a": 1}, {"a": 1.0}], [[1], [True]], [[0], [0.0]], ["1", 1]],
+    ),
+    "recursive_ref": (
+        {
+            "type": "object",
+            "properties": {
+                "name": {"type": "string"},
+                "children": {"type": "array", "items": {"$ref": "#"}},
+            },
+            "required": ["name"],
+        },
+        [{"name": "a"}, {"name": "a", "children": []}, {"name": "a", "children": [{"name": "b"}]},
+         {"name": "a", "children": [{"name": "b", "children": [{}]}]},
+         {"name": "a", "children": [{"name": "b", "children": [{"name": 3}]}]}],
+    ),
+    "recursive_definitions": (
+        {
+            "definitions": {"node": {"type": ["object", "null"],
+                                     "properties": {"next": {"$ref": "#/definitions/node"},
+                                                    "value": {"type": "integer"}}}},
+            "$ref": "#/definitions/node",
+        },
+        [None, {}, {"value": 1, "next": {"value": 2, "next": None}}, {"next": {"next": {"value": "x"}}}, 3],
+    ),
+}
+
+@pytest.mark.parametrize("case", sorted(KEYWORD_CASES))
+def test_keyword_branches_agree(tmp_path, case):
+    schema, instances = KEYWORD_CASES[case]
+    registry = _registry(tmp_path, {case: schema})
+    _assert_agrees(registry, case, instances)
+
+def test_cross_file_references(tmp_path):
+    registry = _registry(tmp_path, {
+        "list": {"type": "object", "properties": {"items": {"type": "array", "items": {"$ref": "entry.json"}}},
+                 "definitions": {"score": {"type": "integer", "minimum": 1, "maximum": 5}}},
+        "entry": {"type": "object", "properties": {"parent": {"$ref": "list.json"},
+                                                   "score": {"$ref": "list.json#/definitions/score"}}},
+    })
+    _assert_agrees(registry, "list", [
+        {}, {"items": [{}]}, {"items": [{"parent": {"items": [1]}}]}, {"items": [{"parent": {"items": []}}]},
+        {"items": [{"score": 3}]}, {"items": [{"score": 6}]}, {"items": [{"parent": {"items": [{"score": 0}]}}]},
+    ])
+
+def _instances(registry, schema, rng, count):
+    """Random instances around a schema: mostly valid shapes with mutations."""
+    junk = [None, True, False, 0, 1, -3, 2.5, 7, "", "x", "TA23CHN-APT001", "2023-01-01T00:00:00Z",
+            [], {}, [1], {"a": 1}]
+
+    def generate(schema, base, depth=0):
+        if depth > 8 or rng.random() < 0.08 or not isinstance(schema, dict):
+            return rng.choice(junk)
+        if "$ref" in schema:
+            resolved = registry._registry.resolver(base).lookup(schema["$ref"])
+            return generate(resolved.contents, urldefrag(urljoin(base, schema["$ref"])).url, depth + 1)
+        base = schema.get("$id", base)
+        if "enum" in schema:
+            return rng.choice(schema["enum"] + ([rng.choice(junk)] if rng.random() < 0.1 else []))
+        kind = schema.get("type")
+        if isinstance(kind, list):
+            kind = rng.choice(kind)
+        if kind == "object" or "properties" in schema:
+            required = schema.get("required", [])
+            data = {key: generate(sub, base, depth + 1) for key, sub in schema.get("properties", {}).items()
+                    if rng.random() < (0.95 if key in required else 0.5)}
+            if rng.random() < 0.05:
+                data["extra"] = 1
+            return data
+        if kind == "array":
+            return [generate(schema.get("items", {}), base, depth + 1) for _ in range(rng.randint(0, 3))]
+        if kind == "string":
+            if "pattern" in schema and rng.random() < 0.5:
+                return rng.choice(["TA23CHN-APT001", "T1059", "T1059.001", "+01:00", "1.2.3", "abc", "CHN"])
+            return rng.choice(["a", "", "Energy", "2023-01-01"])
+        if kind == "integer":
+            return rng.choice([0, 1, 3, 5, 6, 2.0, True])
+        if kind == "number":
+            return rng.choice([0, 1.5, 100, 101, -1, True])
+        if kind == "boolean":
+            return rng.choice([True, False, 0])
+        return rng.choice(junk)
+
+    return [generate(schema, schema.get("$id", "")) for _ in range(count)]
+
+UTAMF_SCHEMAS = sorted(path.stem for path in SCHEMA_DIR.glob("**/*.json") if path.parent.name != "stasis")
+
+@pytest.fixture(scope="module")
+def real_registry(tmp_path_factory):
+    return SchemaRegistry(SCHEMA_DIR, cache_dir=tmp_path_factory.mktemp("validators"))
+
+@pytest.fixture(scope="module")
+def utamf_registry(tmp_path_factory):
+    # Without the actor section schemas, so no section name shadows a file.
+    schema_dir = tmp_path_factory.mktemp("utamf") / "schemas"
+    shutil.copytree(SCHEMA_DIR, schema_dir, ignore=shutil.ignore_patterns("stasis"))
+    return SchemaRegistry(schema_dir, cache_dir=schema_dir.parent / "validators")
+
+@pytest.mark.parametrize("name", UTAMF_SCHEMAS)
+def test_utamf_schemas_agree(utamf_registry, name):
+    schema = utamf_registry.schemas[name]
+    rng = random.Random(name)
+    _assert_agrees(utamf_registry, name, _instances(utamf_registry, schema, rng, 300))
+
+def test_dictionary_schema_properties(utamf_registry):
+    # patternProperties with additionalProperties: false, in a real schema.
+    _assert_agrees(utamf_registry, "dictionary", [
+        {}, {"key_1": "v"}, {"key-2": [1]}, {"bad key": 1}, {"k": None}, {"k": {"a": 1}},
+    ])
+
+@pytest.mark.parametrize("section", sorted(SECTION_SCHEMAS))
+def test_actor_sections_compile_and_agree(real_registry, section):
+    data = make_actor().to_dict()
+    key = next(key for key, name in ACTOR_SECTIONS.items() if name == section)
+    assert real_registry.compiled(section)(data[key])
+    schema = real_registry.schemas[section]
+    _assert_agrees(real_registry, section, [data[key], *_instances(real_registry, schema, random.Random(section), 300)])
+
+def test_build_validators_writes_new_cache(tmp_path):
+    from core.schema_compiler import build_validators
+
+    registry = SchemaRegistry(SCHEMA_DIR, cache_dir=tmp_path / "first")
+    assert all(build_validators(registry).values())
+    # Already compiled in memory: a new cache directory is still filled.
+    assert all(build_validators(registry, cache_dir=tmp_path / "second").values())
+    assert registry.cache_dir == tmp_path / "second"
+    assert sorted(path.name for path in (tmp_path / "second").iterdir()) == \
+        sorted(path.name for path in (tmp_path / "first").iterdir())
+    assert any((tmp_path / "second").iterdir())
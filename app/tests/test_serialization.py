@@ -0,0 +1,56 @@
+import random
+from uuid import UUID
+
+import pytest
+
+from core.actor import ThreatActor
+from core.validation import ValidationPolicy
+
+from .conftest import random_actor
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_actors_round_trip(seed):
+    rng = random.Random(seed)
+    for index in range(25):
+        actor = random_actor(rng, index)
+        data = actor.to_dict()
+
+        loaded = ThreatActor.from_dict(data)
+        assert loaded == actor
+        assert loaded.to_dict() == data
+        assert loaded.to_json_bytes() == actor.to_json_bytes()
+
+        from_bytes = ThreatActor.from_json_bytes(actor.to_json_bytes(), ValidationPolicy.TRUSTED)
+        assert from_bytes.to_dict() == data
+
+        compact = ThreatActor.from_json_bytes(actor.to_json_bytes(), compact_uuids=True)
+        assert isinstance(compact.uuid, bytes)
+        assert compact.to_json_bytes() == actor.to_json_bytes()
+
+def test_uuid_round_trips(actor):
+    data = actor.to_dict()
+    assert data["uuid"] == str(actor.uuid)
+    loaded = ThreatActor.from_dict(data)
+    assert loaded.uuid == actor.uuid
+    assert isinstance(loaded.uuid, UUID)
+    assert ThreatActor.from_dict(data, compact_uuids=True).uuid == actor.uuid.bytes
+    assert [ref.reference_id for ref in loaded.references] == [ref.reference_id for ref in actor.references]
+
+def test_documents_without_uuid_get_a_new_one(actor):
+    data = actor.to_dict()
+    del data["uuid"]
+    loaded = ThreatActor.from_dict(data)
+    assert isinstance(loaded.uuid, UUID)
+    assert loaded.uuid != actor.uuid
+
+def test_round_trip_survives_a_database_reload(db_factory, tmp_path):
+    rng = random.Random(99)
+    actors = [random_actor(rng, index) for index in range(20)]
+    db = db_factory()
+    assert db.save_actors(actors)
+    db.close()
+    reopened = db_factory()
+    for actor in actors:
+        loaded = reopened.get_actor(actor.actor_id)
+        assert loaded.uuid == actor.uuid
+        assert loaded.to_json_bytes() == actor.to_json_bytes()
@@ -0,0 +1,106 @@
+import multiprocessing
+
+import pytest
+
+from core.reference import Reference
+from utils.database import ActorDatabase
+from utils.locking import ConflictError, FileLock
+from utils.storage import LogStorage
+
+from .conftest import make_actor
+
+def _reference(label):
+    return Reference(source="Vendor Report", url=f"https://example.org/{label}")
+
+def test_file_lock_excludes_other_holders(tmp_path):
+    holder = FileLock(tmp_path / "write.lock")
+    # A second open of the lock file stands in for another process.
+    waiter = FileLock(tmp_path / "write.lock", timeout=0.05)
+    with holder:
+        with holder:
+            with pytest.raises(TimeoutError):
+                waiter.acquire()
+    with waiter:
+        pass
+    holder.close()
+    waiter.close()
+
+def test_stale_save_raises_conflict(db_factory):
+    first, second = db_factory(shared=True), db_factory(shared=True)
+    assert first.save_actor(make_actor())
+    stale = second.get_actor("TA0001")
+    assert first.update_actor("TA0001", "goals", ["Revenue"], _reference("goals"))
+
+    stale.motivation = "Financial Gain"
+    with pytest.raises(ConflictError) as error:
+        second.save_actor(stale)
+    assert error.value.conflicts == {"TA0001": ("1.0.0", first.get_actor("TA0001").metadata.version)}
+    with pytest.raises(ConflictError):
+        second.save_actors([stale, make_actor("TA0002", "Other")])
+    assert second.get_actor("TA0002") is None
+
+    # A new actor saved by both, and an update against the stored state.
+    assert first.save_actor(make_actor("TA0003", "Gamma"))
+    with pytest.raises(ConflictError):
+        second.save_actor(make_actor("TA0003", "Gamma"))
+    second.actors.discard("TA0001")
+    assert second.update_actor("TA0001", "motivation", "Financial Gain", _reference("motivation"))
+    stored = first.get_actor("TA0001")
+    assert (stored.goals, stored.motivation) == (["Revenue"], "Financial Gain")
+
+def test_merge_applies_disjoint_changes(db_factory):
+    first = db_factory(shared=True, on_conflict="merge", checkpoint_interval=5)
+    second = db_factory(shared=True, on_conflict="merge", checkpoint_interval=5)
+    assert first.save_actor(make_actor())
+    ours = second.get_actor("TA0001")
+    assert first.update_actor("TA0001", "goals", ["Revenue"], _reference("goals"))
+    major, minor, _ = first.get_actor("TA0001").metadata.version.split(".")
+
+    ours.motivation = "Financial Gain"
+    ours.metadata.version_update("minor")
+    assert second.save_actor(ours)
+    # Merged in place: both changes, and our bump on top of their version.
+    assert (ours.goals, ours.motivation) == (["Revenue"], "Financial Gain")
+    assert ours.metadata.version == f"{major}.{int(minor) + 1}.0"
+    first.actors.clear()
+    assert first.get_actor("TA0001").to_dict() == ours.to_dict()
+
+    # The same field on both sides does not merge ...
+    stale = second.get_actor("TA0001")
+    assert first.update_actor("TA0001", "motivation", "Hacktivism", _reference("first"))
+    stale.motivation = "Sabotage"
+    with pytest.raises(ConflictError):
+        second.save_actor(stale)
+    # ... but update_actor() then applies its change to the stored actor
+    # (here after failing to merge the cached, conflicting copy).
+    assert first.update_actor("TA0001", "motivation", "Cyber Espionage", _reference("again"))
+    assert second.update_actor("TA0001", "motivation", "Sabotage", _reference("second"))
+    first.actors.clear()
+    assert first.get_actor("TA0001").motivation == "Sabotage"
+
+def test_shared_needs_lockable_storage(tmp_path):
+    with pytest.raises(ValueError):
+        ActorDatabase(str(tmp_path / "data"), storage=LogStorage(tmp_path / "data" / "log"), shared=True)
+
+def _add_references(data_dir, worker, count):
+    db = ActorDatabase(data_dir, shared=True, on_conflict="merge", checkpoint_interval=5)
+    try:
+        for n in range(count):
+            assert db.add_reference("TA0001", _reference(f"{worker}-{n}"))
+    finally:
+        db.close()
+
+def test_concurrent_processes_keep_every_change(db_factory, tmp_path):
+    db = db_factory(shared=True)
+    assert db.save_actor(make_actor(references=[]))
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_add_references, args=(str(tmp_path / "data"), worker, 8))
+               for worker in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+    assert [worker.exitcode for worker in workers] == [0, 0, 0]
+
+    urls = sorted(reference.url for reference in db.get_actor("TA0001").references)
+    assert urls == sorted(f"https://example.org/{worker}-{n}" for worker in range(3) for n in range(8))
@@ -0,0 +1,97 @@
+import json
+import random
+from collections import Counter
+from datetime import datetime, timezone
+
+import pytest
+
+from utils.snapshot import Snapshot, export_parquet, write_snapshot
+
+from .conftest import random_actor
+
+def _seconds(value):
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+@pytest.fixture
+def corpus(db_factory):
+    rng = random.Random(11)
+    actors = [random_actor(rng, index) for index in range(60)]
+    db = db_factory()
+    assert db.save_actors(actors)
+    return db, actors
+
+def test_tables_match_actors(corpus, tmp_path):
+    db, actors = corpus
+    with Snapshot(write_snapshot(db, tmp_path / "snapshot")) as snapshot:
+        assert snapshot.rows("actors") == len(actors)
+        by_id = {actor.actor_id: actor for actor in actors}
+        ids = snapshot.strings("actors", "actor_id")
+        assert sorted(ids) == sorted(by_id)
+        assert snapshot.strings("actors", "name") == [by_id[actor_id].name for actor_id in ids]
+        assert list(snapshot.column("actors", "confidence_level")) == \
+            [by_id[actor_id].confidence_level for actor_id in ids]
+        # Lists, not the mapped columns: close() needs those released.
+        first = list(snapshot.column("actors", "first_observed"))
+        assert [round(value, 6) for value in first] == \
+            [round(_seconds(by_id[actor_id].first_observed), 6) for actor_id in ids]
+
+        aliases = snapshot.strings("aliases", "alias")
+        links = list(snapshot.column("aliases", "actor"))
+        assert Counter((ids[link], alias) for link, alias in zip(links, aliases)) == \
+            Counter((actor.actor_id, alias) for actor in actors for alias in actor.aliases)
+
+def test_aggregates_match_brute_force(corpus, tmp_path):
+    db, actors = corpus
+    with Snapshot(write_snapshot(db, tmp_path / "snapshot")) as snapshot:
+        expected = Counter(actor.capability_level for actor in actors if actor.capability_level)
+        assert snapshot.value_counts("actors", "capability_level") == dict(expected)
+        assert snapshot.value_counts("tools_malware", "type") == \
+            dict(Counter(tool["type"] for actor in actors for tool in actor.tools_malware))
+        assert snapshot.crosstab("target_sectors", "sector", "capability_level") == dict(Counter(
+            (sector, actor.capability_level)
+            for actor in actors if actor.capability_level for sector in actor.target_sectors
+        ))
+        edges = [0, 1, 3, 5]
+        assert snapshot.histogram("actors", "confidence_level", edges) == [
+            sum(1 for actor in actors if low <= actor.confidence_level < high or
+                (high == edges[-1] and actor.confidence_level == high))
+            for low, high in zip(edges, edges[1:])
+        ]
+        # Missing last_observed values are NaN and not counted.
+        last = [actor.last_observed for actor in actors if actor.last_observed]
+        assert sum(snapshot.histogram("actors", "last_observed", [0, 2e9])) == len(last)
+
+def test_rewrite_replaces_snapshot(corpus, tmp_path):
+    db, actors = corpus
+    path = write_snapshot(db, tmp_path / "snapshot")
+    assert db.save_actor(random_actor(random.Random(12), len(actors)))
+    write_snapshot(db, path)
+    with Snapshot(path) as snapshot:
+        assert snapshot.rows("actors") == len(actors) + 1
+    assert [child.name for child in tmp_path.iterdir() if child.name.startswith("snapshot")] == ["snapshot"]
+
+def test_empty_database_and_version_check(db_factory, tmp_path):
+    path = write_snapshot(db_factory(), tmp_path / "snapshot")
+    with Snapshot(path) as snapshot:
+        assert snapshot.rows("actors") == 0
+        assert snapshot.strings("actors", "actor_id") == []
+        assert snapshot.value_counts("goals", "goal") == {}
+        assert snapshot.histogram("actors", "confidence_level", [0, 5]) == [0]
+
+    manifest = json.loads((path / "manifest.json").read_text())
+    manifest["version"] += 1
+    (path / "manifest.json").write_text(json.dumps(manifest))
+    with pytest.raises(ValueError):
+        Snapshot(path)
+
+def test_export_parquet(corpus, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    db, actors = corpus
+    with Snapshot(write_snapshot(db, tmp_path / "snapshot")) as snapshot:
+        files = export_parquet(snapshot, tmp_path / "parquet")
+        assert sorted(path.stem for path in files) == sorted(snapshot.tables)
+        table = pq.read_table(tmp_path / "parquet" / "actors.parquet")
+        assert table.num_rows == len(actors)
+        assert sorted(table.column("actor_id").to_pylist()) == sorted(actor.actor_id for actor in actors)
@@ -0,0 +1,144 @@
+import random
+import threading
+
+import pytest
+
+from utils.database import ActorDatabase
+from utils.indexes import Range
+from utils.storage import FileStorage, LogStorage, SQLiteStorage, create_storage
+
+from .conftest import make_actor, random_actor
+
+BACKENDS = {
+    "file": lambda directory: FileStorage(directory / "actors", fsync=False),
+    "log": lambda directory: LogStorage(directory / "log"),
+    "sqlite": lambda directory: SQLiteStorage(directory / "stasis.db"),
+}
+
+@pytest.fixture(params=list(BACKENDS))
+def open_storage(request, tmp_path):
+    """Open the backend under test on one directory, closing it afterwards."""
+    opened = []
+
+    def factory():
+        storage = BACKENDS[request.param](tmp_path)
+        opened.append(storage)
+        return storage
+
+    yield factory
+    for storage in opened:
+        storage.close()
+
+_RECORDS = {}
+
+def _record(actor_id, **fields):
+    """Serialized actor, the same bytes for the same arguments."""
+    key = (actor_id, *sorted((name, repr(value)) for name, value in fields.items()))
+    if key not in _RECORDS:
+        _RECORDS[key] = make_actor(actor_id, f"Group {actor_id}", **fields).to_json_bytes()
+    return _RECORDS[key]
+
+def test_read_write_overwrite(open_storage):
+    storage = open_storage()
+    assert storage.read("TA0001") is None
+    assert storage.keys() == []
+
+    first = _record("TA0001")
+    storage.write("TA0001", first)
+    assert storage.read("TA0001") == first
+    second = _record("TA0001", goals=["Disruption"])
+    storage.write("TA0001", second)
+    assert storage.read("TA0001") == second
+    assert storage.keys() == ["TA0001"]
+
+def test_write_many_keys_items(open_storage):
+    storage = open_storage()
+    records = {f"TA{i:04d}": _record(f"TA{i:04d}") for i in range(20)}
+    storage.write_many(records.items())
+    assert sorted(storage.keys()) == sorted(records)
+    assert dict(storage.items()) == records
+
+def test_reopen_keeps_records(open_storage):
+    storage = open_storage()
+    records = {f"TA{i:04d}": _record(f"TA{i:04d}") for i in range(5)}
+    storage.write_many(records.items())
+    storage.write("TA0002", _record("TA0002", motivation="Financial Gain"))
+    storage.close()
+
+    reopened = open_storage()
+    assert sorted(reopened.keys()) == sorted(records)
+    assert reopened.read("TA0002") == _record("TA0002", motivation="Financial Gain")
+    assert reopened.read("TA0003") == records["TA0003"]
+
+def test_arbitrary_bytes_round_trip(open_storage):
+    storage = open_storage()
+    # Not the to_json_bytes() layout: stored and returned as is.
+    records = {"TA0001": b'{"actor_id": "TA0001"}', "TA0002": b'{\n  "name": "\\u00e9"\n}', "TA0003": b"\x00\xff"}
+    storage.write_many(records.items())
+    assert {actor_id: storage.read(actor_id) for actor_id in records} == records
+
+def test_concurrent_writers_and_readers(open_storage):
+    storage = open_storage()
+    errors = []
+
+    def work(worker):
+        try:
+            for i in range(10):
+                actor_id = f"TA{worker}{i:03d}"
+                storage.write(actor_id, _record(actor_id))
+                assert storage.read(actor_id) == _record(actor_id)
+        except Exception as error:  # reported below
+            errors.append(error)
+
+    threads = [threading.Thread(target=work, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(storage.keys()) == 40
+
+def test_database_behaves_alike(open_storage, tmp_path):
+    db = ActorDatabase(str(tmp_path / "data"), storage=open_storage(), checkpoint_interval=None)
+    try:
+        actors = [
+            make_actor("TA0001", "Alpha", capability_level="Basic", confidence_level=2),
+            make_actor("TA0002", "Beta", motivation="Financial Gain", confidence_level=4),
+            make_actor("TA0003", "Gamma", motivation="Financial Gain", confidence_level=5),
+        ]
+        assert db.save_actors(actors)
+        db.actors.clear()
+        assert db.get_actor("TA0002").to_dict() == actors[1].to_dict()
+        found = db.search_actors(motivation="Financial Gain", confidence_level=Range(5, None))
+        assert [actor.actor_id for actor in found] == ["TA0003"]
+        assert [actor.actor_id for actor in db.search_actors(name="Alpha")] == ["TA0001"]
+    finally:
+        db.close()
+
+def test_sqlite_sections_are_json_columns(tmp_path):
+    storage = SQLiteStorage(tmp_path / "stasis.db")
+    try:
+        storage.write("TA0001", _record("TA0001", motivation="Hacktivism"))
+        storage.write("TA0002", b"not json")
+        rows = storage._connection().execute(
+            "SELECT actor_id, json_extract(strategic_context, '$.motivation') FROM actors ORDER BY actor_id"
+        ).fetchall()
+        assert rows == [("TA0001", "Hacktivism"), ("TA0002", None)]
+        # Every serialized actor is split into sections, none kept raw.
+        rng = random.Random(7)
+        for index in range(50):
+            content = random_actor(rng, index).to_json_bytes()
+            row = SQLiteStorage._split(f"TA{index:04d}", content)
+            assert row[-1] is None and SQLiteStorage._assemble(row) == content
+    finally:
+        storage.close()
+
+def test_create_storage_selects_type(tmp_path):
+    for storage_type, kind in [("file", FileStorage), ("log", LogStorage), ("sqlite", SQLiteStorage)]:
+        storage = create_storage(tmp_path / storage_type, {"type": storage_type})
+        try:
+            assert isinstance(storage, kind)
+        finally:
+            storage.close()
+    with pytest.raises(ValueError):
+        create_storage(tmp_path, {"type": "mongodb"})
@@ -0,0 +1,73 @@
+import random
+
+from utils.indexes import TrigramIndex, normalize_name, trigrams
+
+from .conftest import make_actor
+
+def _score(query, name, exact_boost=1.0):
+    """The documented score, computed directly."""
+    query, name = normalize_name(query), normalize_name(name)
+    if query.replace(" ", "") == name.replace(" ", ""):
+        return 1.0 + exact_boost
+    grams, query_grams = trigrams(name), trigrams(query)
+    shared = len(grams & query_grams)
+    return (shared / len(grams | query_grams) + shared / len(query_grams)) / 2
+
+def test_normalization():
+    assert normalize_name("  Sofacy-Group (APT 28) ") == "sofacy group apt 28"
+    assert normalize_name("Équipe Ōkami") == "equipe okami"
+    assert trigrams("ab") == {"  a", " ab", "ab "}
+
+def test_fuzzy_matches_rank_exact_first():
+    index = TrigramIndex()
+    index.update("TA0001", ["APT28", "Fancy Bear", "Sofacy"])
+    index.update("TA0002", ["APT29", "Cozy Bear"])
+    index.update("TA0003", ["Lazarus Group"])
+
+    assert index.search("apt-28")[0] == ("TA0001", 2.0)
+    assert [actor_id for actor_id, _ in index.search("sofacyy")] == ["TA0001"]
+    assert index.search("bear", threshold=0.2)[0][0] in {"TA0001", "TA0002"}
+    assert index.search("lazarus")[0][0] == "TA0003"
+    assert index.search("") == [] and index.search("apt", limit=0) == []
+
+def test_updates_replace_names():
+    index = TrigramIndex()
+    index.update("TA0001", ["Sofacy"])
+    index.update("TA0002", ["Sofacy"])
+    index.update("TA0001", ["Strontium"])
+    assert [actor_id for actor_id, _ in index.search("sofacy")] == ["TA0002"]
+    index.remove("TA0002")
+    assert index.search("sofacy") == []
+    assert index.search("strontium")[0][0] == "TA0001"
+
+def test_search_matches_brute_force():
+    rng = random.Random(5)
+    syllables = ["apt", "bear", "cozy", "fancy", "lazarus", "panda", "kitten", "spider", "turla", "ocean"]
+    names = {f"TA{n:04d}": [" ".join(rng.sample(syllables, rng.randint(1, 3))) + f" {rng.randint(0, 40)}"
+                            for _ in range(rng.randint(1, 3))]
+             for n in range(300)}
+    index = TrigramIndex()
+    for actor_id, terms in names.items():
+        index.update(actor_id, terms)
+
+    for query in ["fancy bear 12", "cozy panda", "lazarus", "turla ocen", "kitten 7", "spidr"]:
+        expected = sorted(((actor_id, max(_score(query, name) for name in terms))
+                           for actor_id, terms in names.items()), key=lambda item: (item[1], item[0]),
+                          reverse=True)
+        expected = [(actor_id, score) for actor_id, score in expected if score >= 0.3][:10]
+        results = index.search(query, limit=10, threshold=0.3)
+        assert [round(score, 9) for _, score in results] == [round(score, 9) for _, score in expected], query
+        assert {actor_id for actor_id, _ in results} == {actor_id for actor_id, _ in expected}, query
+
+def test_database_find_by_name(db_factory):
+    db = db_factory()
+    db.save_actors([make_actor("TA0001", "Sofacy", aliases=["Fancy Bear"]),
+                    make_actor("TA0002", "Cozy Bear", aliases=[])])
+    db.close()
+    db = db_factory()
+    (actor, score), *_ = db.find_by_name("fancy bare")
+    assert actor.actor_id == "TA0001" and 0.3 <= score < 1
+    actor = db.get_actor("TA0002")
+    actor.aliases.append("The Dukes")
+    assert db.save_actor(actor)
+    assert db.find_by_name("the dukes")[0][0].actor_id == "TA0002"
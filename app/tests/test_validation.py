@@ -0,0 +1,169 @@
+import pytest
+
+from core.actor import ThreatActor
+from core.validation import (
+    ValidationPolicy,
+    validate_actor_data,
+    validate_actor_section,
+)
+
+from .conftest import make_actor, make_reference
+
+def test_actor_documents_match_section_schemas(actor):
+    assert validate_actor_data(actor.to_dict(), ValidationPolicy.STRICT)
+    assert actor.validate()
+
+def test_minimal_actor_is_valid():
+    from core.metadata import Metadata
+
+    actor = ThreatActor(actor_id="TA0100", name="Unknown Group", metadata=Metadata())
+    assert actor.validate()
+
+@pytest.mark.parametrize("key, field, value", [
+    ("core_identification", "confidence_level", 9),
+    ("core_identification", "aliases", "not a list"),
+    ("technical_profile", "tools_malware", {"name": "x"}),
+    ("strategic_context", "relationships", [{"related_actor": "TA0002"}]),
+    ("metadata", "tlp_level", "PURPLE"),
+    ("metadata", "version", "one"),
+])
+def test_invalid_sections_are_rejected(actor, key, field, value):
+    data = actor.to_dict()
+    data[key] = dict(data[key], **{field: value})
+    with pytest.raises(ValueError):
+        validate_actor_data(data, ValidationPolicy.STRICT)
+
+def test_unknown_section_keys_are_rejected(actor):
+    section = dict(actor.section_dict("identification"), unique_id="TA23CHN-APT001")
+    with pytest.raises(ValueError):
+        validate_actor_section("identification", section, ValidationPolicy.STRICT)
+
+def test_update_field_validates_under_strict(actor):
+    actor.update_field("confidence_level", 5, make_reference())
+    assert actor.confidence_level == 5
+    with pytest.raises(ValueError):
+        actor.update_field("confidence_level", 6, make_reference())
+    assert actor.confidence_level == 5
+
+def test_save_and_reload_under_strict(db_factory, tmp_path):
+    db = db_factory()
+    actor = make_actor()
+    assert db.save_actor(actor)
+    assert db.update_actor(actor.actor_id, "capability_level", "Intermediate", make_reference())
+    assert db.update_many(actor.actor_id, {"motivation": "Financial Gain", "goals": ["Revenue"]},
+                          make_reference("Other Vendor"))
+    expected = db.get_actor(actor.actor_id).to_dict()
+    db.close()
+
+    # Without the index every record is validated strictly on load.
+    (tmp_path / "data" / "index.log").unlink()
+    reopened = db_factory()
+    assert list(reopened.index) == [actor.actor_id]
+    loaded = reopened.get_actor(actor.actor_id)
+    assert loaded is not None
+    assert loaded.to_dict() == expected
+    assert loaded.capability_level == "Intermediate"
+    assert loaded.goals == ["Revenue"]
+
+def test_batch_update_bumps_once(db_factory):
+    db = db_factory()
+    assert db.save_actor(make_actor())
+    entries = len(db.get_actor("TA0001").metadata.revision_history)
+    assert db.update_many("TA0001", {"motivation": "Financial Gain", "goals": ["Revenue"],
+                                     "confidence_level": 4}, make_reference("Other Vendor"))
+    actor = db.get_actor("TA0001")
+    # One version bump and one history entry for the whole batch.
+    assert actor.metadata.version == "1.1.0"
+    history = actor.metadata.revision_history
+    assert len(history) == entries + 1
+    assert (history[-1]["version"], history[-1]["type"]) == ("1.1.0", "minor")
+    added = [reference for reference in actor.references if reference.source == "Other Vendor"]
+    assert len(added) == 1
+    assert sorted(added[0].fields_referenced) == ["confidence_level", "goals", "motivation"]
+
+@pytest.mark.parametrize("updates, error", [
+    # Fails validation of the second section.
+    ({"motivation": "Financial Gain", "confidence_level": 9}, ValueError),
+    # Fails building a section (not a ValueError).
+    ({"goals": ["Revenue"], "first_observed": "2020-01-01"}, AttributeError),
+])
+def test_failed_batch_update_restores_every_field(actor, updates, error):
+    before = actor.to_dict()
+    references = len(actor.references)
+    with pytest.raises(error):
+        actor.batch_update(updates, make_reference("Other Vendor"))
+    assert actor.to_dict() == before
+    assert actor.metadata.version == "1.0.0" and actor.metadata.revision_history == []
+    assert len(actor.references) == references
+
+def test_failed_update_many_saves_nothing(db_factory):
+    db = db_factory()
+    assert db.save_actor(make_actor())
+    stored = db.storage.read("TA0001")
+    assert not db.update_many("TA0001", {"goals": ["Revenue"], "confidence_level": 9}, make_reference())
+    assert db.storage.read("TA0001") == stored
+    assert db.get_actor("TA0001").goals == ["Intelligence collection"]
+
+def test_deferred_policy_collects_errors(actor):
+    from core.validation import DeferredValidationError, validation_policy
+
+    bad = actor.to_dict()
+    bad["core_identification"] = dict(bad["core_identification"], confidence_level=9)
+    with pytest.raises(DeferredValidationError) as raised:
+        with validation_policy(ValidationPolicy.DEFERRED):
+            assert not validate_actor_data(bad)
+            assert validate_actor_data(actor.to_dict())
+    assert [actor_id for actor_id, _ in raised.value.errors] == [actor.actor_id]
+
+def test_deferred_policy_needs_a_context(actor):
+    with pytest.raises(RuntimeError):
+        validate_actor_data(actor.to_dict(), ValidationPolicy.DEFERRED)
+
+def test_validate_many_workers_use_the_callers_registry(tmp_path, actor):
+    import json
+    import shutil
+
+    from core.validation import SCHEMA_DIR, SchemaRegistry, validate_many
+
+    # A copy of the schemas that also requires a known creator.
+    schema_dir = tmp_path / "schemas"
+    shutil.copytree(SCHEMA_DIR / "stasis", schema_dir)
+    metadata_schema = json.loads((schema_dir / "actor-metadata.json").read_text())
+    metadata_schema["properties"]["creator"]["enum"] = ["Analyst"]
+    (schema_dir / "actor-metadata.json").write_text(json.dumps(metadata_schema))
+    registry = SchemaRegistry(schema_dir, cache_dir=tmp_path / "cache", compile_validators=False)
+
+    documents = [actor.to_dict() for _ in range(4)]
+    reports = validate_many(documents, max_workers=2, chunksize=1, registry=registry)
+    assert [report.valid for report in reports] == [False] * 4
+    assert {error.pointer for error in reports[0].errors} == {"/metadata/creator"}
+    assert not (tmp_path / "cache").exists()
+
+    inline = validate_many(documents, max_workers=1, registry=registry)
+    assert [report.to_dict() for report in inline] == [report.to_dict() for report in reports]
+
+def test_validate_many_reports_every_violation(actor):
+    from core.validation import validate_many
+
+    broken = actor.to_dict()
+    broken["core_identification"] = dict(broken["core_identification"], confidence_level=9)
+    broken["strategic_context"] = dict(broken["strategic_context"],
+                                       relationships=[{"related_actor": "TA0002"}, {"relationship_type": 7}])
+    missing = actor.to_dict()
+    del missing["technical_profile"]
+    inputs = [actor, broken, missing, make_actor("TA0002")]
+
+    for max_workers in (1, 2):
+        reports = validate_many(inputs, max_workers=max_workers, chunksize=1)
+        assert [(report.index, report.actor_id, report.valid) for report in reports] == \
+            [(0, "TA0001", True), (1, "TA0001", False), (2, "TA0001", False), (3, "TA0002", True)]
+        assert sorted((error.pointer, error.validator) for error in reports[1].errors) == [
+            ("/core_identification/confidence_level", "maximum"),
+            ("/strategic_context/relationships/0", "required"),
+            ("/strategic_context/relationships/1", "required"),
+            ("/strategic_context/relationships/1/relationship_type", "type"),
+        ]
+        assert [error.to_dict() for error in reports[2].errors] == [{
+            "section": "technical", "pointer": "/technical_profile",
+            "message": "'technical_profile' is a required property", "validator": "required",
+        }]
@@ -0,0 +1,87 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from core.reference import Reference
+from utils.patch import apply_patch
+from utils.versions import VersionStore
+
+def _documents(count):
+    """Successive states of one actor document."""
+    documents = []
+    for n in range(count):
+        documents.append({
+            "actor_id": "TA0001",
+            "name": f"Name {n}",
+            "aliases": [f"Alias {i}" for i in range(n % 4)],
+            "metadata": {"version": f"1.{n}.0"},
+        })
+    return documents
+
+def _record(store, documents):
+    store.record(("TA0001", json.dumps(document).encode(), document["metadata"]["version"], f"c{n}")
+                 for n, document in enumerate(documents))
+
+def test_get_across_checkpoints(tmp_path):
+    store = VersionStore(tmp_path / "versions", checkpoint_interval=3)
+    documents = _documents(8)
+    # One save at a time, as ActorDatabase records them.
+    for document in documents:
+        _record(store, [document])
+
+    entries = [json.loads(line) for line in (tmp_path / "versions" / "TA0001.jsonl").read_text().splitlines()]
+    assert [entry["seq"] for entry in entries if "checkpoint" in entry] == [1, 4, 7]
+    for seq, document in enumerate(documents, 1):
+        assert store.get("TA0001", seq) == document
+        assert store.get("TA0001", document["metadata"]["version"]) == document
+    # A fresh store (no cached head) rebuilds the same documents.
+    assert VersionStore(tmp_path / "versions", checkpoint_interval=3).get("TA0001", 6) == documents[5]
+    assert store.get("TA0001", 9) is None
+
+def test_diff_across_checkpoint(tmp_path):
+    store = VersionStore(tmp_path / "versions", checkpoint_interval=3)
+    documents = _documents(8)
+    for document in documents:
+        _record(store, [document])
+
+    # Versions 2 and 6 sit on either side of the checkpoint at 4.
+    patch = store.diff("TA0001", 2, 6)
+    assert apply_patch(documents[1], patch) == documents[5]
+    assert apply_patch(documents[5], store.diff("TA0001", 6, 2)) == documents[1]
+    assert store.diff("TA0001", 3, 3) == []
+    assert store.diff("TA0001", 1, 42) is None
+
+def test_get_as_of(tmp_path):
+    store = VersionStore(tmp_path / "versions")
+    before = datetime.now(timezone.utc) - timedelta(seconds=1)
+    _record(store, _documents(1))
+    assert store.get("TA0001", as_of=before) is None
+    assert store.get("TA0001", as_of=datetime.now(timezone.utc))["name"] == "Name 0"
+    with pytest.raises(ValueError):
+        store.get("TA0001", as_of="yesterday")
+
+def test_database_versions_are_opt_in(db_factory, actor):
+    db = db_factory()
+    assert db.versions is None
+    assert db.save_actor(actor)
+    assert db.list_versions("TA0001") == []
+    assert db.diff("TA0001", 1, 1) is None
+    with pytest.raises(ValueError):
+        db_factory(on_conflict="merge")
+
+def test_database_history_across_checkpoint(db_factory, actor):
+    db = db_factory(checkpoint_interval=2)
+    assert db.save_actor(actor)
+    goals = []
+    for n in range(4):
+        goals.append(f"Goal {n}")
+        reference = Reference(source="Vendor Report", url=f"https://example.org/{n}")
+        assert db.update_actor("TA0001", "goals", list(goals), reference)
+    versions = db.list_versions("TA0001")
+    assert [version["seq"] for version in versions] == [1, 2, 3, 4, 5]
+
+    patch = db.diff("TA0001", 2, 5)
+    assert {"op": "add", "path": "/strategic_context/goals/1", "value": "Goal 1"} in patch
+    assert db.get_actor("TA0001", as_of=versions[-1]["saved"]).goals == goals
+    assert db.get_actor("TA0001", as_of="2000-01-01T00:00:00") is None
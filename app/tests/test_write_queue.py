@@ -0,0 +1,115 @@
+import threading
+
+from core.reference import Reference
+from utils.storage import FileStorage
+
+from .conftest import make_actor
+
+class BlockingStorage(FileStorage):
+    """File storage whose batch writes wait until released."""
+
+    def __init__(self, directory):
+        super().__init__(directory, fsync=False)
+        self.writing = threading.Event()
+        self.release = threading.Event()
+
+    def write_many(self, records):
+        records = list(records)
+        self.writing.set()
+        assert self.release.wait(5)
+        super().write_many(records)
+
+def test_saves_coalesce_and_flush(db_factory):
+    db = db_factory()
+    with db.write_behind(max_batch=100, interval=None) as queue:
+        for n in range(3):
+            actor = db.get_actor("TA0001") or make_actor()
+            actor.goals = [f"Goal {n}"]
+            assert db.save_actor(actor)
+        assert len(queue) == 1 and not (db.actors_dir / "TA0001.json").exists()
+        assert queue.flush()
+        assert queue.stats() == {"saves": 3, "coalesced": 2, "batches": 1, "pending": 0}
+    assert db.write_queue is None
+    db.actors.clear()
+    assert db.get_actor("TA0001").goals == ["Goal 2"]
+
+def test_batch_in_flight_stays_visible(db_factory, tmp_path):
+    storage = BlockingStorage(tmp_path / "data" / "actors")
+    db = db_factory(storage=storage)
+    queue = db.write_behind(interval=None)
+    actor = make_actor()
+    assert db.save_actor(actor)
+
+    flusher = threading.Thread(target=queue.flush)
+    flusher.start()
+    try:
+        assert storage.writing.wait(5)
+        # Neither pending nor stored yet: served from the batch in flight.
+        assert len(queue) == 0 and storage.read("TA0001") is None
+        assert db.get_actor("TA0001") is actor
+    finally:
+        storage.release.set()
+        flusher.join()
+    queue.close()
+    assert db.get_actor("TA0001").to_dict() == actor.to_dict()
+
+def test_failed_flush_requeues(db_factory, tmp_path, monkeypatch):
+    db = db_factory()
+    queue = db.write_behind(interval=None)
+    assert db.save_actor(make_actor())
+    monkeypatch.setattr(db, "_save_prepared", lambda saves: False)
+    assert not queue.flush()
+    assert len(queue) == 1 and db.get_actor("TA0001") is not None
+    monkeypatch.undo()
+    assert queue.close()
+    assert (tmp_path / "data" / "actors" / "TA0001.json").exists()
+
+def _update_and_save(db, actors, rounds):
+    for n in range(rounds):
+        for actor in actors:
+            actor.update_field("goals", [f"Goal {n}"], Reference(source="Vendor Report",
+                                                                  url=f"https://example.org/{n}"))
+            assert db.save_actor(actor)
+
+def test_background_flushes_keep_every_save(db_factory, tmp_path):
+    direct = db_factory(data_dir=str(tmp_path / "direct"), history_limit=5)
+    actors = [make_actor(f"TA{n:04d}", f"Group {n}") for n in range(10)]
+    assert direct.save_actors(actors)
+    _update_and_save(direct, actors, 60)
+    expected = {actor.actor_id: [entry["version"] for entry in direct.get_revision_history(actor.actor_id)]
+                for actor in actors}
+
+    db = db_factory(history_limit=5)
+    actors = [make_actor(f"TA{n:04d}", f"Group {n}") for n in range(10)]
+    assert db.save_actors(actors)
+    errors = []
+    done = threading.Event()
+
+    def read():
+        # Searches run against indexes the flusher is updating.
+        try:
+            while not done.is_set():
+                db.search_actors(goals="Goal 1")
+                list(db.query("confidence_level >= 0", sort="name"))
+                db.active_actors("2020-01-01")
+                db.find_by_name("group 3")
+        except Exception as error:  # reported below
+            errors.append(error)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    try:
+        with db.write_behind(interval=0.0005) as queue:
+            _update_and_save(db, actors, 60)
+        assert queue.stats()["batches"] > 1
+    finally:
+        done.set()
+        reader.join()
+    assert errors == []
+
+    db.actors.clear()
+    for actor in actors:
+        versions = [entry["version"] for entry in db.get_revision_history(actor.actor_id)]
+        assert versions == expected[actor.actor_id]
+        assert db.get_actor(actor.actor_id).metadata.version == actor.metadata.version
+        assert len(db.get_actor(actor.actor_id).metadata.revision_history) == 5
@@ -0,0 +1,55 @@
+"""
+Export actors from the command line.
+
+    python -m tools.export --format json --output /backup/actors.json
+    python -m tools.export --start-date 2023-01-01 --end-date 2023-12-31
+"""
+import argparse
+import sys
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from core.serialization import parse_datetime
+from services.export import ExportService
+from utils.database import ActorDatabase
+
+def _end_date(value: str) -> datetime:
+    """End of the timeframe; a plain date covers that whole day."""
+    end = parse_datetime(value)
+    if len(value) == 10:
+        end += timedelta(days=1, microseconds=-1)
+    return end
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export threat actors.")
+    parser.add_argument("--format", default="json", choices=["json", "stix", "csv", "markdown"])
+    parser.add_argument("--output", help="Output file (default: standard output)")
+    parser.add_argument("--start-date", type=parse_datetime,
+                        help="Only actors active on or after this date")
+    parser.add_argument("--end-date", type=_end_date,
+                        help="Only actors active on or before this date")
+    parser.add_argument("--data-dir", help="Data directory (default: the application's)")
+    args = parser.parse_args(argv)
+
+    database = ActorDatabase(args.data_dir)
+    try:
+        if args.start_date or args.end_date:
+            # Actors whose observed activity overlaps the timeframe.
+            actors = database.active_actors(args.start_date, args.end_date)
+        else:
+            actors = database.search_actors()
+        content = ExportService().export_multiple_actors(actors, args.format)
+    finally:
+        database.close()
+    if content is None:
+        return 1
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(content)
+    else:
+        sys.stdout.write(content + "\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterator, Optional
+
+class LRUCache:
+    """
+    Least-recently-used cache bounded by entry count and/or total weight
+    (e.g. record size in bytes), with hit, miss and eviction counters.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, max_weight: Optional[int] = None):
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._weights: Dict[Hashable, int] = {}
+        self._weight = 0
+        self._lock = threading.RLock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get an entry and mark it most recently used."""
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Get an entry without touching its recency or the counters."""
+        with self._lock:
+            return self._entries.get(key, default)
+
+    def put(self, key: Hashable, value: Any, weight: int = 1) -> None:
+        """Add or replace an entry, evicting least recently used ones to fit."""
+        with self._lock:
+            self.discard(key)
+            self._entries[key] = value
+            self._weights[key] = weight
+            self._weight += weight
+            self._evict()
+
+    def discard(self, key: Hashable) -> None:
+        """Remove an entry if present (not counted as an eviction)."""
+        with self._lock:
+            if key in self._entries:
+                del self._entries[key]
+                self._weight -= self._weights.pop(key)
+
+    def _evict(self) -> None:
+        # The newest entry is kept even if it alone exceeds max_weight.
+        while len(self._entries) > 1 and (
+            (self.max_entries is not None and len(self._entries) > self.max_entries)
+            or (self.max_weight is not None and self._weight > self.max_weight)
+        ):
+            key, _ = self._entries.popitem(last=False)
+            self._weight -= self._weights.pop(key)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._weights.clear()
+            self._weight = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        with self._lock:
+            return iter(list(self._entries))
+
+    def stats(self) -> Dict[str, int]:
+        """Entry count, total weight and the hit/miss/eviction counters."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "weight": self._weight,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,397 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from bisect import bisect_right
+from contextlib import nullcontext
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from core.serialization import loads
+from utils.locking import FileLock
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+@dataclass
+class Change:
+    """
+    One change in a ChangeFeed: the actor and kind of change ("save",
+    "update" or "reference"), the metadata version it produced, and a JSON
+    Patch (RFC 6902) from the actor's previous saved state. The first save
+    of an actor replaces the whole document: a single operation on path "".
+    """
+    seq: int
+    actor_id: str
+    type: str
+    version: str
+    timestamp: str
+    patch: List[Dict[str, Any]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+class Cursor:
+    """
+    Position of a consumer in a change feed, kept in a file so it can
+    resume where it stopped: commit() the seq of each change (or batch)
+    once it is processed, and pass position to the feed on restart.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        try:
+            self.position = int(self.path.read_text().strip() or 0)
+        except FileNotFoundError:
+            self.position = 0
+
+    def commit(self, seq: int) -> None:
+        """Store a new position atomically."""
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        tmp_path.write_text(str(seq))
+        os.replace(tmp_path, self.path)
+        self.position = seq
+
+class ChangeFeed:
+    """
+    Append-only feed of actor changes with increasing sequence numbers.
+
+    Changes are JSON lines in segment files named after their first
+    sequence number, so reading from a cursor opens the one segment that
+    holds it and continues from there; a segment is sealed after
+    segment_entries changes. On open, a torn final line (e.g. from a crash
+    during an append) is truncated.
+
+    Consumers read with changes() from a cursor, follow the feed with the
+    blocking iterate(), or subscribe() from asyncio.
+
+    With retention, sealed segments are deleted once at least retention
+    newer changes follow them, so a consumer whose cursor falls further
+    behind misses the changes in between.
+
+    Several processes can share a feed when given a lock on a common file:
+    appends then hold it and first pick up what others appended, readers
+    check the segment files for new changes (see sync()), and followers
+    poll for them every poll_interval seconds.
+    """
+
+    def __init__(self, directory: Path, segment_entries: int = 10000, fsync: bool = False,
+                 lock: Optional[FileLock] = None, poll_interval: float = 0.5,
+                 retention: Optional[int] = None):
+        if retention is not None and retention < 0:
+            raise ValueError("retention must not be negative")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_entries = segment_entries
+        self.retention = retention
+        self.fsync = fsync
+        self.lock = lock
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._appended = threading.Condition(self._lock)
+        # asyncio subscribers: (event loop, event set on every append)
+        self._subscribers: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+        with self._shared():
+            self._segments = self._list_segments()
+            self.last_seq, self._active_entries, self._end = self._recover()
+            # Segments and active segment size as last seen, to notice
+            # appends by other processes.
+            self._disk = self._disk_state(self._segments)
+        self._writer = None
+
+    def _shared(self):
+        """The cross-process lock, if the feed is shared."""
+        return self.lock if self.lock is not None else nullcontext()
+
+    def _list_segments(self) -> List[int]:
+        return sorted(self._first_seq(path) for path in self.directory.glob("changes-*.log"))
+
+    def _disk_state(self, segments: List[int]) -> Tuple[Tuple[int, ...], int]:
+        try:
+            size = self._segment_path(segments[-1]).stat().st_size if segments else 0
+        except FileNotFoundError:
+            size = -1
+        return tuple(segments), size
+
+    def _segment_path(self, first_seq: int) -> Path:
+        return self.directory / f"changes-{first_seq:012d}.log"
+
+    @staticmethod
+    def _first_seq(path: Path) -> int:
+        return int(path.stem.split("-")[1])
+
+    def _recover(self, truncate: bool = True, start: int = 0) -> Tuple[int, int, int]:
+        """
+        Last sequence number and entry count of the active segment, and
+        the end of its last complete entry, truncating a torn tail. From a
+        start offset, only the entries after the known ones are read.
+        """
+        if not self._segments:
+            return 0, 0, 0
+        path = self._segment_path(self._segments[-1])
+        try:
+            with open(path, 'rb') as f:
+                f.seek(start)
+                content = f.read()
+        except FileNotFoundError:
+            # Pruned by another process.
+            return self._segments[-1] - 1, 0, 0
+        last_seq, entries, end = (self.last_seq, self._active_entries, start) if start \
+            else (self._segments[-1] - 1, 0, 0)
+        for line in content.splitlines(keepends=True):
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("incomplete line")
+                last_seq = self._line_seq(line)
+            except (ValueError, KeyError, TypeError):
+                if truncate:
+                    logger.warning(f"Truncating torn change feed entry in {path.name}")
+                break
+            entries += 1
+            end += len(line)
+        if truncate and end < start + len(content):
+            with open(path, 'r+b') as f:
+                f.truncate(end)
+        return last_seq, entries, end
+
+    def sync(self, truncate: bool = False) -> bool:
+        """
+        Pick up changes other processes appended to a shared feed: a
+        directory listing and a stat when nothing changed.
+
+        Args:
+            truncate: Truncate a torn final entry (only safe while holding
+                the lock, when no other process can be appending)
+
+        Returns:
+            bool: True if the feed changed on disk
+        """
+        if self.lock is None:
+            return False
+        with self._lock:
+            segments = self._list_segments()
+            if self._disk_state(segments) == self._disk:
+                return False
+            # Appended to the same active segment: read on from the last
+            # known entry.
+            start = self._end if segments and tuple(segments) == self._disk[0] else 0
+            if not start and self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            self._segments = segments
+            previous = self.last_seq
+            self.last_seq, self._active_entries, self._end = self._recover(truncate, start)
+            self._disk = self._disk_state(segments)
+            if self.last_seq <= previous:
+                return True
+            self._appended.notify_all()
+            subscribers = list(self._subscribers)
+        self._notify(subscribers)
+        return True
+
+    def append(self, changes: Iterable[Tuple[str, str, str, List[Dict[str, Any]]]]) -> List[Change]:
+        """
+        Append changes and wake up consumers.
+
+        Args:
+            changes: (actor ID, type, version, patch) tuples
+
+        Returns:
+            List[Change]: The changes with their sequence numbers
+        """
+        timestamp = datetime.now(timezone.utc).isoformat()
+        with self._shared():
+            self.sync(truncate=True)
+            with self._lock:
+                appended = []
+                for actor_id, kind, version, patch in changes:
+                    if self._writer is None or self._active_entries >= self.segment_entries:
+                        self._roll()
+                    self.last_seq += 1
+                    change = Change(self.last_seq, actor_id, kind, version, timestamp, patch)
+                    self._writer.write(json.dumps(change.to_dict()) + "\n")
+                    self._active_entries += 1
+                    appended.append(change)
+                if not appended:
+                    return appended
+                self._writer.flush()
+                if self.fsync:
+                    os.fsync(self._writer.fileno())
+                self._end = os.fstat(self._writer.fileno()).st_size
+                self._disk = (tuple(self._segments), self._end)
+                self._appended.notify_all()
+                subscribers = list(self._subscribers)
+            if self.retention is not None:
+                self.prune(self.last_seq - self.retention)
+        self._notify(subscribers)
+        return appended
+
+    def _notify(self, subscribers: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]) -> None:
+        for loop, event in subscribers:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The subscriber's loop is closed.
+                self._unsubscribe(loop, event)
+
+    def _roll(self) -> None:
+        """Open the active segment for appending, starting a new one if it is full."""
+        if self._writer is not None:
+            self._writer.close()
+        if not self._segments or self._active_entries >= self.segment_entries:
+            self._segments.append(self.last_seq + 1)
+            self._active_entries = 0
+        self._writer = open(self._segment_path(self._segments[-1]), 'a', encoding='utf-8')
+
+    def changes(self, after: int = 0, limit: Optional[int] = None) -> Iterator[Change]:
+        """
+        Changes with a sequence number above a cursor, oldest first.
+
+        Args:
+            after: Cursor: the seq of the last change already processed
+                (0 for the start of the feed)
+            limit: Maximum number of changes
+
+        Returns:
+            Iterator[Change]: The changes, read lazily
+        """
+        self.sync()
+        with self._lock:
+            segments = list(self._segments)
+            last_seq = self.last_seq
+        if limit == 0:
+            return
+        count = 0
+        position = max(bisect_right(segments, after + 1) - 1, 0)
+        for first_seq in segments[position:]:
+            try:
+                f = open(self._segment_path(first_seq), 'rb')
+            except FileNotFoundError:
+                # Pruned while reading.
+                continue
+            with f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    seq = self._line_seq(line)
+                    if seq <= after:
+                        continue
+                    if seq > last_seq:
+                        return
+                    yield Change(**loads(line))
+                    count += 1
+                    if limit is not None and count >= limit:
+                        return
+
+    @staticmethod
+    def _line_seq(line: bytes) -> int:
+        """Sequence number of an entry, read without decoding the rest of it."""
+        if line.startswith(b'{"seq": '):
+            try:
+                return int(line[8:line.index(b",", 8)])
+            except ValueError:
+                pass
+        return loads(line)["seq"]
+
+    def iterate(self, after: int = 0, follow: bool = True,
+                timeout: Optional[float] = None) -> Iterator[Change]:
+        """
+        Iterate changes after a cursor and, with follow, wait for new ones.
+
+        Args:
+            after: Cursor to start after
+            follow: Keep waiting for new changes once caught up
+            timeout: Stop after waiting this many seconds without a new
+                change (None to wait indefinitely)
+
+        Returns:
+            Iterator[Change]: The changes, oldest first
+        """
+        while True:
+            for change in self.changes(after):
+                after = change.seq
+                yield change
+            if not follow:
+                return
+            if self.lock is None:
+                with self._lock:
+                    if self.last_seq <= after and not self._appended.wait_for(
+                            lambda: self.last_seq > after, timeout):
+                        return
+                continue
+            # Other processes' appends are only seen by polling.
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self.last_seq <= after and not self.sync():
+                wait = self.poll_interval if deadline is None \
+                    else min(self.poll_interval, deadline - time.monotonic())
+                if wait <= 0:
+                    return
+                with self._lock:
+                    self._appended.wait_for(lambda: self.last_seq > after, wait)
+
+    async def subscribe(self, after: int = 0, batch_size: int = 500) -> AsyncIterator[Change]:
+        """
+        Asynchronously iterate changes after a cursor, then new changes as
+        they are appended (from any thread). Reads run in the loop's
+        default executor.
+
+        Args:
+            after: Cursor to start after
+            batch_size: Changes read per executor call
+        """
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        with self._lock:
+            self._subscribers.append((loop, event))
+        try:
+            while True:
+                event.clear()
+                batch = await loop.run_in_executor(None, lambda: list(self.changes(after, batch_size)))
+                for change in batch:
+                    after = change.seq
+                    yield change
+                if len(batch) < batch_size:
+                    if self.lock is None:
+                        await event.wait()
+                        continue
+                    # Other processes' appends are only seen by polling.
+                    try:
+                        await asyncio.wait_for(event.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            self._unsubscribe(loop, event)
+
+    def _unsubscribe(self, loop: asyncio.AbstractEventLoop, event: asyncio.Event) -> None:
+        with self._lock:
+            if (loop, event) in self._subscribers:
+                self._subscribers.remove((loop, event))
+
+    def prune(self, before: int) -> int:
+        """
+        Delete sealed segments holding only changes up to before, e.g. the
+        lowest cursor of all consumers.
+
+        Returns:
+            int: Number of segments deleted
+        """
+        with self._shared():
+            self.sync()
+            with self._lock:
+                removable = [first_seq for first_seq, next_first in zip(self._segments, self._segments[1:])
+                             if next_first - 1 <= before]
+                for first_seq in removable:
+                    self._segment_path(first_seq).unlink(missing_ok=True)
+                    self._segments.remove(first_seq)
+                self._disk = self._disk_state(self._segments)
+                return len(removable)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
@@ -1,67 +1,947 @@
+import heapq
 import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import asdict, dataclass, field, fields
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 from datetime import datetime
+from itertools import chain, islice
 
 from core.actor import ThreatActor
+from core.metadata import DEFAULT_HISTORY_LIMIT
 from core.reference import Reference
+from core.serialization import loads
+from core.validation import (
+    ValidationPolicy,
+    content_checksum,
+    get_schema_registry,
+    init_schema_worker,
+    validate_actor_data,
+)
+from utils.cache import LRUCache
+from utils.changes import ChangeFeed
+from utils.indexes import SecondaryIndexes, TrigramIndex, match_value, order_key, sort_key
+from utils.locking import ConflictError, FileLock
 from utils.logger import get_logger
+from utils.patch import merge
+from utils.query import Predicate, candidates, compile_predicate, parse_query, path_getter
+from utils.storage import ActorStorage, LogStorage, create_storage
+from utils.versions import VersionRef, VersionStore
+from utils.write_queue import WriteBehindQueue
 
 logger = get_logger(__name__)
 
+# Attempts of update_actor(), update_many() and add_reference() when saves
+# conflict and on_conflict is "merge".
+CONFLICT_RETRIES = 5
+
+# Saves per full version checkpoint when the change feed turns versions on.
+DEFAULT_CHECKPOINT_INTERVAL = 20
+
+@dataclass
+class ActorSummary:
+    """
+    Index entry for a stored actor: the fields searches are answered from
+    without reading the record, plus the checksum and size of the record.
+    """
+    actor_id: str
+    name: str
+    aliases: List[str]
+    version: str
+    checksum: str
+    size: int
+    capability_level: Optional[str]
+    motivation: Optional[str]
+    confidence_level: int
+    first_observed: Optional[str]
+    last_observed: Optional[str]
+    target_sectors: List[str]
+    goals: List[str]
+    geographic_targeting: List[str]  # keys only
+    # [kind, key, first_observed, last_observed] windows of the actor's
+    # techniques and relationships, see utils.indexes.WINDOW_KINDS
+    activity: List[List[Optional[str]]]
+
+    @classmethod
+    def from_actor(cls, actor: ThreatActor, checksum: str, size: int) -> "ActorSummary":
+        return cls(
+            actor_id=actor.actor_id,
+            name=actor.name,
+            aliases=list(actor.aliases),
+            version=actor.metadata.version,
+            checksum=checksum,
+            size=size,
+            capability_level=actor.capability_level,
+            motivation=actor.motivation,
+            confidence_level=actor.confidence_level,
+            first_observed=actor.first_observed.isoformat() if actor.first_observed else None,
+            last_observed=actor.last_observed.isoformat() if actor.last_observed else None,
+            target_sectors=list(actor.target_sectors),
+            goals=list(actor.goals),
+            geographic_targeting=list(actor.geographic_targeting),
+            activity=_activity_windows(actor)
+        )
+
+def _activity_windows(actor: ThreatActor) -> List[List[Optional[str]]]:
+    """
+    Observation windows of an actor's techniques (by technique ID) and
+    relationships (by related actor). Windows of a repeated key are merged;
+    entries without a valid first_observed are left out.
+    """
+    windows: Dict[Tuple[str, str], List[Optional[str]]] = {}
+    for kind, items, field_name in (("technique", actor.attack_patterns, "technique_id"),
+                                    ("relationship", actor.relationships, "related_actor")):
+        for item in items:
+            key = item.get(field_name) if isinstance(item, dict) else None
+            start, end = (item.get("first_observed"), item.get("last_observed")) if key else (None, None)
+            if not isinstance(sort_key(start), datetime) or not (end is None or isinstance(sort_key(end), datetime)):
+                continue
+            start, end = (value.isoformat() if isinstance(value, datetime) else value for value in (start, end))
+            window = windows.get((kind, key))
+            if window is None:
+                windows[(kind, key)] = [start, end]
+                continue
+            if sort_key(start) < sort_key(window[0]):
+                window[0] = start
+            if window[1] is not None and (end is None or sort_key(end) > sort_key(window[1])):
+                window[1] = end
+    return [[kind, key, start, end] for (kind, key), (start, end) in windows.items()]
+
+@dataclass
+class PreparedSave:
+    """
+    An actor ready to be written, taken on the saving thread: its record
+    and summary, and the revision history entries trimmed from it that
+    still go to the journal.
+    """
+    actor: ThreatActor
+    content: bytes
+    summary: ActorSummary
+    evicted: List[Dict]
+
+@dataclass
+class LoadReport:
+    """Outcome of ActorDatabase.load_all(): counts and errors by actor ID."""
+    total: int = 0
+    loaded: int = 0
+    errors: Dict[str, str] = field(default_factory=dict)
+
+def _parse_record(args: Tuple[str, Optional[bytes], Optional[str], Optional[str]]) -> Tuple:
+    """
+    Decode a stored record and validate it unless its checksum matches the
+    index. Runs in loader processes.
+
+    Returns:
+        Tuple: (actor_id, data, checksum, size, trusted, error)
+    """
+    actor_id, content, expected, error = args
+    if error is None and content is None:
+        error = "Record not found"
+    if error is not None:
+        return actor_id, None, None, 0, False, error
+    try:
+        checksum = content_checksum(content)
+        trusted = checksum == expected
+        data = loads(content)
+        if not trusted:
+            validate_actor_data(data, ValidationPolicy.STRICT)
+        return actor_id, data, checksum, len(content), trusted, None
+    except Exception as e:
+        return actor_id, None, None, 0, False, str(e)
+
 class ActorDatabase:
     """
     Database manager for threat actor data.
+
+    Records live in an ActorStorage: one JSON file per actor, or a
+    log-structured segment store, as selected by database.type in
+    config.yaml unless a storage is passed in.
+
+    Startup only reads the actor index (index.log); actors are hydrated on
+    first access and kept in an LRU cache bounded by cache_size actors
+    and, optionally, cache_bytes of serialized records.
+
+    With checkpoint_interval, every save is also kept as a version (see
+    utils.versions), with a full checkpoint every checkpoint_interval saves
+    of an actor, for get_actor(as_of=...), diff() and merging conflicting
+    saves. By default no versions are kept.
+
+    With change_feed, every save is also appended to a feed of changes
+    (self.changes, see utils.changes) for consumers that only process what
+    changed; change_retention bounds it to about that many recent changes.
+    Each change is a JSON Patch against the actor's previous version, so
+    the feed keeps versions too: with checkpoint_interval None, every
+    DEFAULT_CHECKPOINT_INTERVAL saves. Without it, self.changes is None.
+
+    With shared, several processes (e.g. importers, enrichment workers and
+    an API) can use the same data directory:
+
+    - Writes hold a lock on data_dir/write.lock (file storage or SQLite;
+      the log storage keeps its record offsets in memory and cannot be
+      shared).
+    - Reads first pick up other processes' saves from the index log (see
+      refresh()): a stat when nothing changed, otherwise only the new
+      summaries are read and the changed actors dropped from the cache.
+    - Saves compare and swap: an actor is only written if its stored
+      metadata version (and record) is still the one it was loaded at.
+      Otherwise, with on_conflict="error", the save raises ConflictError;
+      with "merge", changes to different fields are merged onto the
+      stored actor (see utils.patch.merge; this needs versions), and
+      update_actor(), update_many() and add_reference() reapply their
+      change to the stored actor when that fails.
     """
-    def __init__(self, data_dir: str = None):
+    def __init__(self, data_dir: str = None, compact_uuids: bool = False,
+                 history_limit: int = DEFAULT_HISTORY_LIMIT,
+                 storage: Optional[ActorStorage] = None,
+                 cache_size: Optional[int] = 10000, cache_bytes: Optional[int] = None,
+                 checkpoint_interval: Optional[int] = None,
+                 change_feed: bool = False, change_retention: Optional[int] = None,
+                 shared: bool = False, on_conflict: str = "error"):
         self.data_dir = Path(data_dir) if data_dir else Path(__file__).parent.parent / 'data'
         self.actors_dir = self.data_dir / 'actors'
         self.references_dir = self.data_dir / 'references'
+        self.journal_dir = self.data_dir / 'journal'
         
         # Create directories if they don't exist
         self.actors_dir.mkdir(parents=True, exist_ok=True)
         self.references_dir.mkdir(parents=True, exist_ok=True)
-        
-        self.actors: Dict[str, ThreatActor] = {}
-        self._load_actors()
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        self.storage = storage if storage is not None else create_storage(self.data_dir)
+        if on_conflict not in ("error", "merge"):
+            raise ValueError(f"Unsupported conflict handling: {on_conflict}")
+        if change_feed and checkpoint_interval is None:
+            # The feed's patches are diffs against the saved versions.
+            checkpoint_interval = DEFAULT_CHECKPOINT_INTERVAL
+        if on_conflict == "merge" and checkpoint_interval is None:
+            raise ValueError("Merging conflicting saves needs versions: set checkpoint_interval")
+        if shared and isinstance(self.storage, LogStorage):
+            raise ValueError("The log storage cannot be shared between processes")
+        self.on_conflict = on_conflict
+        # Cross-process writer lock, when the data directory is shared.
+        self.lock = FileLock(self.data_dir / 'write.lock') if shared else None
+
+        # Keep loaded UUIDs as 16 raw bytes to cut memory on large datasets.
+        self.compact_uuids = compact_uuids
+        # Revision history entries kept inline; older ones go to the journal.
+        self.history_limit = history_limit
+
+        # Hydrated actors, most recently used last.
+        self.actors = LRUCache(max_entries=cache_size, max_weight=cache_bytes)
+
+        # Summaries of the stored actors, including the checksum of each
+        # record as this database wrote or last validated it, so hydrating
+        # an unchanged record can skip schema validation.
+        self.index_path = self.data_dir / 'index.log'
+        self.index: Dict[str, ActorSummary] = {}
+        # (inode, size) of the index log as read so far, for refresh().
+        self._index_state: Tuple[int, int] = (0, 0)
+        self._refresh_lock = threading.Lock()
+        # Held while the index, secondary indexes and name index are
+        # updated or read, which a write-behind flush does from its thread.
+        self._index_lock = threading.RLock()
+        # Secondary indexes over the summaries, for search_actors().
+        self.indexes = SecondaryIndexes()
+        # Fuzzy name and alias index, for find_by_name(); built on first use.
+        self._names: Optional[TrigramIndex] = None
+        # Active write-behind queue (see write_behind()), if any.
+        self.write_queue: Optional[WriteBehindQueue] = None
+        # Saved versions of each actor, for get_actor(as_of=...) and diff().
+        self.versions: Optional[VersionStore] = None
+        if checkpoint_interval is not None:
+            self.versions = VersionStore(self.data_dir / 'versions', checkpoint_interval)
+        # Feed of every save, for consumers that only process what changed.
+        self.changes: Optional[ChangeFeed] = None
+        if change_feed:
+            self.changes = ChangeFeed(self.data_dir / 'changes', lock=self.lock,
+                                      retention=change_retention)
+        # Kind of change ("update", "reference") of pending saves by actor
+        # ID, for the change feed; plain saves are not listed.
+        self._change_types: Dict[str, str] = {}
+        self._load_index()
+
+    def _writing(self):
+        """The cross-process writer lock, if the data directory is shared."""
+        return self.lock if self.lock is not None else nullcontext()
+
+    def _load_index(self) -> None:
+        """
+        Read the actor index, compacting it if most entries are stale, and
+        index any stored records it does not cover yet.
+        """
+        with self._writing():
+            self._read_index()
+
+    def _read_index(self) -> None:
+        lines = 0
+        offset = 0
+        if self.index_path.exists():
+            with open(self.index_path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    offset += len(line)
+                    try:
+                        summary = ActorSummary(**loads(line))
+                    except (ValueError, TypeError):
+                        continue
+                    self.index[summary.actor_id] = summary
+                    lines += 1
+            self._index_state = (os.stat(self.index_path).st_ino, offset)
 
-    def _load_actors(self) -> None:
-        """Load all threat actors from disk."""
-        for actor_file in self.actors_dir.glob('*.json'):
+        stored = set(self.storage.keys())
+        for actor_id in list(self.index):
+            if actor_id not in stored:
+                del self.index[actor_id]
+
+        if lines > 2 * len(self.index) + 100:
+            tmp_path = self.index_path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(asdict(summary)) + "\n" for summary in self.index.values())
+                offset = f.tell()
+            tmp_path.replace(self.index_path)
+            self._index_state = (os.stat(self.index_path).st_ino, offset)
+
+        self.indexes.build(self.index.values())
+
+        # Records saved elsewhere or before the index existed (or before
+        # its current fields) are validated and indexed once, in parallel
+        # for large directories.
+        missing = sorted(stored - set(self.index))
+        if missing:
+            report = self._load(missing)
+            logger.info(f"Indexed {report.loaded} of {report.total} unindexed actors")
+
+    def _record_summary(self, *summaries: ActorSummary) -> None:
+        """Append actor summaries to the index."""
+        with self._writing():
+            # Other processes' summaries come first in the log.
+            self.refresh()
+            for summary in summaries:
+                self._index_summary(summary)
+            with open(self.index_path, 'ab') as f:
+                f.write("".join(json.dumps(asdict(summary)) + "\n" for summary in summaries).encode())
+                if self.lock is not None:
+                    self._index_state = (os.fstat(f.fileno()).st_ino, f.tell())
+
+    def _index_summary(self, summary: ActorSummary) -> None:
+        with self._index_lock:
+            self.indexes.update(self.index.get(summary.actor_id), summary)
+            if self._names is not None:
+                self._names.update(summary.actor_id, [summary.name, *summary.aliases])
+            self.index[summary.actor_id] = summary
+
+    def _reindex(self, summary: ActorSummary) -> None:
+        """Index an actor whose record did not match its summary when loaded."""
+        if self.lock is None:
+            self._record_summary(summary)
+            return
+        with self.lock:
+            self.refresh()
+            current = self.index.get(summary.actor_id)
+            if current is not None and current.checksum == summary.checksum:
+                return
+            content = self.storage.read(summary.actor_id)
+            # Not if another process saved the actor again since.
+            if content is not None and content_checksum(content) == summary.checksum:
+                self._record_summary(summary)
+
+    def refresh(self) -> int:
+        """
+        Pick up saves by other processes sharing the data directory: read
+        the summaries appended to the index log since it was last read,
+        update the indexes and drop the changed actors from the cache. A
+        stat of the log when nothing changed; a no-op unless shared.
+
+        Returns:
+            int: Number of actors changed by other processes
+        """
+        if self.lock is None:
+            return 0
+        with self._refresh_lock:
+            return self._refresh()
+
+    def _refresh(self) -> int:
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return 0
+        inode, offset = self._index_state
+        if stat.st_ino == inode and stat.st_size == offset:
+            return 0
+        if stat.st_ino != inode:
+            # Rewritten (compacted) by another process: read it again.
+            offset = 0
+        with open(self.index_path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+            inode = os.fstat(f.fileno()).st_ino
+        # A line still being appended is read next time.
+        end = data.rfind(b"\n") + 1
+        changed = 0
+        for line in data[:end].splitlines():
             try:
-                with open(actor_file, 'r') as f:
-                    actor_data = json.load(f)
-                    actor = ThreatActor(**actor_data)
-                    self.actors[actor.actor_id] = actor
-                    logger.info(f"Loaded actor {actor.actor_id}")
-            except Exception as e:
-                logger.error(f"Error loading actor from {actor_file}: {str(e)}")
+                summary = ActorSummary(**loads(line))
+            except (ValueError, TypeError):
+                continue
+            if self.index.get(summary.actor_id) == summary:
+                continue
+            self._index_summary(summary)
+            self.actors.discard(summary.actor_id)
+            if self.versions is not None:
+                self.versions.forget(summary.actor_id)
+            changed += 1
+        self._index_state = (inode, offset + end)
+        if changed:
+            logger.info(f"Picked up {changed} actors saved by other processes")
+        return changed
+
+    @property
+    def names(self) -> TrigramIndex:
+        """
+        Fuzzy index of actor names and aliases. Services that add aliases
+        to a loaded actor can be given it to update it before the actor is
+        saved.
+        """
+        with self._index_lock:
+            if self._names is None:
+                names = TrigramIndex()
+                for summary in self.index.values():
+                    names.update(summary.actor_id, [summary.name, *summary.aliases])
+                self._names = names
+            return self._names
+
+    def _hydrate(self, actor_id: str, cache: bool = True) -> Optional[ThreatActor]:
+        """
+        Load an actor from storage.
+
+        Records whose checksum matches the index are hydrated under the
+        trusted policy; anything else is validated strictly and re-indexed.
+        """
+        try:
+            content = self.storage.read(actor_id)
+            if content is None:
+                return None
+            checksum = content_checksum(content)
+            summary = self.index.get(actor_id)
+            if self.lock is not None and (summary is None or summary.checksum != checksum):
+                # Maybe saved by another process since the last refresh.
+                self.refresh()
+                summary = self.index.get(actor_id)
+            trusted = summary is not None and summary.checksum == checksum
+            policy = ValidationPolicy.TRUSTED if trusted else ValidationPolicy.STRICT
+            actor = ThreatActor.from_json_bytes(content, policy, self.compact_uuids)
+            self._apply_history_limit(actor)
+            if not trusted:
+                self._reindex(ActorSummary.from_actor(actor, checksum, len(content)))
+            actor._stored = (actor.metadata.version, checksum)
+            if cache:
+                self.actors.put(actor_id, actor, len(content))
+            logger.info(f"Loaded actor {actor.actor_id}")
+            return actor
+        except Exception as e:
+            logger.error(f"Error loading actor {actor_id}: {str(e)}")
+            return None
 
     def save_actor(self, actor: ThreatActor) -> bool:
         """
-        Save a threat actor to disk.
+        Save a threat actor to storage, or queue the save while a
+        write-behind queue is active (see write_behind()).
+
+        With a shared data directory, the actor is only saved if nobody
+        else saved it since it was loaded (see ActorDatabase); merging
+        another process's changes updates the actor in place.
         
         Args:
             actor: ThreatActor object to save
             
         Returns:
-            bool: True if save successful
+            bool: True if save successful (or queued)
+
+        Raises:
+            ConflictError: If another process saved the actor and the
+                changes were not merged
         """
+        if self.write_queue is not None:
+            try:
+                self.write_queue.put(actor)
+                return True
+            except Exception as e:
+                logger.error(f"Error saving actor {actor.actor_id}: {str(e)}")
+                return False
         try:
-            actor_path = self.actors_dir / f"{actor.actor_id}.json"
-            with open(actor_path, 'w') as f:
-                json.dump(actor.to_dict(), f, indent=2)
-            
-            self.actors[actor.actor_id] = actor
-            logger.info(f"Saved actor {actor.actor_id}")
-            return True
+            save = self._prepare(actor)
         except Exception as e:
             logger.error(f"Error saving actor {actor.actor_id}: {str(e)}")
             return False
+        return self._save_prepared([save])
+
+    def save_actors(self, actors: List[ThreatActor]) -> bool:
+        """
+        Save several threat actors in one storage batch (one transaction
+        where the storage supports it).
+
+        Args:
+            actors: ThreatActor objects to save
+
+        Returns:
+            bool: True if all were saved; on failure none of them is
+                indexed or cached (whether records were written depends on
+                the storage)
+
+        Raises:
+            ConflictError: If other processes saved some of the actors and
+                the changes were not merged; none of them is saved
+        """
+        try:
+            saves = [self._prepare(actor) for actor in actors]
+        except Exception as e:
+            logger.error(f"Error saving {len(actors)} actors: {str(e)}")
+            return False
+        return self._save_prepared(saves)
+
+    def _prepare(self, actor: ThreatActor, evicted: Iterable[Dict] = ()) -> PreparedSave:
+        """
+        Trim an actor's revision history and serialize it for saving. The
+        write-behind queue calls this on the saving thread, so the save
+        holds the actor as it was then, whatever the thread does to it
+        before the flush.
+
+        Args:
+            actor: Actor to save
+            evicted: History entries trimmed by an earlier, replaced save
+                of the actor and not journaled yet
+        """
+        self._apply_history_limit(actor)
+        evicted = [*evicted, *actor.metadata.pop_evicted_history()]
+        content = actor.to_json_bytes()
+        summary = ActorSummary.from_actor(actor, content_checksum(content), len(content))
+        return PreparedSave(actor, content, summary, evicted)
+
+    def _save_prepared(self, saves: List[PreparedSave]) -> bool:
+        """
+        Write prepared saves, one storage batch for several.
+
+        Returns:
+            bool: True if all were saved
+
+        Raises:
+            ConflictError: See save_actors()
+        """
+        try:
+            with self._writing():
+                merged = self._compare_versions([save.actor for save in saves])
+                if merged:
+                    # Merged actors changed in place: serialize them again.
+                    saves = [self._prepare(save.actor, save.evicted) if save.actor.actor_id in merged else save
+                             for save in saves]
+                # Journal trimmed history first: a crash before the record
+                # is written leaves entries in both places, which
+                # get_revision_history() dedupes.
+                for save in saves:
+                    self._append_journal(save.actor.actor_id, save.evicted)
+                if len(saves) == 1:
+                    self.storage.write(saves[0].actor.actor_id, saves[0].content)
+                else:
+                    self.storage.write_many((save.actor.actor_id, save.content) for save in saves)
+                self._record_summary(*(save.summary for save in saves))
+                self._record_changes(saves)
+                for save in saves:
+                    save.actor._stored = (save.summary.version, save.summary.checksum)
+            for save in saves:
+                self.actors.put(save.actor.actor_id, save.actor, len(save.content))
+            if len(saves) == 1:
+                logger.info(f"Saved actor {saves[0].actor.actor_id}")
+            else:
+                logger.info(f"Saved {len(saves)} actors")
+            return True
+        except ConflictError:
+            raise
+        except Exception as e:
+            logger.error(f"Error saving {len(saves)} actors: {str(e)}")
+            return False
+
+    def _compare_versions(self, actors: List[ThreatActor]) -> Set[str]:
+        """
+        Check that actors about to be saved to a shared data directory are
+        still stored as they were loaded, merging them with their stored
+        state if not (and on_conflict is "merge"). Runs under the lock.
+
+        Merged actors are updated in place.
+
+        Returns:
+            Set[str]: IDs of the merged actors
+
+        Raises:
+            ConflictError: For actors changed by another process that
+                could not be merged
+        """
+        if self.lock is None:
+            return set()
+        self.refresh()
+        conflicts = {}
+        merged = []
+        for actor in actors:
+            stored = self.index.get(actor.actor_id)
+            current = (stored.version, stored.checksum) if stored is not None else None
+            if actor._stored == current:
+                continue
+            merge_result = self._merge_actor(actor) if self.on_conflict == "merge" else None
+            if merge_result is None:
+                conflicts[actor.actor_id] = (actor._stored and actor._stored[0], current and current[0])
+            else:
+                merged.append((actor, merge_result))
+        if conflicts:
+            raise ConflictError(conflicts)
+        for actor, result in merged:
+            for item in fields(result):
+                if item.init:
+                    setattr(actor, item.name, getattr(result, item.name))
+        return {actor.actor_id for actor, _ in merged}
+
+    def _merge_actor(self, actor: ThreatActor) -> Optional[ThreatActor]:
+        """
+        Merge the changes to an actor since it was loaded onto the version
+        another process saved since. Version bumps in the actor's new
+        revision history entries are applied again on top of the stored
+        version.
+
+        Returns:
+            Optional[ThreatActor]: The merged actor, or None if the
+            changes conflict or the base version is not kept
+        """
+        actor_id = actor.actor_id
+        stored = self.storage.read(actor_id)
+        original = self.versions.get(actor_id, checksum=actor._stored[1]) \
+            if actor._stored is not None and self.versions is not None else None
+        if stored is None or original is None:
+            return None
+
+        def split(document: Dict) -> Tuple[Dict, List[Dict]]:
+            # Versions and history are merged separately.
+            document = dict(document, metadata=dict(document.get("metadata") or {}))
+            history = document["metadata"].pop("revision_history", None) or []
+            for key in ("version", "modified"):
+                document["metadata"].pop(key, None)
+            return document, history
+
+        theirs = loads(stored)
+        (base_doc, base_history), (ours, history), (their_doc, their_history) = (
+            split(original), split(loads(actor.to_json_bytes())), split(theirs))
+        try:
+            document = merge(base_doc, ours, their_doc, in_place=True)
+        except ValueError as e:
+            logger.warning(f"Cannot merge concurrent changes to actor {actor_id}: {str(e)}")
+            return None
+        document["metadata"].update(version=theirs["metadata"]["version"],
+                                    modified=theirs["metadata"]["modified"],
+                                    revision_history=their_history)
+        try:
+            merged = ThreatActor.from_dict(document, ValidationPolicy.STRICT, self.compact_uuids)
+        except Exception as e:
+            logger.warning(f"Merged changes to actor {actor_id} are invalid: {str(e)}")
+            return None
+        seen = {(entry.get("version"), entry.get("timestamp")) for entry in base_history}
+        for entry in history:
+            if (entry.get("version"), entry.get("timestamp")) not in seen:
+                merged.metadata.version_update(entry.get("type", "patch"))
+        merged.metadata.modified = datetime.now()
+        # Entries trimmed from the actor's own history still go to the journal.
+        self._append_journal(actor_id, actor.metadata.pop_evicted_history())
+        logger.info(f"Merged concurrent changes to actor {actor_id}")
+        return merged
+
+    def _record_changes(self, saves: List[PreparedSave]) -> None:
+        """Keep the versions of saved actors and append their changes to the feed."""
+        if self.versions is None:
+            return
+        patches = self.versions.record(
+            (save.actor.actor_id, save.content, save.summary.version, save.summary.checksum)
+            for save in saves
+        )
+        if self.changes is None:
+            return
+        self.changes.append(
+            (save.actor.actor_id, self._change_types.pop(save.actor.actor_id, "save"), save.summary.version, patch)
+            for save, patch in zip(saves, patches)
+        )
+
+    def _save_change(self, actor: ThreatActor, change_type: str) -> bool:
+        """Save an actor, labelled in the change feed with the kind of change."""
+        if self.changes is None:
+            return self.save_actor(actor)
+        self._change_types[actor.actor_id] = change_type
+        try:
+            saved = self.save_actor(actor)
+        except ConflictError:
+            saved = False
+            raise
+        finally:
+            if not saved:
+                self._change_types.pop(actor.actor_id, None)
+        return saved
+
+    def _change(self, actor_id: str, apply: Callable[[ThreatActor], None],
+                change_type: str, action: str) -> bool:
+        """
+        Apply a change to an actor and save it. If another process saved
+        the actor meanwhile and on_conflict is "merge", the change is
+        applied again to the stored actor, up to CONFLICT_RETRIES times.
+        """
+        for attempt in range(CONFLICT_RETRIES):
+            actor = self.get_actor(actor_id)
+            if not actor:
+                logger.error(f"Actor {actor_id} not found")
+                return False
+            try:
+                apply(actor)
+                return self._save_change(actor, change_type)
+            except ConflictError:
+                # The cached actor has the change but not the stored state.
+                self.actors.discard(actor_id)
+                if self.on_conflict != "merge" or attempt == CONFLICT_RETRIES - 1:
+                    raise
+                logger.info(f"Retrying change to actor {actor_id} after a conflict")
+            except Exception as e:
+                logger.error(f"Error {action} {actor_id}: {str(e)}")
+                return False
+
+    def get_actor(self, actor_id: str, as_of: Any = None) -> Optional[ThreatActor]:
+        """
+        Retrieve a threat actor by ID, loading it into the cache if needed.
+
+        Keep the returned object only as long as needed: once evicted, the
+        next call returns a freshly loaded copy.
+
+        Args:
+            actor_id: ID of the actor
+            as_of: Time (datetime or ISO string, naive as UTC) to read the
+                actor as it was then saved instead of its current state;
+                such actors are rebuilt from the saved versions and not
+                cached
+
+        Returns:
+            Optional[ThreatActor]: The actor, or None if not found (or not
+            saved yet at as_of)
+        """
+        if as_of is not None:
+            document = self.versions.get(actor_id, as_of=as_of) if self.versions is not None else None
+            if document is None:
+                return None
+            return ThreatActor.from_dict(document, ValidationPolicy.TRUSTED, self.compact_uuids)
+        self.refresh()
+        if self.write_queue is not None:
+            pending = self.write_queue.get(actor_id)
+            if pending is not None:
+                return pending
+        actor = self.actors.get(actor_id)
+        if actor is None and actor_id in self.index:
+            actor = self._hydrate(actor_id)
+        return actor
 
-    def get_actor(self, actor_id: str) -> Optional[ThreatActor]:
-        """Retrieve a threat actor by ID."""
-        return self.actors.get(actor_id)
+    def load_all(self, max_workers: Optional[int] = None, io_workers: int = 8,
+                 chunksize: int = 64,
+                 progress: Optional[Callable[[int, int], None]] = None) -> LoadReport:
+        """
+        Load every stored actor into the cache, e.g. for batch analytics.
+
+        Records are read by a thread pool and decoded and validated by a
+        process pool; the main process only builds the objects. A record
+        that fails to load is reported and skipped. Actors already in the
+        cache are kept as they are. The cache bounds still apply, so create
+        the database with cache_size=None to hold everything.
+
+        Args:
+            max_workers: Size of the process pool (default: CPU count, 1 runs inline)
+            io_workers: Number of reader threads
+            chunksize: Number of records sent to a process at a time
+            progress: Called with (done, total) after each record
+
+        Returns:
+            LoadReport: Counts and per-actor errors
+        """
+        self.refresh()
+        keys = [key for key in self.storage.keys() if key not in self.actors]
+        return self._load(keys, max_workers, io_workers, chunksize, progress)
+
+    def _load(self, keys: List[str], max_workers: Optional[int] = None, io_workers: int = 8,
+              chunksize: int = 64,
+              progress: Optional[Callable[[int, int], None]] = None) -> LoadReport:
+        """Load the given records into the cache (see load_all)."""
+        report = LoadReport(total=len(keys))
+
+        def read(key: str) -> Tuple[str, Optional[bytes], Optional[str], Optional[str]]:
+            summary = self.index.get(key)
+            expected = summary.checksum if summary else None
+            try:
+                return key, self.storage.read(key), expected, None
+            except Exception as e:
+                return key, None, expected, f"Error reading record: {str(e)}"
+
+        if max_workers == 1 or len(keys) <= chunksize:
+            results = (_parse_record(read(key)) for key in keys)
+            self._merge_loaded(results, report, progress)
+            return report
+
+        with ThreadPoolExecutor(max_workers=io_workers) as readers, \
+                ProcessPoolExecutor(max_workers=max_workers, initializer=init_schema_worker,
+                                    initargs=(get_schema_registry().settings(),)) as parsers:
+            records = readers.map(read, keys)
+            results = parsers.map(_parse_record, records, chunksize=chunksize)
+            self._merge_loaded(results, report, progress)
+        return report
+
+    def _merge_loaded(self, results, report: LoadReport,
+                      progress: Optional[Callable[[int, int], None]]) -> None:
+        """Build actors from _parse_record() results and add them to the cache."""
+        for done, (actor_id, data, checksum, size, trusted, error) in enumerate(results, 1):
+            try:
+                if error is not None:
+                    raise ValueError(error)
+                # Validation already ran in _parse_record().
+                actor = ThreatActor.from_dict(data, ValidationPolicy.TRUSTED, self.compact_uuids)
+                self._apply_history_limit(actor)
+                if not trusted:
+                    self._reindex(ActorSummary.from_actor(actor, checksum, size))
+                actor._stored = (actor.metadata.version, checksum)
+                self.actors.put(actor_id, actor, size)
+                report.loaded += 1
+            except Exception as e:
+                report.errors[actor_id] = str(e)
+                logger.error(f"Error loading actor {actor_id}: {str(e)}")
+            if progress is not None:
+                progress(done, report.total)
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Actor cache counters: entries, bytes, hits, misses, evictions."""
+        return self.actors.stats()
+
+    def write_behind(self, max_batch: int = 500, interval: Optional[float] = 1.0) -> WriteBehindQueue:
+        """
+        Queue saves and write them in batches until the returned queue is
+        closed, e.g. during bulk enrichment:
+
+            with db.write_behind():
+                for actor in actors:
+                    enrich(actor)
+                    db.save_actor(actor)
+
+        Each save serializes the actor on the saving thread, as it is then;
+        repeated saves of an actor are coalesced. get_actor() sees pending
+        actors; searches see them once flushed. flush() makes all saves so
+        far durable (with a syncing storage).
+
+        Args:
+            max_batch: Number of pending actors that triggers a flush
+            interval: Seconds between background flushes (None for none)
+
+        Returns:
+            WriteBehindQueue: The active queue, also a context manager
+        """
+        if self.write_queue is None:
+            self.write_queue = WriteBehindQueue(self, max_batch, interval)
+        return self.write_queue
+
+    def flush(self) -> bool:
+        """Write all saves pending in the write-behind queue, if any."""
+        return self.write_queue.flush() if self.write_queue is not None else True
+
+    def close(self) -> None:
+        """Flush pending saves and close the underlying storage and change feed."""
+        if self.write_queue is not None:
+            self.write_queue.close()
+        self.storage.close()
+        if self.changes is not None:
+            self.changes.close()
+        if self.lock is not None:
+            self.lock.close()
+
+    def _apply_history_limit(self, actor: ThreatActor) -> None:
+        if actor.metadata.history_limit != self.history_limit:
+            actor.metadata.history_limit = self.history_limit
+
+    def _journal_path(self, actor_id: str) -> Path:
+        return self.journal_dir / f"{actor_id}.jsonl"
+
+    def _append_journal(self, actor_id: str, entries: List[Dict]) -> None:
+        """Append revision history entries to the actor's change journal."""
+        if not entries:
+            return
+        lines = "".join(json.dumps(entry) + "\n" for entry in entries)
+        with open(self._journal_path(actor_id), 'a+b') as f:
+            # End a torn final line first, so only it is unreadable.
+            if f.tell():
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    lines = "\n" + lines
+            f.write(lines.encode('utf-8'))
+
+    def get_revision_history(self, actor_id: str) -> Optional[List[Dict]]:
+        """
+        Get the full revision history of an actor.
+
+        Reads the actor's change journal and appends the entries trimmed
+        since the last save and the inline tail.
+
+        Args:
+            actor_id: ID of the actor
+
+        Returns:
+            Optional[List[Dict]]: History entries, oldest first
+        """
+        actor = self.get_actor(actor_id)
+        if not actor:
+            logger.error(f"Actor {actor_id} not found")
+            return None
+
+        entries = []
+        journal_path = self._journal_path(actor_id)
+        if journal_path.exists():
+            with open(journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        # Torn final line from an interrupted append.
+                        logger.warning(f"Skipping unreadable journal entry for {actor_id}")
+        entries.extend(actor.metadata.evicted_history)
+        entries.extend(actor.metadata.revision_history)
+
+        history = []
+        seen = set()
+        for entry in entries:
+            key = (entry.get("version"), entry.get("timestamp"))
+            if key not in seen:
+                seen.add(key)
+                history.append(dict(entry))
+        return history
+
+    def list_versions(self, actor_id: str) -> List[Dict]:
+        """
+        Saved versions of an actor, oldest first: sequence number (seq),
+        metadata version and save time (saved).
+        """
+        return self.versions.history(actor_id) if self.versions is not None else []
+
+    def diff(self, actor_id: str, v1: VersionRef, v2: VersionRef) -> Optional[List[Dict]]:
+        """
+        Changes between two saved versions of an actor.
+
+        Args:
+            actor_id: ID of the actor
+            v1: Version to compare from: a sequence number (see
+                list_versions()) or a metadata version string
+            v2: Version to compare to
+
+        Returns:
+            Optional[List[Dict]]: JSON Patch (RFC 6902) operations turning
+            v1 into v2, or None if either version does not exist
+        """
+        if self.versions is None:
+            return None
+        return self.versions.diff(actor_id, v1, v2)
 
     def update_actor(self, actor_id: str, field: str, value: any, reference: Reference) -> bool:
         """
@@ -75,53 +955,242 @@ class ActorDatabase:
             
         Returns:
             bool: True if update successful
+
+        Raises:
+            ConflictError: If another process saved the actor meanwhile
+                (with on_conflict="merge", only after CONFLICT_RETRIES
+                attempts)
         """
-        actor = self.get_actor(actor_id)
-        if not actor:
-            logger.error(f"Actor {actor_id} not found")
-            return False
+        return self._change(actor_id, lambda actor: actor.update_field(field, value, reference),
+                            "update", "updating actor")
 
-        try:
-            actor.update_field(field, value, reference)
-            return self.save_actor(actor)
-        except Exception as e:
-            logger.error(f"Error updating actor {actor_id}: {str(e)}")
-            return False
+    def update_many(self, actor_id: str, updates: Dict[str, Any], reference: Reference) -> bool:
+        """
+        Update several fields of a threat actor as one change.
+
+        The actor is validated once, gets a single version bump and is
+        written once; if validation fails none of the fields change.
+
+        Args:
+            actor_id: ID of the actor to update
+            updates: New values by field name
+            reference: Reference for the update
+
+        Returns:
+            bool: True if update successful
+
+        Raises:
+            ConflictError: As for update_actor()
+        """
+        return self._change(actor_id, lambda actor: actor.batch_update(updates, reference),
+                            "update", "updating actor")
 
-    def search_actors(self, **kwargs) -> List[ThreatActor]:
+    def search_actors(self, criteria: Optional[Dict[str, Any]] = None, *, match: str = "all",
+                      **kwargs) -> List[ThreatActor]:
         """
         Search for actors based on criteria.
+
+        Indexed fields (see utils.indexes.INDEXED_FIELDS) are answered from
+        secondary indexes; only candidates are loaded to check any other
+        criteria. List fields (aliases, target_sectors, goals) match on
+        membership and geographic_targeting on its keys; a list value
+        requires all its items. Range(low, high) matches an interval, e.g.
+        of confidence_level or observation dates, and AnyOf(...) any of
+        several values.
         
         Args:
+            criteria: Search criteria by field name, e.g. for a field
+                named like a keyword argument (combined with kwargs)
+            match: "all" to require every criterion (AND), "any" for at
+                least one (OR)
             **kwargs: Search criteria as key-value pairs
             
         Returns:
             List[ThreatActor]: Matching actors
         """
+        if match not in ("all", "any"):
+            raise ValueError(f"Unsupported match mode: {match}")
+        criteria = {**(criteria or {}), **kwargs}
+        self.refresh()
+        with self._index_lock:
+            candidates, residual = self.indexes.plan(criteria, match)
+            candidates = sorted(self.index if candidates is None else candidates)
+
         results = []
-        for actor in self.actors.values():
-            match = True
-            for key, value in kwargs.items():
-                if not hasattr(actor, key) or getattr(actor, key) != value:
-                    match = False
-                    break
-            if match:
+        for actor_id in candidates:
+            # Scanning should not flush the cache of recently used actors.
+            actor = self.actors.peek(actor_id) or self._hydrate(actor_id, cache=False)
+            if actor is None:
+                continue
+            checks = (
+                hasattr(actor, key) and match_value(getattr(actor, key), value)
+                for key, value in residual.items()
+            )
+            if not residual or (all(checks) if match == "all" else any(checks)):
                 results.append(actor)
         return results
 
-    def add_reference(self, actor_id: str, reference: Reference) -> bool:
-        """Add a reference to an actor."""
-        actor = self.get_actor(actor_id)
-        if not actor:
-            logger.error(f"Actor {actor_id} not found")
-            return False
+    def query(self, query: Union[str, Predicate], sort: Optional[str] = None,
+              descending: bool = False, limit: Optional[int] = None,
+              offset: int = 0) -> Iterator[ThreatActor]:
+        """
+        Query actors with a predicate, e.g.
+        "confidence_level >= 4 AND target_sectors contains Energy AND
+        first_observed > 2022-01-01" (see utils.query).
 
-        try:
-            actor.add_reference(reference)
-            return self.save_actor(actor)
-        except Exception as e:
-            logger.error(f"Error adding reference to actor {actor_id}: {str(e)}")
-            return False
+        The predicate is compiled once; the secondary indexes narrow down
+        the candidates and only those are loaded and checked. Results are
+        yielded one at a time, so a large result set is never held in
+        memory: sorting by an indexed summary field (e.g. name or
+        last_observed) orders the candidates before loading them, while
+        sorting by any other field keeps only offset + limit actors (or,
+        without a limit, the sort keys, loading the actors again as they
+        are yielded).
+
+        Args:
+            query: Query string or Predicate
+            sort: Field (dotted path) to sort by; actor ID order if None.
+                Actors without a value come last.
+            descending: Sort in descending order
+            limit: Maximum number of results
+            offset: Number of results to skip
+
+        Returns:
+            Iterator[ThreatActor]: Matching actors
+        """
+        predicate = parse_query(query) if isinstance(query, str) else query
+        self.refresh()
+        with self._index_lock:
+            matches = compile_predicate(predicate, self.indexes)
+            ids = candidates(predicate, self.indexes)
+            ids = list(self.index if ids is None else ids)
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError("limit and offset must not be negative")
+        if limit == 0:
+            return iter(())
+
+        if sort is None or sort in ActorSummary.__dataclass_fields__:
+            order = self._order_ids(ids, sort, descending)
+            results = (actor for actor in map(self._scan, order) if actor is not None and matches(actor))
+            return islice(results, offset, None if limit is None else offset + limit)
+
+        get = path_getter(sort)
+        # IDs of matches without a value, which come last.
+        missing: List[str] = []
+
+        def keyed() -> Iterator[Tuple[Any, str, ThreatActor]]:
+            for actor in map(self._scan, ids):
+                if actor is None or not matches(actor):
+                    continue
+                value = next(iter(get(actor)), None)
+                if value is None:
+                    missing.append(actor.actor_id)
+                else:
+                    yield order_key(value), actor.actor_id, actor
+
+        def rescan(order: Iterable[str]) -> Iterator[ThreatActor]:
+            return (actor for actor in map(self._scan, order) if actor is not None and matches(actor))
+
+        if limit is not None:
+            pick = heapq.nlargest if descending else heapq.nsmallest
+            present = [actor for _, _, actor in pick(offset + limit, keyed(), key=lambda item: item[:2])]
+            results = chain(present, rescan(sorted(missing)))
+            return islice(results, offset, offset + limit)
+
+        # Without a limit only the sort keys are kept; actors are loaded
+        # again as they are yielded.
+        present = sorted(((key, actor_id) for key, actor_id, _ in keyed()), reverse=descending)
+        order = chain((actor_id for _, actor_id in present), sorted(missing))
+        return islice(rescan(order), offset, None)
+
+    def _order_ids(self, ids, sort: Optional[str], descending: bool) -> List[str]:
+        """Actor IDs ordered by an indexed summary field, without values last."""
+        if sort is None:
+            return sorted(ids, reverse=descending)
+        with self._index_lock:
+            keyed = [(getattr(self.index[actor_id], sort), actor_id)
+                     for actor_id in ids if actor_id in self.index]
+        present = sorted(((order_key(value), actor_id) for value, actor_id in keyed if value is not None),
+                         reverse=descending)
+        missing = sorted(actor_id for value, actor_id in keyed if value is None)
+        return [actor_id for _, actor_id in present] + missing
+
+    def _scan(self, actor_id: str) -> Optional[ThreatActor]:
+        # Scanning should not flush the cache of recently used actors.
+        return self.actors.peek(actor_id) or self._hydrate(actor_id, cache=False)
+
+    def active_actors(self, start: Any = None, end: Any = None) -> List[ThreatActor]:
+        """
+        Actors active in a period: whose first_observed to last_observed
+        window overlaps [start, end]. An actor without last_observed is
+        taken as still active. Answered from an interval index; only the
+        matching actors are loaded.
+
+        Args:
+            start: Start of the period (datetime or ISO string), None for
+                no lower bound
+            end: End of the period, None for no upper bound; pass start
+                for a single point in time
+
+        Returns:
+            List[ThreatActor]: Matching actors, by actor ID
+        """
+        self.refresh()
+        with self._index_lock:
+            ids = self.indexes.windows["actor"].overlap(start, end)
+        return [actor for actor in map(self._scan, sorted(ids)) if actor is not None]
+
+    def active_windows(self, kind: str, start: Any = None, end: Any = None) -> List[Tuple[str, str]]:
+        """
+        Techniques or relationships observed in a period, from the
+        first_observed/last_observed of attack_patterns and relationships.
+
+        Args:
+            kind: "technique" or "relationship"
+            start: Start of the period, None for no lower bound
+            end: End of the period, None for no upper bound
+
+        Returns:
+            List[Tuple[str, str]]: (actor ID, technique ID or related
+            actor) pairs whose window overlaps the period
+        """
+        if kind not in self.indexes.windows or kind == "actor":
+            raise ValueError(f"Unsupported window kind: {kind}")
+        self.refresh()
+        with self._index_lock:
+            return sorted(self.indexes.windows[kind].overlap(start, end))
+
+    def find_by_name(self, query: str, limit: int = 10,
+                     threshold: float = 0.3) -> List[Tuple[ThreatActor, float]]:
+        """
+        Fuzzy search of actor names and aliases.
+
+        Tolerates misspellings, partial names and differences in case,
+        accents or punctuation; an exact name or alias match ranks first.
+
+        Args:
+            query: Name or alias to look for
+            limit: Maximum number of results
+            threshold: Minimum similarity score (0-1)
+
+        Returns:
+            List[Tuple[ThreatActor, float]]: Actors and scores, best first
+        """
+        self.refresh()
+        names = self.names
+        with self._index_lock:
+            found = names.search(query, limit, threshold)
+        results = []
+        for actor_id, score in found:
+            actor = self.get_actor(actor_id)
+            if actor is not None:
+                results.append((actor, score))
+        return results
+
+    def add_reference(self, actor_id: str, reference: Reference) -> bool:
+        """Add a reference to an actor (see update_actor() on conflicts)."""
+        return self._change(actor_id, lambda actor: actor.add_reference(reference),
+                            "reference", "adding reference to actor")
 
     def export_actor(self, actor_id: str, format: str = 'json') -> Optional[str]:
         """
@@ -141,7 +1210,7 @@ class ActorDatabase:
 
         try:
             if format.lower() == 'json':
-                return json.dumps(actor.to_dict(), indent=2)
+                return actor.to_json_bytes().decode()
             elif format.lower() == 'stix':
                 from services.export import convert_to_stix
                 return convert_to_stix(actor)
@@ -0,0 +1,583 @@
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from core.serialization import parse_datetime
+
+@dataclass(frozen=True)
+class Range:
+    """Search condition matching values between low and high (inclusive, None for open)."""
+    low: Any = None
+    high: Any = None
+
+class AnyOf:
+    """Search condition matching any of several values (OR within one field)."""
+    def __init__(self, *values: Any):
+        self.values = tuple(values[0]) if len(values) == 1 and isinstance(values[0], (list, tuple, set)) else values
+
+    def __repr__(self) -> str:
+        return f"AnyOf{self.values!r}"
+
+# Start of an ISO 8601 timestamp as written by isoformat(); other strings
+# are not parsed.
+_ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+def sort_key(value: Any) -> Any:
+    """
+    Comparable form of an indexed value: timestamps (datetime or ISO
+    string) become naive UTC datetimes, since stored actors mix naive and
+    offset-aware times. Naive times are taken as UTC. Only strings that
+    start with a YYYY-MM-DD date are read as timestamps.
+    """
+    if isinstance(value, str):
+        if not _ISO_DATE.match(value):
+            return value
+        try:
+            value = parse_datetime(value)
+        except ValueError:
+            return value
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def order_key(value: Any) -> Tuple[int, Any]:
+    """
+    Totally ordered form of sort_key(value): numbers, then timestamps, then
+    strings, then anything else (by repr). Values of different kinds sort
+    apart instead of raising TypeError, and never fall in one Range.
+    """
+    key = sort_key(value)
+    if isinstance(key, (int, float)):
+        return 0, key
+    if isinstance(key, datetime):
+        return 1, key
+    if isinstance(key, str):
+        return 2, key
+    return 3, repr(key)
+
+def match_value(value: Any, condition: Any) -> bool:
+    """
+    Check a field value against a search condition, with the semantics of
+    the indexes: list fields match on membership (all items of a list
+    condition), dict fields on their keys, and Range/AnyOf as documented.
+    """
+    if isinstance(condition, AnyOf):
+        return any(match_value(value, option) for option in condition.values)
+    if isinstance(condition, Range):
+        if value is None:
+            return False
+        key = sort_key(value)
+        try:
+            return ((condition.low is None or key >= sort_key(condition.low))
+                    and (condition.high is None or key <= sort_key(condition.high)))
+        except TypeError:
+            return False
+    if isinstance(value, (list, dict)) and not isinstance(condition, dict):
+        if isinstance(condition, (list, tuple)):
+            return all(item in value for item in condition)
+        return condition in value
+    return value == condition
+
+class HashIndex:
+    """Exact-match index: value -> IDs."""
+
+    def __init__(self):
+        self.postings: Dict[Any, Set[str]] = {}
+
+    def _keys(self, value: Any) -> Iterable[Any]:
+        return (value,)
+
+    def add(self, actor_id: str, value: Any) -> None:
+        for key in self._keys(value):
+            self.postings.setdefault(key, set()).add(actor_id)
+
+    def remove(self, actor_id: str, value: Any) -> None:
+        for key in self._keys(value):
+            ids = self.postings.get(key)
+            if ids is not None:
+                ids.discard(actor_id)
+                if not ids:
+                    del self.postings[key]
+
+    def estimate(self, condition: Any) -> int:
+        """Upper bound of the number of IDs lookup() returns."""
+        if isinstance(condition, AnyOf):
+            return sum(self.estimate(option) for option in condition.values)
+        if isinstance(condition, Range):
+            return sum(len(ids) for key, ids in self.postings.items() if match_value(key, condition))
+        return len(self.postings.get(condition, ()))
+
+    def lookup(self, condition: Any) -> Set[str]:
+        if isinstance(condition, AnyOf):
+            return set().union(*(self.lookup(option) for option in condition.values))
+        if isinstance(condition, Range):
+            return set().union(*(ids for key, ids in self.postings.items() if match_value(key, condition)))
+        return set(self.postings.get(condition, ()))
+
+class InvertedIndex(HashIndex):
+    """Membership index for list fields (items) and dict fields (keys)."""
+
+    def _keys(self, value: Any) -> Iterable[Any]:
+        return set(value or ())
+
+    def estimate(self, condition: Any) -> int:
+        if isinstance(condition, (list, tuple)):
+            return min((self.estimate(item) for item in condition), default=0)
+        return super().estimate(condition)
+
+    def lookup(self, condition: Any) -> Set[str]:
+        if isinstance(condition, (list, tuple)):
+            # All listed items: intersect, rarest first.
+            result = None
+            for item in sorted(condition, key=self.estimate):
+                ids = self.lookup(item)
+                result = ids if result is None else result & ids
+                if not result:
+                    break
+            return result or set()
+        return super().lookup(condition)
+
+class SortedIndex:
+    """
+    Ordered index for range queries: sorted (key, ID) pairs, keyed by
+    order_key() so fields holding values of mixed types stay sortable.
+    """
+
+    def __init__(self):
+        self.entries: List[Tuple[Tuple[int, Any], str]] = []
+        self.missing: Set[str] = set()
+
+    def build(self, items: Iterable[Tuple[str, Any]]) -> None:
+        """Replace the contents in one sort instead of repeated inserts."""
+        self.entries = []
+        self.missing = set()
+        for actor_id, value in items:
+            if value is None:
+                self.missing.add(actor_id)
+            else:
+                self.entries.append((order_key(value), actor_id))
+        self.entries.sort()
+
+    def add(self, actor_id: str, value: Any) -> None:
+        if value is None:
+            self.missing.add(actor_id)
+        else:
+            insort(self.entries, (order_key(value), actor_id))
+
+    def remove(self, actor_id: str, value: Any) -> None:
+        if value is None:
+            self.missing.discard(actor_id)
+            return
+        entry = (order_key(value), actor_id)
+        position = bisect_left(self.entries, entry)
+        if position < len(self.entries) and self.entries[position] == entry:
+            del self.entries[position]
+
+    def _bounds(self, condition: Any) -> Tuple[int, int]:
+        if isinstance(condition, Range):
+            low, high = condition.low, condition.high
+        else:
+            low = high = condition
+        low = None if low is None else order_key(low)
+        high = None if high is None else order_key(high)
+        if low is None and high is None:
+            return 0, len(self.entries)
+        if low is not None and high is not None and low[0] != high[0]:
+            # Bounds of different kinds, as in match_value(), match nothing.
+            return 0, 0
+        # Compare on the key only: (key,) sorts before any (key, id) and
+        # (key, chr(0x10FFFF)) after. An open end stops at the kind of the
+        # other bound: (kind,) sorts before every key of that kind.
+        start = bisect_left(self.entries, (low,) if low is not None else ((high[0],),))
+        end = bisect_right(self.entries, (high, chr(0x10FFFF))) if high is not None \
+            else bisect_left(self.entries, ((low[0] + 1,),))
+        return start, max(start, end)
+
+    def estimate(self, condition: Any) -> int:
+        if isinstance(condition, AnyOf):
+            return sum(self.estimate(option) for option in condition.values)
+        if condition is None:
+            return len(self.missing)
+        start, end = self._bounds(condition)
+        return end - start
+
+    def lookup(self, condition: Any) -> Set[str]:
+        if isinstance(condition, AnyOf):
+            return set().union(*(self.lookup(option) for option in condition.values))
+        if condition is None:
+            return set(self.missing)
+        start, end = self._bounds(condition)
+        return {actor_id for _, actor_id in self.entries[start:end]}
+
+_EPOCH = datetime(1970, 1, 1)
+
+def _seconds(value: Any) -> Optional[float]:
+    """Timestamp (datetime or ISO string) as UTC seconds since the epoch."""
+    if value is None:
+        return None
+    key = sort_key(value)
+    if not isinstance(key, datetime):
+        raise ValueError(f"Invalid timestamp: {value!r}")
+    return (key - _EPOCH).total_seconds()
+
+class IntervalIndex:
+    """
+    Index of [start, end] activity windows for overlap and point-in-time
+    (stabbing) queries. A window without an end is still open.
+
+    Closed windows are bucketed by length (below 2**k seconds) and each
+    bucket is kept sorted by start, so the windows of a bucket overlapping
+    [low, high] all start in [low - 2**k, high]: one bisected slice per
+    bucket, where at most about as many windows end too early as match.
+    """
+
+    def __init__(self):
+        self.buckets: Dict[int, List[Tuple[float, float, Any]]] = {}
+        self.open: List[Tuple[float, Any]] = []
+        self.windows: Dict[Any, Tuple[float, Optional[float]]] = {}
+
+    def __len__(self) -> int:
+        return len(self.windows)
+
+    def build(self, items: Iterable[Tuple[Any, Any, Any]]) -> None:
+        """Replace the contents with (key, start, end) windows, sorting once."""
+        self.buckets, self.open, self.windows = {}, [], {}
+        for key, start, end in items:
+            self._place(key, start, end, insort_entry=False)
+        for entries in self.buckets.values():
+            entries.sort()
+        self.open.sort()
+
+    def add(self, key: Any, start: Any, end: Any = None) -> None:
+        """Index the window of key, replacing any previous one. Windows without a start are not indexed."""
+        self.remove(key)
+        self._place(key, start, end, insort_entry=True)
+
+    def _place(self, key: Any, start: Any, end: Any, insort_entry: bool) -> None:
+        start, end = _seconds(start), _seconds(end)
+        if start is None:
+            return
+        if end is not None and end < start:
+            start, end = end, start
+        self.windows[key] = (start, end)
+        if end is None:
+            entries, entry = self.open, (start, key)
+        else:
+            entries = self.buckets.setdefault(int(end - start).bit_length(), [])
+            entry = (start, end, key)
+        if insort_entry:
+            insort(entries, entry)
+        else:
+            entries.append(entry)
+
+    def remove(self, key: Any) -> None:
+        window = self.windows.pop(key, None)
+        if window is None:
+            return
+        start, end = window
+        if end is None:
+            entries, entry = self.open, (start, key)
+        else:
+            entries = self.buckets[int(end - start).bit_length()]
+            entry = (start, end, key)
+        position = bisect_left(entries, entry)
+        if position < len(entries) and entries[position] == entry:
+            del entries[position]
+
+    def overlap(self, low: Any = None, high: Any = None) -> Set[Any]:
+        """Keys whose window overlaps [low, high] (None for unbounded), ends included."""
+        low, high = _seconds(low), _seconds(high)
+        # Entries are compared on their start only: (start,) sorts before
+        # any (start, ...), so windows starting up to high end before (above,).
+        above = (math.inf,) if high is None else (math.nextafter(high, math.inf),)
+        result = {key for _, key in self.open[:bisect_left(self.open, above)]}
+        for k, entries in self.buckets.items():
+            first = 0 if low is None else bisect_left(entries, (low - 2 ** k,))
+            last = bisect_left(entries, above)
+            if low is None:
+                result.update(key for _, _, key in entries[first:last])
+            else:
+                result.update(key for _, end, key in entries[first:last] if end >= low)
+        return result
+
+    def stab(self, point: Any) -> Set[Any]:
+        """Keys whose window contains a point in time."""
+        return self.overlap(point, point)
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+# Indexed summary fields and the kind of index each gets.
+INDEXED_FIELDS = {
+    "actor_id": HashIndex,
+    "name": HashIndex,
+    "capability_level": HashIndex,
+    "motivation": HashIndex,
+    "aliases": InvertedIndex,
+    "target_sectors": InvertedIndex,
+    "goals": InvertedIndex,
+    "geographic_targeting": InvertedIndex,
+    "confidence_level": SortedIndex,
+    "first_observed": SortedIndex,
+    "last_observed": SortedIndex,
+}
+
+# Activity windows kept in interval indexes: each actor's own
+# (first_observed to last_observed, keyed by actor ID) and those of its
+# techniques and relationships (from ActorSummary.activity, keyed by
+# actor ID and technique ID or related actor).
+WINDOW_KINDS = ("actor", "technique", "relationship")
+
+def _windows(summary: Any) -> Iterable[Tuple[str, Any, Any, Any]]:
+    yield "actor", summary.actor_id, summary.first_observed, summary.last_observed
+    for kind, key, start, end in summary.activity:
+        yield kind, (summary.actor_id, key), start, end
+
+class SecondaryIndexes:
+    """
+    Secondary indexes over actor summaries (see INDEXED_FIELDS), with a
+    planner that answers the indexed part of a search, and interval
+    indexes of activity windows (see WINDOW_KINDS).
+    """
+
+    def __init__(self):
+        self.indexes = {name: kind() for name, kind in INDEXED_FIELDS.items()}
+        self.windows = {kind: IntervalIndex() for kind in WINDOW_KINDS}
+
+    def build(self, summaries: Iterable[Any]) -> None:
+        """Index all summaries from scratch."""
+        summaries = list(summaries)
+        self.indexes = {name: kind() for name, kind in INDEXED_FIELDS.items()}
+        windows = [window for summary in summaries for window in _windows(summary)]
+        self.windows = {kind: IntervalIndex() for kind in WINDOW_KINDS}
+        for kind, index in self.windows.items():
+            index.build((key, start, end) for window_kind, key, start, end in windows if window_kind == kind)
+        for name, index in self.indexes.items():
+            if isinstance(index, SortedIndex):
+                index.build((summary.actor_id, getattr(summary, name)) for summary in summaries)
+            else:
+                for summary in summaries:
+                    index.add(summary.actor_id, getattr(summary, name))
+
+    def update(self, old: Optional[Any], new: Optional[Any]) -> None:
+        """Replace the postings of one actor's old summary with its new one."""
+        for name, index in self.indexes.items():
+            old_value = getattr(old, name) if old is not None else None
+            new_value = getattr(new, name) if new is not None else None
+            if old is not None and new is not None and old_value == new_value:
+                continue
+            if old is not None:
+                index.remove(old.actor_id, old_value)
+            if new is not None:
+                index.add(new.actor_id, new_value)
+
+        old_windows = list(_windows(old)) if old is not None else []
+        new_windows = list(_windows(new)) if new is not None else []
+        if old_windows != new_windows:
+            for kind, key, _, _ in old_windows:
+                self.windows[kind].remove(key)
+            for kind, key, start, end in new_windows:
+                self.windows[kind].add(key, start, end)
+
+    def plan(self, criteria: Dict[str, Any],
+             match: str = "all") -> Tuple[Optional[Set[str]], Dict[str, Any]]:
+        """
+        Answer the indexed criteria of a search.
+
+        With match="all", posting lists are intersected smallest first,
+        stopping as soon as the result is empty; with match="any" they are
+        united, unless a criterion is not indexed.
+
+        Returns:
+            Tuple[Optional[Set[str]], Dict[str, Any]]: Candidate IDs (None
+            for every actor) and the criteria left to check on the actors
+        """
+        indexed = {name: condition for name, condition in criteria.items() if name in self.indexes}
+        residual = {name: condition for name, condition in criteria.items() if name not in self.indexes}
+
+        if match == "any":
+            if residual or not indexed:
+                return None, criteria
+            return set().union(*(self.indexes[name].lookup(condition)
+                                 for name, condition in indexed.items())), {}
+
+        order = sorted(indexed.items(), key=lambda item: self.indexes[item[0]].estimate(item[1]))
+        candidates = None
+        for name, condition in order:
+            ids = self.indexes[name].lookup(condition)
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return set(), {}
+        return candidates, residual
+
+def normalize_name(name: str) -> str:
+    """
+    Normalize an actor name or alias for fuzzy matching: case-folded,
+    accents stripped, punctuation replaced by spaces.
+    """
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+    return " ".join(_NON_ALNUM.sub(" ", stripped).split())
+
+def trigrams(term: str) -> FrozenSet[str]:
+    """Trigrams of a normalized term, each word padded as "  word "."""
+    grams = set()
+    for word in term.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+class TrigramIndex:
+    """
+    Fuzzy index over actor names and aliases.
+
+    Each normalized name is split into trigrams; a query is scored against
+    the names sharing its rarest trigrams by the mean of trigram Jaccard
+    similarity and the share of the query's trigrams found in the name, so
+    partial names ("fancy") and misspellings ("sofacyy") still rank. A
+    name equal to the query ignoring spacing and punctuation ("APT-28" for
+    "apt28") gets exact_boost on top.
+    """
+
+    def __init__(self, exact_boost: float = 1.0):
+        self.exact_boost = exact_boost
+        # Trigram -> number of trigrams in the name -> names, so names too
+        # short or long to score well are skipped a bucket at a time.
+        self._postings: Dict[str, Dict[int, Set[str]]] = {}
+        self._posting_counts: Dict[str, int] = {}
+        self._term_grams: Dict[str, FrozenSet[str]] = {}
+        self._term_actors: Dict[str, Set[str]] = {}
+        self._compact_terms: Dict[str, Set[str]] = {}
+        self._actor_terms: Dict[str, Set[str]] = {}
+        self._lock = threading.RLock()
+
+    def update(self, actor_id: str, names: Iterable[str]) -> None:
+        """Set the names (name and aliases) an actor is found by."""
+        terms = {normalize_name(name) for name in names if isinstance(name, str)}
+        terms.discard("")
+        with self._lock:
+            old = self._actor_terms.get(actor_id, set())
+            for term in old - terms:
+                self._unlink(actor_id, term)
+            for term in terms - old:
+                self._link(actor_id, term)
+            if terms:
+                self._actor_terms[actor_id] = terms
+            else:
+                self._actor_terms.pop(actor_id, None)
+
+    def remove(self, actor_id: str) -> None:
+        self.update(actor_id, ())
+
+    def _link(self, actor_id: str, term: str) -> None:
+        actors = self._term_actors.get(term)
+        if actors is None:
+            actors = self._term_actors[term] = set()
+            grams = self._term_grams[term] = trigrams(term)
+            for gram in grams:
+                self._postings.setdefault(gram, {}).setdefault(len(grams), set()).add(term)
+                self._posting_counts[gram] = self._posting_counts.get(gram, 0) + 1
+            self._compact_terms.setdefault(term.replace(" ", ""), set()).add(term)
+        actors.add(actor_id)
+
+    def _unlink(self, actor_id: str, term: str) -> None:
+        actors = self._term_actors.get(term)
+        if actors is None:
+            return
+        actors.discard(actor_id)
+        if actors:
+            return
+        del self._term_actors[term]
+        grams = self._term_grams.pop(term)
+        for gram in grams:
+            buckets = self._postings[gram]
+            buckets[len(grams)].discard(term)
+            if not buckets[len(grams)]:
+                del buckets[len(grams)]
+            self._posting_counts[gram] -= 1
+            if not buckets:
+                del self._postings[gram]
+                del self._posting_counts[gram]
+        compact = term.replace(" ", "")
+        self._compact_terms[compact].discard(term)
+        if not self._compact_terms[compact]:
+            del self._compact_terms[compact]
+
+    @staticmethod
+    def _size_bound(query_size: int, term_size: int) -> float:
+        """Highest score a name of term_size trigrams can get for the query."""
+        shared = min(query_size, term_size)
+        return (shared / max(query_size, term_size) + shared / query_size) / 2
+
+    def search(self, query: str, limit: int = 10,
+               threshold: float = 0.3) -> List[Tuple[str, float]]:
+        """
+        Find the actors whose names best match a query.
+
+        Args:
+            query: Name, alias or part of one
+            limit: Maximum number of results
+            threshold: Minimum score (0-1, before the exact boost)
+
+        Returns:
+            List[Tuple[str, float]]: (actor_id, score), best first
+        """
+        term = normalize_name(query)
+        query_grams = trigrams(term)
+        if not query_grams or limit <= 0:
+            return []
+
+        size = len(query_grams)
+        scores: Dict[str, float] = {}
+        # Lowest of the first scores of the best `limit` actors so far: a
+        # lower bound of the final cut-off, used to prune.
+        floor: List[float] = []
+
+        def record(name: str, score: float) -> None:
+            for actor_id in self._term_actors[name]:
+                previous = scores.get(actor_id)
+                if previous is None:
+                    if len(floor) < limit:
+                        heapq.heappush(floor, score)
+                    elif score > floor[0]:
+                        heapq.heapreplace(floor, score)
+                if previous is None or score > previous:
+                    scores[actor_id] = score
+
+        with self._lock:
+            seen = self._compact_terms.get(term.replace(" ", ""), set()).copy()
+            for candidate in seen:
+                record(candidate, 1.0 + self.exact_boost)
+
+            # The score is at most the share of the query's trigrams a name
+            # contains, so a name without any of the i rarest trigrams scores
+            # at most (size - i) / size: walk the trigrams rarest first and
+            # stop once that cannot reach the threshold or the current top.
+            rarest = sorted(query_grams, key=lambda gram: self._posting_counts.get(gram, 0))
+            for position, gram in enumerate(rarest):
+                bound = max(threshold, floor[0] if len(floor) == limit else 0.0)
+                if (size - position) / size < bound:
+                    break
+                buckets = self._postings.get(gram, {})
+                for length in sorted(buckets, key=lambda length: -self._size_bound(size, length)):
+                    # Best possible score given the sizes alone; buckets
+                    # come best first, so the rest score lower too.
+                    if self._size_bound(size, length) < bound:
+                        break
+                    for candidate in buckets[length]:
+                        if candidate in seen:
+                            continue
+                        seen.add(candidate)
+                        grams = self._term_grams[candidate]
+                        shared = len(query_grams & grams)
+                        score = (shared / (size + length - shared) + shared / size) / 2
+                        if score >= bound:
+                            record(candidate, score)
+                            bound = max(threshold, floor[0] if len(floor) == limit else 0.0)
+
+        return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:  # POSIX
+    msvcrt = None
+
+class ConflictError(Exception):
+    """
+    Actors were saved by another process since this one loaded them: their
+    stored metadata version (or record) is no longer the one the change
+    was made to.
+    """
+
+    def __init__(self, conflicts: Dict[str, Tuple[Optional[str], Optional[str]]]):
+        """
+        Args:
+            conflicts: (expected version, stored version) by actor ID, None
+                for an actor expected to be new or no longer stored
+        """
+        self.conflicts = conflicts
+        super().__init__("Version conflict: " + ", ".join(
+            f"{actor_id} (changed without a version bump at {actual})" if expected == actual
+            else f"{actor_id} (expected {expected or 'a new actor'}, found {actual or 'none'})"
+            for actor_id, (expected, actual) in conflicts.items()
+        ))
+
+class FileLock:
+    """
+    Exclusive lock shared by processes through a lock file (flock() on
+    POSIX, msvcrt.locking() on Windows), and re-entrant within a process:
+    a thread holding it can acquire it again, other threads wait.
+    """
+
+    def __init__(self, path: Path, timeout: Optional[float] = None, poll_interval: float = 0.01):
+        """
+        Args:
+            path: Lock file, created if missing
+            timeout: Seconds to wait for the lock (None to wait indefinitely)
+            poll_interval: Seconds between attempts while waiting with a
+                timeout
+        """
+        self.path = Path(path)
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd: Optional[int] = None
+
+    def acquire(self) -> None:
+        """
+        Raises:
+            TimeoutError: If the lock is not acquired within timeout
+        """
+        if not self._thread_lock.acquire(timeout=-1 if self.timeout is None else self.timeout):
+            raise TimeoutError(f"Timed out waiting for {self.path}")
+        try:
+            if self._depth == 0:
+                self._lock_file()
+            self._depth += 1
+        except BaseException:
+            self._thread_lock.release()
+            raise
+
+    def _lock_file(self) -> None:
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_EX | (fcntl.LOCK_NB if deadline else 0))
+                elif msvcrt is not None:
+                    os.lseek(self._fd, 0, os.SEEK_SET)
+                    msvcrt.locking(self._fd, msvcrt.LK_NBLCK, 1)
+                return
+            except OSError:
+                # Held by another process (msvcrt never blocks for long).
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise TimeoutError(f"Timed out waiting for {self.path}")
+                time.sleep(self.poll_interval)
+
+    def release(self) -> None:
+        self._depth -= 1
+        try:
+            if self._depth == 0:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+                elif msvcrt is not None:
+                    os.lseek(self._fd, 0, os.SEEK_SET)
+                    msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            self._thread_lock.release()
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+    def close(self) -> None:
+        """Close the lock file (the lock must not be held)."""
+        with self._thread_lock:
+            if self._fd is not None and self._depth == 0:
+                os.close(self._fd)
+                self._fd = None
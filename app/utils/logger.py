@@ -1,4 +1,5 @@
 import logging
+import logging.config
 import yaml
 from pathlib import Path
 from typing import Optional
@@ -21,6 +22,10 @@ def get_logger(name: str) -> logging.Logger:
         if config_path.exists():
             with open(config_path, 'r') as f:
                 config = yaml.safe_load(f)
+                # File handlers log under the working directory.
+                for handler in config.get('handlers', {}).values():
+                    if 'filename' in handler:
+                        Path(handler['filename']).parent.mkdir(parents=True, exist_ok=True)
                 logging.config.dictConfig(config)
         else:
             # Default configuration if yaml doesn't exist
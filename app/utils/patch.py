@@ -0,0 +1,233 @@
+import copy
+from typing import Any, Dict, List, Tuple
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+def _escape(key: Any) -> str:
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+def _unescape(part: str) -> str:
+    return part.replace("~1", "/").replace("~0", "~")
+
+def _same(old: Any, new: Any) -> bool:
+    """Deep equality telling apart 1, 1.0 and True, which JSON does."""
+    if type(old) is not type(new) or old != new:
+        return False
+    if orjson is not None and isinstance(old, (dict, list)):
+        # Equal containers differ only if their encodings do (or their
+        # key order, which is then diffed key by key).
+        return orjson.dumps(old) == orjson.dumps(new)
+    if isinstance(old, dict):
+        return all(_same(value, new[key]) for key, value in old.items())
+    if isinstance(old, list):
+        return all(map(_same, old, new))
+    return True
+
+def make_patch(old: Any, new: Any) -> List[Dict[str, Any]]:
+    """
+    Structural difference between two JSON documents as a JSON Patch
+    (RFC 6902: add, remove and replace operations).
+
+    Dictionaries are compared key by key and lists item by item after
+    their common head and tail, so appending, inserting or removing items
+    (or dropping some from the front while appending) only records those
+    items. Patch values are shared with new.
+    """
+    ops: List[Dict[str, Any]] = []
+    _diff(old, new, "", ops)
+    return ops
+
+def _diff(old: Any, new: Any, path: str, ops: List[Dict[str, Any]]) -> None:
+    if _same(old, new):
+        return
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in new.items():
+            if key in old:
+                _diff(old[key], value, f"{path}/{_escape(key)}", ops)
+            else:
+                ops.append({"op": "add", "path": f"{path}/{_escape(key)}", "value": value})
+    elif isinstance(old, list) and isinstance(new, list):
+        _diff_list(old, new, path, ops)
+    else:
+        ops.append({"op": "replace", "path": path, "value": new})
+
+def _diff_list(old: List[Any], new: List[Any], path: str, ops: List[Dict[str, Any]]) -> None:
+    shorter = min(len(old), len(new))
+    head = 0
+    while head < shorter and _same(old[head], new[head]):
+        head += 1
+    tail = 0
+    while tail < shorter - head and _same(old[-1 - tail], new[-1 - tail]):
+        tail += 1
+    old_middle = old[head:len(old) - tail]
+    new_middle = new[head:len(new) - tail]
+
+    # Items dropped from the front and others added at the back, as in a
+    # bounded history.
+    if old_middle and new_middle:
+        shift = next((index for index in range(1, len(old_middle))
+                      if _same(old_middle[index], new_middle[0])), 0)
+        kept = len(old_middle) - shift
+        if shift and kept <= len(new_middle) and all(map(_same, old_middle[shift:], new_middle[:kept])):
+            for index in range(head + shift - 1, head - 1, -1):
+                ops.append({"op": "remove", "path": f"{path}/{index}"})
+            for offset in range(kept, len(new_middle)):
+                ops.append({"op": "add", "path": f"{path}/{head + offset}", "value": new_middle[offset]})
+            return
+
+    common = min(len(old_middle), len(new_middle))
+    for offset in range(common):
+        _diff(old_middle[offset], new_middle[offset], f"{path}/{head + offset}", ops)
+    # Remove from the back so earlier indexes stay valid.
+    for index in range(head + len(old_middle) - 1, head + common - 1, -1):
+        ops.append({"op": "remove", "path": f"{path}/{index}"})
+    for offset in range(common, len(new_middle)):
+        ops.append({"op": "add", "path": f"{path}/{head + offset}", "value": new_middle[offset]})
+
+def apply_patch(document: Any, patch: List[Dict[str, Any]], in_place: bool = False) -> Any:
+    """
+    Apply a JSON Patch of add, remove and replace operations.
+
+    Args:
+        document: JSON document
+        patch: Operations, as from make_patch()
+        in_place: Modify document, and take patch values without copying
+            them, instead of working on deep copies
+
+    Returns:
+        Any: The patched document
+
+    Raises:
+        ValueError: If an operation does not apply to the document
+    """
+    if not in_place:
+        document = copy.deepcopy(document)
+    for op in patch:
+        kind, path = op.get("op"), op.get("path", "")
+        if kind not in ("add", "remove", "replace"):
+            raise ValueError(f"Unsupported patch operation: {kind}")
+        value = op.get("value") if in_place else copy.deepcopy(op.get("value"))
+        if path == "":
+            if kind == "remove":
+                raise ValueError("Cannot remove the document root")
+            document = value
+            continue
+
+        parts = [_unescape(part) for part in path.split("/")[1:]]
+        try:
+            parent = document
+            for part in parts[:-1]:
+                parent = parent[int(part)] if isinstance(parent, list) else parent[part]
+            last = parts[-1]
+            if isinstance(parent, list):
+                index = len(parent) if last == "-" else int(last)
+                if index < 0:
+                    raise IndexError(index)
+                if kind == "add":
+                    if not 0 <= index <= len(parent):
+                        raise IndexError(index)
+                    parent.insert(index, value)
+                elif kind == "remove":
+                    del parent[index]
+                else:
+                    parent[index] = value
+            elif isinstance(parent, dict):
+                if kind != "add" and last not in parent:
+                    raise KeyError(last)
+                if kind == "remove":
+                    del parent[last]
+                else:
+                    parent[last] = value
+            else:
+                raise TypeError(type(parent).__name__)
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            raise ValueError(f"Cannot apply {kind} at {path}: {e!r}")
+    return document
+
+def _touches(base: Any, path: str, kind: str) -> Tuple[Tuple[str, ...], List[Tuple[str, ...]], bool]:
+    """
+    Where an operation of a patch against base applies: its path parts,
+    the lists of base it goes through, and whether it appends to the last
+    of them.
+    """
+    parts = tuple(_unescape(part) for part in path.split("/")[1:])
+    lists = []
+    appends = False
+    container = base
+    for depth, part in enumerate(parts):
+        if isinstance(container, list):
+            lists.append(parts[:depth])
+            index = len(container) if part == "-" else int(part)
+            if depth == len(parts) - 1:
+                appends = kind == "add" and index >= len(container)
+            elif index < len(container):
+                container = container[index]
+                continue
+            break
+        if not isinstance(container, dict) or part not in container:
+            break
+        container = container[part]
+    return parts, lists, appends
+
+def merge(base: Any, ours: Any, theirs: Any, in_place: bool = False) -> Any:
+    """
+    Three-way merge of JSON documents: apply the changes from base to ours
+    on top of theirs.
+
+    Changes conflict when they touch the same value, or a value and one
+    inside it, or the same list (whose indexes the other change would
+    shift); the same change on both sides, or items appended to the same
+    list on both sides (ours after theirs), are not a conflict.
+
+    Args:
+        base: Common ancestor
+        ours: Document with the changes to apply
+        theirs: Document to apply them to
+        in_place: Modify theirs instead of a deep copy of it
+
+    Returns:
+        Any: The merged document (sharing values with ours and theirs)
+
+    Raises:
+        ValueError: If the changes conflict
+    """
+    theirs_patch = make_patch(base, theirs)
+    theirs_ops = [_touches(base, op["path"], op["op"]) for op in theirs_patch]
+    theirs_lists = {}
+    # Items theirs appended, by list.
+    theirs_appended: Dict[Tuple[str, ...], List[Any]] = {}
+    for op, (parts, lists, appends) in zip(theirs_patch, theirs_ops):
+        for list_path in lists:
+            appending = appends and list_path == lists[-1]
+            theirs_lists[list_path] = theirs_lists.get(list_path, True) and appending
+        if appends:
+            theirs_appended.setdefault(lists[-1], []).append(op["value"])
+
+    patch = []
+    for op in make_patch(base, ours):
+        parts, lists, appends = _touches(base, op["path"], op["op"])
+        if appends:
+            both = any(_same(op["value"], value) for value in theirs_appended.get(lists[-1], ()))
+        else:
+            both = op in theirs_patch
+        if both:
+            # Made on both sides.
+            continue
+        for list_path in lists:
+            if list_path in theirs_lists and not (
+                    appends and list_path == lists[-1] and theirs_lists[list_path]):
+                raise ValueError(f"Conflicting changes to the list at {op['path']}")
+        for other, _, other_appends in theirs_ops:
+            shorter = min(len(parts), len(other))
+            if parts[:shorter] == other[:shorter] and not (appends and other_appends):
+                raise ValueError(f"Conflicting changes at {op['path']}")
+        if appends and lists[-1] in theirs_lists:
+            op = dict(op, path=op["path"].rsplit("/", 1)[0] + "/-")
+        patch.append(op)
+    return apply_patch(theirs, patch, in_place)
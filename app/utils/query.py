@@ -0,0 +1,434 @@
+import operator
+import re
+from datetime import datetime
+from typing import Any, Callable, Iterable, List, Optional, Set, Tuple
+
+from utils.indexes import AnyOf, Range, SecondaryIndexes, SortedIndex, InvertedIndex, sort_key
+
+class Predicate:
+    """
+    Query predicate over actors. Combine with & (AND), | (OR) and ~ (NOT);
+    build comparisons with Field() or parse them with parse_query().
+    """
+
+    def __and__(self, other: "Predicate") -> "Predicate":
+        return And([self, other])
+
+    def __or__(self, other: "Predicate") -> "Predicate":
+        return Or([self, other])
+
+    def __invert__(self) -> "Predicate":
+        return Not(self)
+
+class Compare(Predicate):
+    """
+    Comparison of a field with a value.
+
+    The path is dotted (e.g. "attack_patterns.technique_id"): lists met on
+    the way are flattened, so the comparison holds if any reached value
+    satisfies it. A list value also matches == and the order operators
+    through any item; "contains" tests list items, dict keys or
+    substrings, and "in" any item of a set. Timestamps (datetimes or ISO
+    strings) compare as UTC.
+    """
+
+    OPERATORS = ("==", "!=", "<", "<=", ">", ">=", "contains", "in")
+
+    def __init__(self, path: str, op: str, value: Any):
+        if op not in self.OPERATORS:
+            raise ValueError(f"Unsupported operator: {op}")
+        if op == "in":
+            value = frozenset(value)
+        self.path = path
+        self.op = op
+        self.value = value
+
+    def __repr__(self) -> str:
+        return f"Compare({self.path!r}, {self.op!r}, {self.value!r})"
+
+class And(Predicate):
+    def __init__(self, children: List[Predicate]):
+        # Flatten nested ANDs so they can be ordered together.
+        self.children = [grandchild for child in children
+                         for grandchild in (child.children if isinstance(child, And) else [child])]
+
+    def __repr__(self) -> str:
+        return f"And({self.children!r})"
+
+class Or(Predicate):
+    def __init__(self, children: List[Predicate]):
+        self.children = [grandchild for child in children
+                         for grandchild in (child.children if isinstance(child, Or) else [child])]
+
+    def __repr__(self) -> str:
+        return f"Or({self.children!r})"
+
+class Not(Predicate):
+    def __init__(self, child: Predicate):
+        self.child = child
+
+    def __repr__(self) -> str:
+        return f"Not({self.child!r})"
+
+class Field:
+    """
+    Predicate builder: Field("confidence_level") >= 4,
+    Field("target_sectors").contains("Energy"),
+    Field("attack_patterns.technique_id").in_({"T1059", "T1566"}).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __eq__(self, value: Any) -> Predicate:  # type: ignore[override]
+        return Compare(self.path, "==", value)
+
+    def __ne__(self, value: Any) -> Predicate:  # type: ignore[override]
+        return Compare(self.path, "!=", value)
+
+    def __lt__(self, value: Any) -> Predicate:
+        return Compare(self.path, "<", value)
+
+    def __le__(self, value: Any) -> Predicate:
+        return Compare(self.path, "<=", value)
+
+    def __gt__(self, value: Any) -> Predicate:
+        return Compare(self.path, ">", value)
+
+    def __ge__(self, value: Any) -> Predicate:
+        return Compare(self.path, ">=", value)
+
+    def contains(self, value: Any) -> Predicate:
+        return Compare(self.path, "contains", value)
+
+    def in_(self, values: Iterable[Any]) -> Predicate:
+        return Compare(self.path, "in", values)
+
+# Query syntax: comparisons joined by AND/OR/NOT and parentheses. Values are
+# numbers, quoted strings, bare words, null/true/false or {a, b} sets.
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (?P<op><=|>=|==|!=|=|<|>)
+      | (?P<punct>[(){},])
+      | (?P<word>[^\s(){},<>=!"']+)
+    )""", re.VERBOSE)
+
+_KEYWORDS = {"and": "AND", "or": "OR", "not": "NOT", "contains": "contains", "in": "in"}
+
+def _tokenize(text: str) -> List[Tuple[str, Any]]:
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None:
+            raise ValueError(f"Invalid query syntax at: {text[position:]!r}")
+        position = match.end()
+        if match.group("string"):
+            raw = match.group("string")
+            tokens.append(("value", re.sub(r"\\(.)", r"\1", raw[1:-1])))
+        elif match.group("op"):
+            op = match.group("op")
+            tokens.append(("op", "==" if op == "=" else op))
+        elif match.group("punct"):
+            tokens.append((match.group("punct"), None))
+        else:
+            word = match.group("word")
+            keyword = _KEYWORDS.get(word.lower())
+            if keyword in ("AND", "OR", "NOT"):
+                tokens.append((keyword, None))
+            elif keyword:
+                tokens.append(("op", keyword))
+            else:
+                tokens.append(("word", word))
+    return tokens
+
+def _literal(word: str) -> Any:
+    lowered = word.lower()
+    if lowered in ("null", "none"):
+        return None
+    if lowered in ("true", "false"):
+        return lowered == "true"
+    for kind in (int, float):
+        try:
+            return kind(word)
+        except ValueError:
+            pass
+    return word
+
+class _Parser:
+    def __init__(self, text: str):
+        self.tokens = _tokenize(text)
+        self.position = 0
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.position][0] if self.position < len(self.tokens) else None
+
+    def take(self, kind: str) -> Any:
+        if self.peek() != kind:
+            found = self.tokens[self.position] if self.position < len(self.tokens) else "end of query"
+            raise ValueError(f"Invalid query syntax: expected {kind}, found {found}")
+        self.position += 1
+        return self.tokens[self.position - 1][1]
+
+    def parse(self) -> Predicate:
+        predicate = self.disjunction()
+        if self.peek() is not None:
+            raise ValueError(f"Invalid query syntax: unexpected {self.tokens[self.position]}")
+        return predicate
+
+    def disjunction(self) -> Predicate:
+        children = [self.conjunction()]
+        while self.peek() == "OR":
+            self.take("OR")
+            children.append(self.conjunction())
+        return children[0] if len(children) == 1 else Or(children)
+
+    def conjunction(self) -> Predicate:
+        children = [self.negation()]
+        while self.peek() == "AND":
+            self.take("AND")
+            children.append(self.negation())
+        return children[0] if len(children) == 1 else And(children)
+
+    def negation(self) -> Predicate:
+        if self.peek() == "NOT":
+            self.take("NOT")
+            return Not(self.negation())
+        if self.peek() == "(":
+            self.take("(")
+            predicate = self.disjunction()
+            self.take(")")
+            return predicate
+        path = self.take("word")
+        op = self.take("op")
+        if op == "in":
+            return Compare(path, op, self.value_set())
+        return Compare(path, op, self.value())
+
+    def value(self) -> Any:
+        if self.peek() == "value":
+            return self.take("value")
+        return _literal(self.take("word"))
+
+    def value_set(self) -> List[Any]:
+        self.take("{")
+        values = []
+        while self.peek() != "}":
+            values.append(self.value())
+            if self.peek() != "}":
+                self.take(",")
+        self.take("}")
+        return values
+
+def parse_query(text: str) -> Predicate:
+    """
+    Parse a query such as:
+
+        confidence_level >= 4 AND target_sectors contains Energy
+        AND first_observed > 2022-01-01
+        AND attack_patterns.technique_id in {T1059, T1566}
+
+    Raises:
+        ValueError: If the query is malformed
+    """
+    return _Parser(text).parse()
+
+def _coerce(value: Any) -> Any:
+    """Literal as compared: ISO timestamps become naive UTC datetimes."""
+    if isinstance(value, frozenset):
+        return frozenset(_coerce(item) for item in value)
+    key = sort_key(value)
+    return key if isinstance(key, datetime) else value
+
+def path_getter(path: str) -> Callable[[Any], List[Any]]:
+    """Function returning the values a dotted path reaches from an actor."""
+    names = path.split(".")
+    first = names[0]
+
+    if len(names) == 1:
+        return lambda actor: [getattr(actor, first, None)]
+
+    def get(actor: Any) -> List[Any]:
+        values = [getattr(actor, first, None)]
+        for name in names[1:]:
+            reached = []
+            for value in values:
+                for item in (value if isinstance(value, list) else (value,)):
+                    if isinstance(item, dict):
+                        reached.append(item.get(name))
+                    elif item is not None:
+                        reached.append(getattr(item, name, None))
+            values = reached
+        return values
+    return get
+
+_ORDERED = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+
+def _test(op: str, literal: Any) -> Callable[[Any], bool]:
+    """Test of one reached value against the (coerced) literal."""
+    timestamps = isinstance(literal, datetime) or (
+        isinstance(literal, frozenset) and any(isinstance(item, datetime) for item in literal))
+
+    if op == "contains":
+        text = str(literal)
+
+        def contains(value: Any) -> bool:
+            if isinstance(value, (list, dict)):
+                if timestamps:
+                    return any(sort_key(item) == literal for item in value)
+                return literal in value
+            return isinstance(value, str) and text in value
+        return contains
+
+    if op == "in":
+        def match(item: Any) -> bool:
+            try:
+                return item in literal
+            except TypeError:  # unhashable, e.g. a dict
+                return False
+    elif op in ("==", "!="):
+        def match(item: Any) -> bool:
+            return item == literal
+    else:
+        compare = _ORDERED[op]
+
+        def match(item: Any) -> bool:
+            if item is None:
+                return False
+            try:
+                return compare(item, literal)
+            except TypeError:
+                return False
+
+    if timestamps:
+        compare_item = match
+
+        def match(item: Any) -> bool:
+            return compare_item(sort_key(item))
+
+    def test(value: Any) -> bool:
+        if isinstance(value, list):
+            return any(map(match, value))
+        return match(value)
+
+    if op == "!=":
+        return lambda value: not test(value)
+    return test
+
+def _cost(predicate: Predicate) -> int:
+    """Rough evaluation cost, for ordering the children of AND and OR."""
+    if isinstance(predicate, Compare):
+        return predicate.path.count(".") * 4 + (2 if predicate.op in ("contains", "in") else 1)
+    if isinstance(predicate, Not):
+        return _cost(predicate.child)
+    return sum(_cost(child) for child in predicate.children)
+
+def compile_predicate(predicate: Predicate,
+                      indexes: Optional[SecondaryIndexes] = None) -> Callable[[Any], bool]:
+    """
+    Compile a predicate into a function of an actor.
+
+    Paths, operators and literals are resolved once. The children of AND
+    and OR are evaluated cheapest first and short-circuit; with indexes,
+    the most selective indexed conditions go first.
+    """
+    if isinstance(predicate, Compare):
+        test = _test(predicate.op, _coerce(predicate.value))
+        if "." not in predicate.path:
+            name = predicate.path
+            return lambda actor: test(getattr(actor, name, None))
+        get = path_getter(predicate.path)
+        if predicate.op == "!=":
+            return lambda actor: all(map(test, get(actor)))
+        return lambda actor: any(map(test, get(actor)))
+    if isinstance(predicate, Not):
+        child = compile_predicate(predicate.child, indexes)
+        return lambda actor: not child(actor)
+
+    def rank(child: Predicate) -> Tuple[int, int]:
+        condition = _index_condition(child, indexes) if indexes is not None else None
+        if condition is not None:
+            name, value = condition
+            return 0, indexes.indexes[name].estimate(value)
+        return 1, _cost(child)
+
+    children = [compile_predicate(child, indexes) for child in sorted(predicate.children, key=rank)]
+    if isinstance(predicate, And):
+        def conjunction(actor: Any) -> bool:
+            for child in children:
+                if not child(actor):
+                    return False
+            return True
+        return conjunction
+
+    def disjunction(actor: Any) -> bool:
+        for child in children:
+            if child(actor):
+                return True
+        return False
+    return disjunction
+
+def _index_condition(predicate: Predicate,
+                     indexes: SecondaryIndexes) -> Optional[Tuple[str, Any]]:
+    """
+    (field, condition) answering a comparison from a secondary index, as a
+    superset of its matches, or None if no index applies.
+    """
+    if not isinstance(predicate, Compare) or predicate.path not in indexes.indexes:
+        return None
+    index = indexes.indexes[predicate.path]
+    value = predicate.value
+    if isinstance(value, (list, dict, set)):
+        return None
+    if predicate.op == "==" and value is not None:
+        return predicate.path, value
+    if predicate.op == "in" and None not in value:
+        return predicate.path, AnyOf(*value)
+    if predicate.op == "contains" and isinstance(index, InvertedIndex):
+        return predicate.path, value
+    if isinstance(index, SortedIndex) and value is not None:
+        # Strict bounds are checked on the candidates afterwards.
+        if predicate.op in ("<", "<="):
+            return predicate.path, Range(None, value)
+        if predicate.op in (">", ">="):
+            return predicate.path, Range(value, None)
+    return None
+
+def candidates(predicate: Predicate, indexes: SecondaryIndexes) -> Optional[Set[str]]:
+    """
+    Actor IDs that can match a predicate, from the secondary indexes: a
+    superset of the matches, or None if the indexes cannot narrow it down.
+    """
+    condition = _index_condition(predicate, indexes)
+    if condition is not None:
+        name, value = condition
+        return indexes.indexes[name].lookup(value)
+    if isinstance(predicate, And):
+        # Intersect the most selective sets first; stop once empty.
+        sets = []
+        for child in predicate.children:
+            condition = _index_condition(child, indexes)
+            if condition is not None:
+                sets.append((indexes.indexes[condition[0]].estimate(condition[1]), child))
+            elif isinstance(child, (And, Or)):
+                sets.append((float("inf"), child))
+        result = None
+        for _, child in sorted(sets, key=lambda item: item[0]):
+            ids = candidates(child, indexes)
+            if ids is None:
+                continue
+            result = ids if result is None else result & ids
+            if not result:
+                return set()
+        return result
+    if isinstance(predicate, Or):
+        result = set()
+        for child in predicate.children:
+            ids = candidates(child, indexes)
+            if ids is None:
+                return None
+            result |= ids
+        return result
+    return None
@@ -0,0 +1,390 @@
+import json
+import math
+import mmap
+import os
+import shutil
+import sys
+from array import array
+from bisect import bisect_right
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from core.serialization import loads, parse_datetime
+from utils.indexes import sort_key
+from utils.logger import get_logger
+
+try:
+    import numpy as np
+except ImportError:  # Snapshots are read through memoryviews instead.
+    np = None
+
+logger = get_logger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Column kinds and the array typecode (and NumPy dtype) of their values.
+# Categories are dictionary encoded: int32 codes into a list of values,
+# -1 for a missing value. Timestamps are float64 seconds since the epoch
+# (UTC), NaN when missing. Strings are int64 offsets into UTF-8 data.
+_TYPECODES = {"category": "i", "int": "i", "timestamp": "d", "string": "q"}
+_DTYPES = {"i": "i4", "d": "f8", "q": "i8"}
+
+# Exploded child tables: one row per list item (or dict key), linked to the
+# actors table by row number. Each maps a column to (kind, value getter).
+_CHILD_TABLES = {
+    "aliases": ("core_identification", "aliases", {
+        "alias": ("string", lambda item: item),
+    }),
+    "target_sectors": ("behavioral_analysis", "target_sectors", {
+        "sector": ("category", lambda item: item),
+    }),
+    "geographic_targeting": ("behavioral_analysis", "geographic_targeting", {
+        "country": ("category", lambda item: item),
+    }),
+    "attack_patterns": ("behavioral_analysis", "attack_patterns", {
+        "technique_id": ("category", lambda item: item.get("technique_id")),
+        "tactic": ("category", lambda item: item.get("tactic")),
+    }),
+    "tools_malware": ("technical_profile", "tools_malware", {
+        "name": ("category", lambda item: item.get("name")),
+        "type": ("category", lambda item: item.get("type")),
+    }),
+    "goals": ("strategic_context", "goals", {
+        "goal": ("category", lambda item: item),
+    }),
+}
+
+def _timestamp(value: Any) -> float:
+    if value is None:
+        return math.nan
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    return (sort_key(value) - _EPOCH).total_seconds()
+
+class _ColumnBuilder:
+    """Accumulates the values of one column."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.values = array(_TYPECODES[kind])
+        self.codes: Dict[Any, int] = {}
+        self.data = bytearray()
+        if kind == "string":
+            self.values.append(0)
+
+    def append(self, value: Any) -> None:
+        if self.kind == "category":
+            if value is None:
+                self.values.append(-1)
+            else:
+                self.values.append(self.codes.setdefault(value, len(self.codes)))
+        elif self.kind == "string":
+            self.data += ("" if value is None else str(value)).encode("utf-8")
+            self.values.append(len(self.data))
+        elif self.kind == "timestamp":
+            self.values.append(_timestamp(value))
+        else:
+            self.values.append(-1 if value is None else int(value))
+
+    def write(self, directory: Path, table: str, column: str) -> Dict:
+        entry = {"kind": self.kind, "file": f"{table}.{column}.bin"}
+        with open(directory / entry["file"], "wb") as f:
+            self.values.tofile(f)
+        if self.kind == "category":
+            entry["categories"] = list(self.codes)
+        if self.kind == "string":
+            entry["data"] = f"{table}.{column}.utf8"
+            (directory / entry["data"]).write_bytes(self.data)
+        return entry
+
+def write_snapshot(database: "ActorDatabase", path: Union[str, Path]) -> Path:
+    """
+    Materialize the actors of a database into a columnar snapshot.
+
+    The snapshot is a directory of flat native-endian column files and a
+    manifest: an actors table (one row per actor) and exploded child
+    tables for aliases, sectors, countries, attack patterns, tools and
+    goals. Categorical fields are dictionary encoded. Column files can be
+    memory-mapped as they are (see Snapshot), e.g. with numpy.memmap, so
+    several processes share one copy. An existing snapshot at path is
+    replaced once the new one is complete.
+
+    Args:
+        database: Database to export (pending write-behind saves are
+            flushed first)
+        path: Snapshot directory
+
+    Returns:
+        Path: The snapshot directory
+    """
+    database.flush()
+    path = Path(path)
+    actors = {
+        "actor_id": _ColumnBuilder("string"),
+        "name": _ColumnBuilder("string"),
+        "capability_level": _ColumnBuilder("category"),
+        "motivation": _ColumnBuilder("category"),
+        "confidence_level": _ColumnBuilder("int"),
+        "first_observed": _ColumnBuilder("timestamp"),
+        "last_observed": _ColumnBuilder("timestamp"),
+    }
+    children = {
+        table: {"actor": _ColumnBuilder("int"), **{
+            column: _ColumnBuilder(kind) for column, (kind, _) in columns.items()
+        }}
+        for table, (_, _, columns) in _CHILD_TABLES.items()
+    }
+
+    rows = 0
+    for actor_id, content in database.storage.items():
+        # Records that failed validation are not part of the database.
+        if actor_id not in database.index:
+            continue
+        try:
+            data = loads(content)
+            identification = data["core_identification"]
+            values = {
+                "actor_id": data["actor_id"],
+                "name": data["name"],
+                "capability_level": data["technical_profile"].get("capability_level"),
+                "motivation": data["strategic_context"].get("motivation"),
+                "confidence_level": identification.get("confidence_level"),
+                "first_observed": identification.get("first_observed"),
+                "last_observed": identification.get("last_observed"),
+            }
+            items = {
+                table: [
+                    [getter(item) for _, getter in columns.values()]
+                    for item in data[section].get(field) or ()
+                ]
+                for table, (section, field, columns) in _CHILD_TABLES.items()
+            }
+        except (ValueError, KeyError, AttributeError, TypeError) as e:
+            logger.warning(f"Skipping actor {actor_id} in snapshot: {str(e)}")
+            continue
+        for column, builder in actors.items():
+            builder.append(values[column])
+        for table, (_, _, columns) in _CHILD_TABLES.items():
+            builders = children[table]
+            for item in items[table]:
+                builders["actor"].append(rows)
+                for column, value in zip(columns, item):
+                    builders[column].append(value)
+        rows += 1
+
+    tmp_path = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+    if tmp_path.exists():
+        shutil.rmtree(tmp_path)
+    tmp_path.mkdir(parents=True)
+    manifest = {"version": SNAPSHOT_VERSION, "byteorder": sys.byteorder, "tables": {}}
+    tables = [("actors", actors, rows)]
+    tables += [(table, builders, len(builders["actor"].values)) for table, builders in children.items()]
+    for table, builders, count in tables:
+        manifest["tables"][table] = {
+            "rows": count,
+            "columns": {column: builder.write(tmp_path, table, column) for column, builder in builders.items()}
+        }
+    (tmp_path / "manifest.json").write_text(json.dumps(manifest, indent=2))
+
+    if path.exists():
+        old_path = path.with_name(f"{path.name}.old-{os.getpid()}")
+        os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path)
+    else:
+        os.replace(tmp_path, path)
+    logger.info(f"Wrote snapshot of {rows} actors to {path}")
+    return path
+
+class Snapshot:
+    """
+    Read-only view of a snapshot written by write_snapshot().
+
+    Columns are memory-mapped, not loaded: with NumPy they are read-only
+    numpy.memmap arrays, otherwise memoryviews over the mapping. Either way
+    processes opening the same snapshot share its pages. Aggregates are
+    computed over whole columns (vectorized with NumPy).
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.manifest = json.loads((self.path / "manifest.json").read_text())
+        if self.manifest.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version: {self.manifest.get('version')}")
+        if self.manifest["byteorder"] != sys.byteorder:
+            raise ValueError(f"Snapshot was written on a {self.manifest['byteorder']}-endian machine")
+        self._maps: Dict[str, mmap.mmap] = {}
+        self._columns: Dict[Tuple[str, str], Any] = {}
+
+    @property
+    def tables(self) -> List[str]:
+        return list(self.manifest["tables"])
+
+    def rows(self, table: str) -> int:
+        return self.manifest["tables"][table]["rows"]
+
+    def _entry(self, table: str, column: str) -> Dict:
+        try:
+            return self.manifest["tables"][table]["columns"][column]
+        except KeyError:
+            raise KeyError(f"No column {column} in snapshot table {table}")
+
+    def _map(self, name: str) -> Optional[mmap.mmap]:
+        if name not in self._maps:
+            with open(self.path / name, "rb") as f:
+                # Empty files cannot be mapped.
+                self._maps[name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) \
+                    if os.fstat(f.fileno()).st_size else None
+        return self._maps[name]
+
+    def column(self, table: str, column: str) -> Any:
+        """
+        Values of a column: category codes, integers, timestamps, or the
+        offsets of a string column (see strings()).
+        """
+        key = (table, column)
+        if key not in self._columns:
+            entry = self._entry(table, column)
+            typecode = _TYPECODES[entry["kind"]]
+            if np is not None:
+                if os.path.getsize(self.path / entry["file"]):
+                    values = np.memmap(self.path / entry["file"], dtype=_DTYPES[typecode], mode="r")
+                else:
+                    values = np.empty(0, dtype=_DTYPES[typecode])
+            else:
+                mapping = self._map(entry["file"])
+                values = memoryview(mapping if mapping is not None else b"").cast(typecode)
+            self._columns[key] = values
+        return self._columns[key]
+
+    def categories(self, table: str, column: str) -> List[Any]:
+        """Dictionary of a category column: the value of each code."""
+        return self._entry(table, column)["categories"]
+
+    def strings(self, table: str, column: str) -> List[str]:
+        """Decoded values of a string column."""
+        entry = self._entry(table, column)
+        offsets = self.column(table, column)
+        mapping = self._map(entry["data"])
+        data = memoryview(mapping if mapping is not None else b"")
+        return [
+            bytes(data[int(offsets[i]):int(offsets[i + 1])]).decode("utf-8")
+            for i in range(len(offsets) - 1)
+        ]
+
+    def value_counts(self, table: str, column: str) -> Dict[Any, int]:
+        """Number of rows per value of a category column, most common first."""
+        categories = self.categories(table, column)
+        codes = self.column(table, column)
+        if np is not None:
+            counts = np.bincount(codes[codes >= 0], minlength=len(categories)).tolist()
+        else:
+            counter = Counter(codes)
+            counts = [counter.get(code, 0) for code in range(len(categories))]
+        return dict(sorted(
+            ((value, count) for value, count in zip(categories, counts) if count),
+            key=lambda item: -item[1]
+        ))
+
+    def crosstab(self, table: str, column: str, actor_column: str) -> Dict[Tuple[Any, Any], int]:
+        """
+        Rows of a child table counted per (value of column, value of the
+        linked actor's category column), e.g. sectors by capability level:
+        crosstab("target_sectors", "sector", "capability_level").
+        """
+        categories = self.categories(table, column)
+        actor_categories = self.categories("actors", actor_column)
+        codes = self.column(table, column)
+        actor_codes = self.column("actors", actor_column)
+        links = self.column(table, "actor")
+        width = len(actor_categories)
+        if np is not None:
+            linked = actor_codes[links]
+            valid = (codes >= 0) & (linked >= 0)
+            counts = np.bincount(codes[valid].astype("i8") * width + linked[valid],
+                                 minlength=len(categories) * width)
+            pairs = {int(key): int(counts[key]) for key in np.flatnonzero(counts)}
+        else:
+            pairs = Counter(
+                code * width + actor_codes[link]
+                for code, link in zip(codes, links)
+                if code >= 0 and actor_codes[link] >= 0
+            )
+        return {
+            (categories[key // width], actor_categories[key % width]): count
+            for key, count in sorted(pairs.items(), key=lambda item: -item[1])
+        }
+
+    def histogram(self, table: str, column: str, edges: Sequence[float]) -> List[int]:
+        """
+        Counts of a numeric or timestamp column in the bins between
+        consecutive edges; bins include their lower edge, the last bin its
+        upper edge too. Missing values are not counted.
+        """
+        values = self.column(table, column)
+        if np is not None:
+            values = np.asarray(values, dtype="f8")
+            counts, _ = np.histogram(values[~np.isnan(values)], bins=edges)
+            return counts.tolist()
+        counts = [0] * (len(edges) - 1)
+        for value in values:
+            if value != value or value < edges[0] or value > edges[-1]:
+                continue
+            counts[min(bisect_right(edges, value) - 1, len(counts) - 1)] += 1
+        return counts
+
+    def close(self) -> None:
+        """Unmap the column files; release arrays taken from column() first."""
+        self._columns.clear()
+        for mapping in self._maps.values():
+            if mapping is not None:
+                mapping.close()
+        self._maps.clear()
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+def export_parquet(snapshot: Snapshot, directory: Union[str, Path]) -> List[Path]:
+    """
+    Write each table of a snapshot to a Parquet file, with category columns
+    as Arrow dictionary arrays. Requires pyarrow.
+
+    Returns:
+        List[Path]: The files written
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export requires pyarrow")
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    written = []
+    for table in snapshot.tables:
+        arrays = {}
+        for column, entry in snapshot.manifest["tables"][table]["columns"].items():
+            if entry["kind"] == "string":
+                arrays[column] = pa.array(snapshot.strings(table, column), type=pa.string())
+            elif entry["kind"] == "category":
+                codes = pa.array([None if code < 0 else code for code in snapshot.column(table, column)],
+                                 type=pa.int32())
+                arrays[column] = pa.DictionaryArray.from_arrays(codes, pa.array(entry["categories"]))
+            elif entry["kind"] == "timestamp":
+                arrays[column] = pa.array(
+                    [None if value != value else round(value * 1e6) for value in snapshot.column(table, column)],
+                    type=pa.timestamp("us", tz="UTC")
+                )
+            else:
+                arrays[column] = pa.array(list(snapshot.column(table, column)), type=pa.int32())
+        target = directory / f"{table}.parquet"
+        pq.write_table(pa.table(arrays), target)
+        written.append(target)
+    return written
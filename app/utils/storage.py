@@ -0,0 +1,630 @@
+import json
+import os
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from core.serialization import loads
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class ActorStorage:
+    """
+    Record store behind ActorDatabase. Records are serialized actors
+    (to_json_bytes() output) keyed by actor_id.
+    """
+
+    def read(self, actor_id: str) -> Optional[bytes]:
+        """Read the record of an actor, or None if there is none."""
+        raise NotImplementedError
+
+    def write(self, actor_id: str, content: bytes) -> None:
+        """Store the record of an actor, replacing any earlier one."""
+        raise NotImplementedError
+
+    def write_many(self, records: Iterable[Tuple[str, bytes]]) -> None:
+        """Store several (actor_id, record) pairs, in one batch where supported."""
+        for actor_id, content in records:
+            self.write(actor_id, content)
+
+    def keys(self) -> List[str]:
+        """IDs of all stored actors."""
+        raise NotImplementedError
+
+    def items(self) -> Iterator[Tuple[str, bytes]]:
+        """Iterate over (actor_id, record) pairs."""
+        for actor_id in self.keys():
+            content = self.read(actor_id)
+            if content is not None:
+                yield actor_id, content
+
+    def close(self) -> None:
+        """Release files and background workers."""
+
+class FileStorage(ActorStorage):
+    """
+    One JSON file per actor. Files are replaced atomically: a record is
+    written to a temporary file that is then renamed over the old one, so
+    a crash leaves either version, never a torn file. With fsync, files are
+    synced before the rename and the directory once per write_many()
+    batch, so a batch survives power loss once it returns.
+
+    Temporary files are named after the writing process, so processes
+    sharing the directory never write to the same one, and only those
+    left over for a minute are cleaned up on open.
+    """
+
+    def __init__(self, directory: Path, fsync: bool = True):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.fsync = fsync
+        stale = time.time() - 60
+        for leftover in self.directory.glob('*.json*.tmp'):
+            try:
+                if leftover.stat().st_mtime < stale:
+                    leftover.unlink()
+            except FileNotFoundError:
+                # Renamed by its writer meanwhile.
+                pass
+
+    def _path(self, actor_id: str) -> Path:
+        return self.directory / f"{actor_id}.json"
+
+    def read(self, actor_id: str) -> Optional[bytes]:
+        path = self._path(actor_id)
+        if not path.exists():
+            return None
+        return path.read_bytes()
+
+    def write(self, actor_id: str, content: bytes) -> None:
+        self.write_many([(actor_id, content)])
+
+    def write_many(self, records: Iterable[Tuple[str, bytes]]) -> None:
+        written = False
+        for actor_id, content in records:
+            path = self._path(actor_id)
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+            written = True
+        if written and self.fsync:
+            _fsync_dir(self.directory)
+
+    def keys(self) -> List[str]:
+        return [path.stem for path in self.directory.glob('*.json')]
+
+# Record header: CRC32 of everything after it, key length, value length.
+# The CRC covers the lengths too, so a torn header is detected as well.
+_HEADER = struct.Struct(">IHI")
+_LENGTHS = struct.Struct(">HI")
+
+def _fsync_dir(directory: Path) -> None:
+    """Persist renames and unlinks in a directory (no-op where unsupported)."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+class LogStorage(ActorStorage):
+    """
+    Log-structured record store.
+
+    Every write appends a length-prefixed, checksummed record to the active
+    segment file, and an in-memory index maps each actor_id to the offset
+    of its latest record. Segments are sealed once they reach segment_size.
+    When the share of superseded bytes in sealed segments passes
+    compaction_threshold, a background thread copies the live records into
+    one segment and deletes the rest.
+
+    On open, segments are replayed in order to rebuild the index; a
+    segment ending in a torn or corrupt record (e.g. after a crash during
+    an append) is truncated before it. close() and compaction leave a hint
+    file with the index and segment sizes, so the next open only replays
+    what was appended after it.
+    """
+
+    def __init__(self, directory: Path, segment_size: int = 64 * 1024 * 1024,
+                 compaction_threshold: float = 0.5, fsync: bool = False,
+                 background_compaction: bool = True):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_size = segment_size
+        self.compaction_threshold = compaction_threshold
+        self.fsync = fsync
+
+        self._lock = threading.RLock()
+        self._compaction_lock = threading.Lock()
+        # actor_id -> (segment, record offset, key length, value length)
+        self._index: Dict[str, Tuple[int, int, int, int]] = {}
+        self._sizes: Dict[int, int] = {}
+        self._dead: Dict[int, int] = {}
+        self._readers: Dict[int, BinaryIO] = {}
+
+        self._recover()
+        self._active = max(self._sizes, default=0) or self._new_segment()
+        self._writer = open(self._segment_path(self._active), 'ab')
+
+        self._closed = False
+        self._wakeup = threading.Event()
+        self._compactor = None
+        if background_compaction:
+            self._compactor = threading.Thread(
+                target=self._compaction_loop, name="log-compaction", daemon=True
+            )
+            self._compactor.start()
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.directory / f"segment-{segment:08d}.log"
+
+    def _new_segment(self) -> int:
+        segment = max(self._sizes, default=0) + 1
+        self._segment_path(segment).touch()
+        self._sizes[segment] = 0
+        self._dead[segment] = 0
+        self._readers[segment] = open(self._segment_path(segment), 'rb')
+        return segment
+
+    def _recover(self) -> None:
+        """Rebuild the index from the hint file and segment files, truncating torn tails."""
+        for leftover in self.directory.glob('segment-*.compact'):
+            leftover.unlink()
+
+        segments = sorted(int(path.stem.split('-')[1]) for path in self.directory.glob('segment-*.log'))
+        hinted = self._load_hint(segments)
+
+        for segment in segments:
+            path = self._segment_path(segment)
+            start = hinted.get(segment, 0)
+            self._dead.setdefault(segment, 0)
+            with open(path, 'rb') as f:
+                f.seek(start)
+                data = f.read()
+            offset = 0
+            while offset < len(data):
+                record = self._parse_record(data, offset)
+                if record is None:
+                    logger.warning(
+                        f"Truncating {path.name} at offset {start + offset}: "
+                        f"{len(data) - offset} bytes of torn or corrupt records"
+                    )
+                    with open(path, 'r+b') as f:
+                        f.truncate(start + offset)
+                    break
+                actor_id, key_length, value_length = record
+                self._supersede(actor_id)
+                self._index[actor_id] = (segment, start + offset, key_length, value_length)
+                offset += _HEADER.size + key_length + value_length
+            self._sizes[segment] = start + offset
+            self._readers[segment] = open(path, 'rb')
+
+    @property
+    def _hint_path(self) -> Path:
+        return self.directory / 'index.hint'
+
+    def _load_hint(self, segments: List[int]) -> Dict[int, int]:
+        """
+        Load the index saved by _write_hint() if the segments still hold
+        everything it covers. Returns the hinted size of each segment (the
+        offset replay resumes from), or {} to replay everything.
+        """
+        if not self._hint_path.exists():
+            return {}
+        try:
+            with open(self._hint_path, 'r') as f:
+                hint = json.load(f)
+            sizes = {int(segment): size for segment, size in hint["segments"].items()}
+            present = set(segments)
+            for segment, size in sizes.items():
+                if segment not in present or self._segment_path(segment).stat().st_size < size:
+                    raise ValueError(f"segment {segment} does not match the hint")
+            self._index = {key: tuple(location) for key, location in hint["index"].items()}
+            self._dead = {int(segment): dead for segment, dead in hint["dead"].items()}
+            return sizes
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring index hint in {self.directory}: {str(e)}")
+            self._index = {}
+            self._dead = {}
+            return {}
+
+    def _write_hint(self) -> None:
+        """Save the index and segment sizes for the next open."""
+        with self._lock:
+            hint = {
+                "segments": self._sizes,
+                "dead": self._dead,
+                "index": self._index
+            }
+            content = json.dumps(hint)
+        tmp_path = self._hint_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            f.write(content)
+        os.replace(tmp_path, self._hint_path)
+
+    @staticmethod
+    def _parse_record(data: bytes, offset: int) -> Optional[Tuple[str, int, int]]:
+        """Check the record at offset; (actor_id, key length, value length) if intact."""
+        if offset + _HEADER.size > len(data):
+            return None
+        crc, key_length, value_length = _HEADER.unpack_from(data, offset)
+        start = offset + _HEADER.size
+        end = start + key_length + value_length
+        if end > len(data):
+            return None
+        if zlib.crc32(data[start:end], zlib.crc32(_LENGTHS.pack(key_length, value_length))) != crc:
+            return None
+        return data[start:start + key_length].decode('utf-8'), key_length, value_length
+
+    def _supersede(self, actor_id: str) -> None:
+        """Count the current record of an actor as dead space."""
+        old = self._index.get(actor_id)
+        if old is not None:
+            segment, _, key_length, value_length = old
+            self._dead[segment] += _HEADER.size + key_length + value_length
+
+    def read(self, actor_id: str) -> Optional[bytes]:
+        with self._lock:
+            location = self._index.get(actor_id)
+            if location is None:
+                return None
+            segment, offset, key_length, value_length = location
+            reader = self._readers[segment]
+            reader.seek(offset + _HEADER.size + key_length)
+            return reader.read(value_length)
+
+    def write(self, actor_id: str, content: bytes) -> None:
+        self.write_many([(actor_id, content)])
+
+    def write_many(self, records: Iterable[Tuple[str, bytes]]) -> None:
+        """Append a batch of records, flushing (and syncing) once at the end."""
+        with self._lock:
+            for actor_id, content in records:
+                key = actor_id.encode('utf-8')
+                lengths = _LENGTHS.pack(len(key), len(content))
+                crc = zlib.crc32(key + content, zlib.crc32(lengths))
+                record = _HEADER.pack(crc, len(key), len(content)) + key + content
+
+                offset = self._sizes[self._active]
+                self._writer.write(record)
+                self._supersede(actor_id)
+                self._index[actor_id] = (self._active, offset, len(key), len(content))
+                self._sizes[self._active] = offset + len(record)
+
+                if self._sizes[self._active] >= self.segment_size:
+                    self._sync_writer()
+                    self._writer.close()
+                    self._active = self._new_segment()
+                    self._writer = open(self._segment_path(self._active), 'ab')
+            self._sync_writer()
+            if self._needs_compaction():
+                self._wakeup.set()
+
+    def _sync_writer(self) -> None:
+        self._writer.flush()
+        if self.fsync:
+            os.fsync(self._writer.fileno())
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return list(self._index)
+
+    def _needs_compaction(self) -> bool:
+        sealed = [segment for segment in self._sizes if segment != self._active]
+        total = sum(self._sizes[segment] for segment in sealed)
+        dead = sum(self._dead[segment] for segment in sealed)
+        return total > 0 and dead / total >= self.compaction_threshold
+
+    def stats(self) -> Dict[str, int]:
+        """Segment count, total bytes and superseded bytes."""
+        with self._lock:
+            return {
+                "segments": len(self._sizes),
+                "records": len(self._index),
+                "bytes": sum(self._sizes.values()),
+                "dead_bytes": sum(self._dead.values())
+            }
+
+    def compact(self) -> bool:
+        """
+        Merge the live records of all sealed segments into one segment.
+
+        The merged segment takes the number of the newest sealed segment, so
+        replaying after a crash at any point still lets later records win.
+
+        Returns:
+            bool: True if any segments were compacted
+        """
+        with self._compaction_lock:
+            with self._lock:
+                sealed = sorted(segment for segment in self._sizes if segment != self._active)
+                if not sealed:
+                    return False
+                sealed_set = set(sealed)
+                live = [(actor_id, location) for actor_id, location in self._index.items()
+                        if location[0] in sealed_set]
+
+            # Sealed segments are immutable, so they are copied without
+            # holding the lock; writes go to the active segment meanwhile.
+            target = sealed[-1]
+            tmp_path = self.directory / f"segment-{target:08d}.compact"
+            moved = {}
+            sources = {segment: open(self._segment_path(segment), 'rb') for segment in sealed}
+            try:
+                with open(tmp_path, 'wb') as out:
+                    position = 0
+                    for actor_id, location in live:
+                        segment, offset, key_length, value_length = location
+                        length = _HEADER.size + key_length + value_length
+                        source = sources[segment]
+                        source.seek(offset)
+                        out.write(source.read(length))
+                        moved[actor_id] = (location, (target, position, key_length, value_length))
+                        position += length
+                    out.flush()
+                    os.fsync(out.fileno())
+            finally:
+                for source in sources.values():
+                    source.close()
+
+            with self._lock:
+                # The hint describes the old segments; replay until rewritten.
+                if self._hint_path.exists():
+                    self._hint_path.unlink()
+                os.replace(tmp_path, self._segment_path(target))
+                self._readers.pop(target).close()
+                self._readers[target] = open(self._segment_path(target), 'rb')
+                self._sizes[target] = position
+                self._dead[target] = 0
+                for actor_id, (old, new) in moved.items():
+                    if self._index.get(actor_id) == old:
+                        self._index[actor_id] = new
+                    else:
+                        # Rewritten while we copied; the copy is already dead.
+                        self._dead[target] += _HEADER.size + new[2] + new[3]
+                for segment in sealed[:-1]:
+                    self._readers.pop(segment).close()
+                    self._segment_path(segment).unlink()
+                    del self._sizes[segment]
+                    del self._dead[segment]
+            _fsync_dir(self.directory)
+            self._write_hint()
+
+            logger.info(f"Compacted {len(sealed)} segments into {self._segment_path(target).name}")
+            return True
+
+    def _compaction_loop(self) -> None:
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._closed:
+                return
+            try:
+                self.compact()
+            except Exception as e:
+                logger.error(f"Error compacting {self.directory}: {str(e)}")
+
+    def close(self) -> None:
+        self._closed = True
+        self._wakeup.set()
+        if self._compactor is not None:
+            self._compactor.join()
+        with self._lock:
+            if self._writer.closed:
+                return
+            self._writer.flush()
+            if self.fsync:
+                os.fsync(self._writer.fileno())
+            self._write_hint()
+            self._writer.close()
+            for reader in self._readers.values():
+                reader.close()
+            self._readers.clear()
+
+# Top-level keys of a record (ThreatActor.to_dict() order) and the column
+# holding each. Sections are stored as JSON.
+_SQLITE_COLUMNS = {
+    "actor_id": "actor_id",
+    "name": "name",
+    "uuid": "uuid",
+    "metadata": "metadata",
+    "references": "refs",
+    "core_identification": "core_identification",
+    "technical_profile": "technical_profile",
+    "behavioral_analysis": "behavioral_analysis",
+    "strategic_context": "strategic_context",
+}
+_SQLITE_TEXT_KEYS = ("actor_id", "name", "uuid")
+
+class SQLiteStorage(ActorStorage):
+    """
+    Embedded SQLite record store.
+
+    Each record is one row with a JSON column per section, so SQLite's JSON
+    functions can query it. Searches are answered by ActorDatabase's
+    secondary indexes, as for the other stores, so no search columns are
+    indexed here: an index would only slow down writes. Rows are
+    reassembled into the exact bytes written. A record that does not have
+    the to_json_bytes() layout is kept verbatim in a raw column instead.
+
+    The database runs in WAL mode, so readers do not block the writer.
+    Every thread gets its own connection; statements are fixed strings, so
+    each connection prepares them once and reuses them from its cache.
+    write_many() stores a batch in one transaction.
+    """
+
+    _UPSERT = (
+        f"INSERT INTO actors ({', '.join(_SQLITE_COLUMNS.values())}, raw) "
+        f"VALUES ({', '.join('?' * (len(_SQLITE_COLUMNS) + 1))}) "
+        f"ON CONFLICT(actor_id) DO UPDATE SET "
+        + ", ".join(f"{column} = excluded.{column}" for column in [*list(_SQLITE_COLUMNS.values())[1:], "raw"])
+    )
+    _SELECT = f"SELECT {', '.join(_SQLITE_COLUMNS.values())}, raw FROM actors"
+
+    def __init__(self, path: Path, fsync: bool = False, timeout: float = 30.0):
+        """
+        Args:
+            path: Database file
+            fsync: Sync the WAL on every commit (synchronous=FULL) rather
+                than at checkpoints (NORMAL, which can lose the last commits
+                on power failure but never corrupts the database)
+            timeout: Seconds to wait for another writer's lock
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.fsync = fsync
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._create_schema()
+
+    def _connection(self) -> sqlite3.Connection:
+        """The calling thread's connection, opened on first use."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Autocommit mode: transactions are opened explicitly.
+            connection = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None,
+                check_same_thread=False, cached_statements=64
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(f"PRAGMA synchronous={'FULL' if self.fsync else 'NORMAL'}")
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def _create_schema(self) -> None:
+        sections = "".join(
+            f",\n    {column} TEXT" for key, column in _SQLITE_COLUMNS.items()
+            if key not in _SQLITE_TEXT_KEYS
+        )
+        self._connection().execute(
+            f"CREATE TABLE IF NOT EXISTS actors (\n"
+            f"    actor_id TEXT PRIMARY KEY,\n    name TEXT,\n    uuid TEXT"
+            f"{sections},\n    raw BLOB\n)"
+        )
+
+    @staticmethod
+    def _split(actor_id: str, content: bytes) -> Tuple:
+        """
+        Row values for a record: its sections, or the raw bytes.
+
+        Sections are serialized from the parsed record as they would be
+        dumped at top level, and kept only if they reassemble into the
+        exact bytes written.
+        """
+        try:
+            data = loads(content)
+        except ValueError:
+            data = None
+        if (isinstance(data, dict) and list(data) == list(_SQLITE_COLUMNS)
+                and all(isinstance(data[key], str) for key in _SQLITE_TEXT_KEYS)
+                and data["actor_id"] == actor_id):
+            row = tuple(
+                value if key in _SQLITE_TEXT_KEYS else json.dumps(value, indent=2)
+                for key, value in data.items()
+            ) + (None,)
+            if SQLiteStorage._assemble(row) == content:
+                return row
+        return (actor_id,) + (None,) * (len(_SQLITE_COLUMNS) - 1) + (content,)
+
+    @staticmethod
+    def _assemble(row: Tuple) -> bytes:
+        """
+        Rebuild a record from its row. Sections are stored as they would be
+        dumped at top level, so nesting them one level deeper only indents
+        their continuation lines.
+        """
+        if row[-1] is not None:
+            return row[-1]
+        fields = []
+        for key, value in zip(_SQLITE_COLUMNS, row):
+            if key in _SQLITE_TEXT_KEYS:
+                value = json.dumps(value)
+            fields.append(f"  {json.dumps(key)}: {value.replace(chr(10), chr(10) + '  ')}")
+        return ("{\n" + ",\n".join(fields) + "\n}").encode()
+
+    def read(self, actor_id: str) -> Optional[bytes]:
+        row = self._connection().execute(f"{self._SELECT} WHERE actor_id = ?", (actor_id,)).fetchone()
+        return None if row is None else self._assemble(row)
+
+    def write(self, actor_id: str, content: bytes) -> None:
+        self._connection().execute(self._UPSERT, self._split(actor_id, content))
+
+    def write_many(self, records: Iterable[Tuple[str, bytes]]) -> None:
+        rows = [self._split(actor_id, content) for actor_id, content in records]
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany(self._UPSERT, rows)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def keys(self) -> List[str]:
+        return [row[0] for row in self._connection().execute("SELECT actor_id FROM actors")]
+
+    def items(self) -> Iterator[Tuple[str, bytes]]:
+        for row in self._connection().execute(self._SELECT):
+            yield row[0], self._assemble(row)
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+def create_storage(data_dir: Path, config: Optional[Dict] = None) -> ActorStorage:
+    """
+    Create the record store selected by database.type.
+
+    Args:
+        data_dir: Database data directory
+        config: The database section of the configuration (default: from
+            config.yaml)
+
+    Returns:
+        ActorStorage: Storage for the configured type
+    """
+    if config is None:
+        from config import load_config
+        config = load_config().get('database', {})
+
+    storage_type = config.get('type', 'file')
+    if storage_type == 'file':
+        options = config.get('file') or {}
+        return FileStorage(Path(data_dir) / 'actors', fsync=options.get('fsync', True))
+    if storage_type == 'log':
+        options = config.get('log') or {}
+        return LogStorage(
+            Path(data_dir) / 'log',
+            segment_size=options.get('segment_size', 64 * 1024 * 1024),
+            compaction_threshold=options.get('compaction_threshold', 0.5),
+            fsync=options.get('fsync', False)
+        )
+    if storage_type == 'sqlite':
+        options = config.get('sqlite') or {}
+        return SQLiteStorage(
+            Path(options.get('path') or Path(data_dir) / 'stasis.db'),
+            fsync=options.get('fsync', False)
+        )
+    if storage_type == 'postgresql':
+        raise ValueError("PostgreSQL is served asynchronously by utils.postgres.PostgresActorStore")
+    raise ValueError(f"Unsupported database type: {storage_type}")
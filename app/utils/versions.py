@@ -0,0 +1,186 @@
+import json
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from core.serialization import loads
+from utils.cache import LRUCache
+from utils.indexes import sort_key
+from utils.logger import get_logger
+from utils.patch import apply_patch, make_patch
+
+logger = get_logger(__name__)
+
+# Version selector: a sequence number (1 for the first save) or a
+# metadata version string (its latest save).
+VersionRef = Union[int, str]
+
+class VersionStore:
+    """
+    Saved versions of actors, for reading an actor as it was at a given
+    time.
+
+    Each actor has an append-only log of its saves (one JSON line each,
+    with a sequence number, the metadata version, the save time and the
+    record checksum). Every checkpoint_interval-th save stores the whole
+    document; the saves in between store a JSON Patch against the previous
+    one, so reading a version applies at most checkpoint_interval - 1
+    patches.
+    """
+
+    def __init__(self, directory: Path, checkpoint_interval: int = 20,
+                 cache_size: Optional[int] = 1000):
+        """
+        Args:
+            directory: Directory of the version logs
+            checkpoint_interval: Saves per full checkpoint
+            cache_size: Number of actors whose latest version is kept in
+                memory to diff the next save against
+        """
+        if checkpoint_interval < 1:
+            raise ValueError("checkpoint_interval must be at least 1")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.checkpoint_interval = checkpoint_interval
+        # actor ID -> (sequence number, document, whether the log lacks a
+        # final newline after a torn write)
+        self._heads = LRUCache(max_entries=cache_size)
+        self._lock = threading.Lock()
+
+    def _path(self, actor_id: str) -> Path:
+        return self.directory / f"{actor_id}.jsonl"
+
+    def _entries(self, actor_id: str) -> Tuple[List[Dict[str, Any]], bool]:
+        """Log entries of an actor, oldest first, and whether the last line is torn."""
+        path = self._path(actor_id)
+        if not path.exists():
+            return [], False
+        content = path.read_bytes()
+        entries = []
+        for line in content.splitlines():
+            try:
+                entries.append(loads(line))
+            except ValueError:
+                # Torn final line from an interrupted append.
+                logger.warning(f"Skipping unreadable version entry for {actor_id}")
+        return entries, bool(content) and not content.endswith(b"\n")
+
+    def record(self, saves: Iterable[Tuple[str, bytes, str, str]]) -> List[List[Dict[str, Any]]]:
+        """
+        Append saved actors to their version logs.
+
+        Args:
+            saves: (actor ID, saved record, metadata version, record
+                checksum) tuples
+
+        Returns:
+            List[List[Dict[str, Any]]]: JSON Patch of each save against the
+            actor's previous version (replacing the whole document for a
+            first version)
+        """
+        saved = datetime.now(timezone.utc).isoformat()
+        patches = []
+        with self._lock:
+            for actor_id, content, version, checksum in saves:
+                document = loads(content)
+                head = self._heads.get(actor_id)
+                if head is None:
+                    entries, torn = self._entries(actor_id)
+                    head = (entries[-1]["seq"], self._rebuild(entries, len(entries) - 1, copy=False), torn) \
+                        if entries else (0, None, torn)
+                seq, previous, torn = head
+
+                entry = {"seq": seq + 1, "version": version, "saved": saved, "checksum": checksum}
+                patch = [{"op": "add", "path": "", "value": document}] if previous is None \
+                    else make_patch(previous, document)
+                if previous is None or seq % self.checkpoint_interval == 0:
+                    entry["checkpoint"] = document
+                else:
+                    entry["patch"] = patch
+                patches.append(patch)
+                with open(self._path(actor_id), 'a', encoding='utf-8') as f:
+                    f.write(("\n" if torn else "") + json.dumps(entry) + "\n")
+                self._heads.put(actor_id, (seq + 1, document, False))
+        return patches
+
+    def forget(self, actor_id: str) -> None:
+        """Drop the cached latest version of an actor, e.g. after another process saved it."""
+        with self._lock:
+            self._heads.discard(actor_id)
+
+    @staticmethod
+    def _rebuild(entries: List[Dict[str, Any]], position: int, copy: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Document of the entry at position: its checkpoint plus the patches
+        since. Without copy, the entries are patched in place (and must not
+        be used again).
+        """
+        start = position
+        while start >= 0 and "checkpoint" not in entries[start]:
+            start -= 1
+        if start < 0:
+            return None
+        clone = (lambda value: json.loads(json.dumps(value))) if copy else (lambda value: value)
+        document = clone(entries[start]["checkpoint"])
+        for entry in entries[start + 1:position + 1]:
+            document = apply_patch(document, clone(entry["patch"]), in_place=True)
+        return document
+
+    @staticmethod
+    def _position(entries: List[Dict[str, Any]], version: Optional[VersionRef] = None,
+                  as_of: Any = None, checksum: Optional[str] = None) -> int:
+        """Index of the entry a version, time or record checksum selects, or -1."""
+        if checksum is not None:
+            for position in range(len(entries) - 1, -1, -1):
+                if entries[position].get("checksum") == checksum:
+                    return position
+            return -1
+        if version is not None:
+            for position in range(len(entries) - 1, -1, -1):
+                entry = entries[position]
+                if (entry["seq"] if isinstance(version, int) else entry["version"]) == version:
+                    return position
+            return -1
+        if as_of is None:
+            return len(entries) - 1
+        moment = sort_key(as_of)
+        if not isinstance(moment, datetime):
+            raise ValueError(f"Invalid timestamp: {as_of!r}")
+        position = -1
+        for index, entry in enumerate(entries):
+            if sort_key(entry["saved"]) <= moment:
+                position = index
+        return position
+
+    def history(self, actor_id: str) -> List[Dict[str, Any]]:
+        """Saved versions of an actor, oldest first: seq, version and saved time."""
+        entries, _ = self._entries(actor_id)
+        return [{"seq": entry["seq"], "version": entry["version"], "saved": entry["saved"]}
+                for entry in entries]
+
+    def get(self, actor_id: str, version: Optional[VersionRef] = None,
+            as_of: Any = None, checksum: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        An actor's document as saved in a version, or as it stood at a
+        time (its latest save at or before as_of; naive times are UTC), or
+        the save whose record had a checksum.
+
+        Returns:
+            Optional[Dict[str, Any]]: The document, or None if there is no
+            such version
+        """
+        entries, _ = self._entries(actor_id)
+        position = self._position(entries, version, as_of, checksum)
+        return self._rebuild(entries, position, copy=False) if position >= 0 else None
+
+    def diff(self, actor_id: str, v1: VersionRef, v2: VersionRef) -> Optional[List[Dict[str, Any]]]:
+        """
+        JSON Patch turning version v1 of an actor into version v2, or None
+        if either version does not exist.
+        """
+        entries, _ = self._entries(actor_id)
+        first, second = self._position(entries, v1), self._position(entries, v2)
+        if first < 0 or second < 0:
+            return None
+        return make_patch(self._rebuild(entries, first), self._rebuild(entries, second))
@@ -0,0 +1,174 @@
+import threading
+from typing import Dict, Optional
+
+from core.actor import ThreatActor
+from utils.locking import ConflictError
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class WriteBehindQueue:
+    """
+    Write-behind queue for ActorDatabase saves (see
+    ActorDatabase.write_behind()).
+
+    Saved actors are serialized by the saving thread, so changes it makes
+    to an actor after saving it are not written half-made, and held until
+    the next flush; saving an actor again before then only replaces the
+    pending entry, so it is written once in its latest state. A batch is
+    written as one storage batch (e.g. one directory fsync or one
+    transaction) by a background thread every interval seconds, and by the
+    saving thread once max_batch actors are pending. flush() and leaving the context manager
+    write everything pending and return once it is stored. get() returns
+    actors both pending and in a batch being written, so a save is visible
+    from put() until it can be read back from storage.
+    """
+
+    def __init__(self, database: "ActorDatabase", max_batch: int = 500,
+                 interval: Optional[float] = 1.0):
+        """
+        Args:
+            database: Database to write to
+            max_batch: Number of pending actors that triggers a flush
+            interval: Seconds between background flushes (None for none)
+        """
+        self.database = database
+        self.max_batch = max_batch
+        self.interval = interval
+        self.saves = 0
+        self.coalesced = 0
+        self.batches = 0
+        # Prepared saves (see ActorDatabase._prepare()) by actor ID.
+        self._pending: Dict[str, "PreparedSave"] = {}
+        # Batch being written by flush().
+        self._inflight: Dict[str, "PreparedSave"] = {}
+        self._lock = threading.Lock()
+        # Flushes run one at a time so batches are written in order.
+        self._flush_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flusher = None
+        if interval:
+            self._flusher = threading.Thread(target=self._flush_loop, name="write-behind", daemon=True)
+            self._flusher.start()
+
+    def put(self, actor: ThreatActor) -> None:
+        """Queue an actor to be saved, replacing a pending save of it."""
+        save = self.database._prepare(actor)
+        with self._lock:
+            self.saves += 1
+            previous = self._pending.get(actor.actor_id)
+            if previous is not None:
+                self.coalesced += 1
+                # History trimmed by the replaced save is still journaled.
+                save.evicted[:0] = previous.evicted
+            self._pending[actor.actor_id] = save
+            full = len(self._pending) >= self.max_batch
+        if full:
+            self.flush()
+
+    def get(self, actor_id: str) -> Optional[ThreatActor]:
+        """A pending actor (or one being written), or None."""
+        with self._lock:
+            save = self._pending.get(actor_id) or self._inflight.get(actor_id)
+            return save.actor if save is not None else None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def flush(self) -> bool:
+        """
+        Write all pending actors as one batch.
+
+        Returns:
+            bool: True if everything pending was saved; on failure the
+                batch stays queued for the next flush
+
+        Raises:
+            ConflictError: If other processes saved some of the actors
+                (see ActorDatabase); those are dropped from the queue, the
+                rest stay queued
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._inflight = batch
+            if not batch:
+                return True
+            # Failed saves are requeued before they stop being in flight,
+            # so get() sees them throughout.
+            try:
+                saved = self.database._save_prepared(list(batch.values()))
+                if not saved:
+                    self._requeue(batch)
+            except ConflictError as e:
+                self._requeue({actor_id: actor for actor_id, actor in batch.items()
+                               if actor_id not in e.conflicts})
+                raise
+            finally:
+                with self._lock:
+                    self._inflight = {}
+            if not saved:
+                return False
+            self.batches += 1
+            return True
+
+    def _requeue(self, batch: Dict[str, "PreparedSave"]) -> None:
+        with self._lock:
+            # Keep saves queued during the attempt, which are newer, with
+            # the history the failed ones trimmed.
+            for actor_id, save in batch.items():
+                newer = self._pending.get(actor_id)
+                if newer is None:
+                    self._pending[actor_id] = save
+                else:
+                    newer.evicted[:0] = save.evicted
+
+    def _flush_loop(self) -> None:
+        while not self._closed.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing write-behind queue: {str(e)}")
+
+    def close(self) -> bool:
+        """
+        Stop background flushing, flush and detach from the database.
+
+        Raises:
+            ConflictError: For all conflicting actors, once the others are
+                written
+        """
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        conflicts = {}
+        try:
+            while True:
+                try:
+                    saved = self.flush()
+                    break
+                except ConflictError as e:
+                    # The conflicting actors are dropped, so this ends.
+                    conflicts.update(e.conflicts)
+        finally:
+            if self.database.write_queue is self:
+                self.database.write_queue = None
+        if conflicts:
+            raise ConflictError(conflicts)
+        return saved
+
+    def __enter__(self) -> "WriteBehindQueue":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def stats(self) -> Dict[str, int]:
+        """Saves queued, saves coalesced into a pending one, batches written and pending count."""
+        with self._lock:
+            return {
+                "saves": self.saves,
+                "coalesced": self.coalesced,
+                "batches": self.batches,
+                "pending": len(self._pending)
+            }
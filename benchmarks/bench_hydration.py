@@ -0,0 +1,63 @@
+"""
+Full-load throughput of ActorDatabase.load_all(): serial (max_workers=1)
+against the reader-thread and process pool, on an indexed data directory
+(checksums known, so records skip schema validation), and the first open
+of a directory without index.log, which validates and indexes every record.
+
+    python benchmarks/bench_hydration.py --count 10000 --count 100000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from common import make_actors
+
+from utils.database import ActorDatabase
+from utils.storage import FileStorage
+
+def open_database(directory: Path) -> ActorDatabase:
+    return ActorDatabase(str(directory), storage=FileStorage(directory / "actors", fsync=False),
+                         cache_size=None)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, action="append",
+                        help="actors in the corpus (repeatable; default 10000)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="process pool size (default: CPU count)")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs")
+    for count in args.count or [10000]:
+        directory = Path(tempfile.mkdtemp(prefix="stasis-bench-"))
+        try:
+            db = open_database(directory)
+            db.save_actors(make_actors(count))
+            db.close()
+            print(f"{count} actors")
+
+            for label, workers in [("load_all, serial", 1), ("load_all, pool", args.workers)]:
+                db = open_database(directory)
+                db.actors.clear()
+                start = time.perf_counter()
+                report = db.load_all(max_workers=workers)
+                elapsed = time.perf_counter() - start
+                assert report.loaded == count and not report.errors, report.errors
+                db.close()
+                print(f"  {label:28s} {count / elapsed:8.0f} actors/s  {elapsed:7.1f} s")
+
+            (directory / "index.log").unlink()
+            start = time.perf_counter()
+            db = open_database(directory)
+            elapsed = time.perf_counter() - start
+            assert len(db.index) == count
+            db.close()
+            print(f"  {'first open, no index':28s} {count / elapsed:8.0f} actors/s  {elapsed:7.1f} s")
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Resident bytes per hydrated actor, measured with tracemalloc: the decoded
+JSON documents alone, ThreatActor objects (slotted, vocabulary interned)
+and ThreatActor objects with compact_uuids.
+
+    python benchmarks/bench_memory.py --count 10000 --count 100000
+"""
+import argparse
+import gc
+import tracemalloc
+
+from common import make_actors
+
+from core.actor import ThreatActor
+from core.serialization import loads, parse_datetime
+from core.validation import ValidationPolicy
+
+def measure(blobs, build) -> float:
+    """Traced bytes held by build(blob) results for all blobs, per blob."""
+    parse_datetime.cache_clear()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        held = [build(blob) for blob in blobs]
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del held
+    return size / len(blobs)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, action="append",
+                        help="actors in the corpus (repeatable; default 10000)")
+    parser.add_argument("--references", type=int, default=10, help="references per actor")
+    args = parser.parse_args()
+
+    modes = [
+        ("JSON documents", loads),
+        ("ThreatActor", lambda blob: ThreatActor.from_json_bytes(blob, ValidationPolicy.TRUSTED)),
+        ("ThreatActor, compact_uuids",
+         lambda blob: ThreatActor.from_json_bytes(blob, ValidationPolicy.TRUSTED, compact_uuids=True)),
+    ]
+    for count in args.count or [10000]:
+        # Only the serialized corpus stays alive between measurements.
+        blobs = [actor.to_json_bytes() for actor in make_actors(count, args.references)]
+        print(f"{count} actors, {args.references} references each")
+        for label, build in modes:
+            print(f"  {label:28s} {measure(blobs, build):8.0f} B/actor")
+
+if __name__ == "__main__":
+    main()
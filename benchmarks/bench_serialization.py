@@ -0,0 +1,54 @@
+"""
+Serialization throughput of ThreatActor: to_json_bytes() (fresh and
+cached) and from_json_bytes() under the strict and trusted validation
+policies, after checking that every actor round-trips byte for byte.
+
+    python benchmarks/bench_serialization.py --count 5000
+"""
+import argparse
+
+from common import best_of, make_actors
+
+from core.actor import ThreatActor
+from core.validation import ValidationPolicy
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=5000, help="actors in the corpus")
+    parser.add_argument("--references", type=int, default=10, help="references per actor")
+    args = parser.parse_args()
+
+    actors = make_actors(args.count, args.references)
+    blobs = [actor.to_json_bytes() for actor in actors]
+    for actor, blob in zip(actors, blobs):
+        loaded = ThreatActor.from_json_bytes(blob)
+        assert loaded == actor and loaded.to_json_bytes() == blob, actor.actor_id
+    print(f"{args.count} actors, {sum(map(len, blobs)) / len(blobs):.0f} bytes each, round trip ok")
+
+    def serialize_fresh():
+        for actor in actors:
+            actor._json = None
+            actor._sections.clear()
+            actor.metadata._cache = None
+            for reference in actor.references:
+                reference._cache = None
+            actor.to_json_bytes()
+
+    def serialize_cached():
+        for actor in actors:
+            actor.to_json_bytes()
+
+    results = [
+        ("to_json_bytes, fresh", serialize_fresh),
+        ("to_json_bytes, cached", serialize_cached),
+    ]
+    for policy in (ValidationPolicy.STRICT, ValidationPolicy.TRUSTED):
+        results.append((f"from_json_bytes, {policy.value}",
+                        lambda policy=policy: [ThreatActor.from_json_bytes(blob, policy) for blob in blobs]))
+
+    for label, function in results:
+        elapsed = best_of(function, repeat=3)
+        print(f"{label:28s} {args.count / elapsed:10.0f} actors/s  {elapsed / args.count * 1e6:8.1f} us/actor")
+
+if __name__ == "__main__":
+    main()
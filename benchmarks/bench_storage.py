@@ -0,0 +1,102 @@
+"""
+Save, get and search throughput of the record stores behind ActorDatabase
+(file, log and SQLite): raw single and batched writes and reads, then
+ActorDatabase.save_actors(), cold get_actor() and search_actors() on each.
+
+    python benchmarks/bench_storage.py --count 5000
+"""
+import argparse
+import shutil
+import tempfile
+from pathlib import Path
+
+from common import best_of, make_actors
+
+from utils.database import ActorDatabase
+from utils.indexes import Range
+from utils.storage import FileStorage, LogStorage, SQLiteStorage
+
+BACKENDS = {
+    "file": lambda directory, fsync: FileStorage(directory / "actors", fsync=fsync),
+    "log": lambda directory, fsync: LogStorage(directory / "log", fsync=fsync),
+    "sqlite": lambda directory, fsync: SQLiteStorage(directory / "stasis.db", fsync=fsync),
+}
+
+def report(label: str, count: int, elapsed: float) -> None:
+    print(f"  {label:31s} {count / elapsed:10.0f} ops/s  {elapsed / count * 1e6:8.1f} us/op")
+
+def bench_backend(name: str, actors, records, fsync: bool, root: Path) -> None:
+    print(f"{name} (fsync={'on' if fsync else 'off'})")
+    directory = root / name
+
+    def fresh():
+        shutil.rmtree(directory, ignore_errors=True)
+        return BACKENDS[name](directory, fsync)
+
+    def write_single():
+        storage = fresh()
+        for actor_id, content in records:
+            storage.write(actor_id, content)
+        storage.close()
+
+    def write_batched():
+        storage = fresh()
+        storage.write_many(records)
+        storage.close()
+
+    report("storage.write", len(records), best_of(write_single, repeat=3))
+    report("storage.write_many", len(records), best_of(write_batched, repeat=3))
+    storage = BACKENDS[name](directory, fsync)
+    report("storage.read", len(records),
+           best_of(lambda: [storage.read(actor_id) for actor_id, _ in records], repeat=3))
+    storage.close()
+
+    def save():
+        shutil.rmtree(directory, ignore_errors=True)
+        db = ActorDatabase(str(directory), storage=BACKENDS[name](directory, fsync),
+                           checkpoint_interval=None)
+        db.save_actors(actors)
+        db.close()
+
+    report("db.save_actors", len(actors), best_of(save, repeat=3))
+    db = ActorDatabase(str(directory), storage=BACKENDS[name](directory, fsync), checkpoint_interval=None)
+
+    def get_cold():
+        db.actors.clear()
+        for actor in actors:
+            db.get_actor(actor.actor_id)
+
+    report("db.get_actor, cold", len(actors), best_of(get_cold, repeat=3))
+    searches = [
+        {"capability_level": "Advanced"},
+        {"motivation": "Financial Gain", "confidence_level": Range(4, 5)},
+        {"target_sectors": "Energy"},
+    ]
+    for criteria in searches:
+        db.actors.clear()
+        matches = len(db.search_actors(criteria))
+        elapsed = best_of(lambda: db.search_actors(criteria), repeat=3)
+        print(f"  search {', '.join(criteria):24s} {elapsed * 1e3:10.1f} ms for {matches} matches")
+    db.close()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=5000, help="actors in the corpus")
+    parser.add_argument("--references", type=int, default=10, help="references per actor")
+    parser.add_argument("--fsync", action="store_true", help="sync writes on every backend")
+    parser.add_argument("--backend", choices=list(BACKENDS), action="append",
+                        help="backend to measure (repeatable; default all)")
+    args = parser.parse_args()
+
+    actors = make_actors(args.count, args.references)
+    records = [(actor.actor_id, actor.to_json_bytes()) for actor in actors]
+    print(f"{args.count} actors, {sum(len(content) for _, content in records) / len(records):.0f} bytes each")
+    root = Path(tempfile.mkdtemp(prefix="stasis-bench-"))
+    try:
+        for name in args.backend or BACKENDS:
+            bench_backend(name, actors, records, args.fsync, root)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
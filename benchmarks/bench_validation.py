@@ -0,0 +1,52 @@
+"""
+Per-actor cost of validate_actor_data()'s five section checks: with the
+schemas reloaded for every actor (what each call did before the shared
+registry), with a shared registry of Draft7Validators, and with the shared
+registry's generated validators.
+
+    python benchmarks/bench_validation.py --count 5000
+"""
+import argparse
+import tempfile
+
+from common import best_of, make_actors
+
+from core.validation import ACTOR_SECTIONS, SchemaRegistry, SchemaValidator
+
+def validate(validator: SchemaValidator, document) -> None:
+    for key, section in ACTOR_SECTIONS.items():
+        validator.validate_data(document[key], section)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=5000, help="actors in the corpus")
+    parser.add_argument("--reload-count", type=int, default=50,
+                        help="actors validated with per-call schema reloads (slow)")
+    args = parser.parse_args()
+
+    documents = [actor.to_dict() for actor in make_actors(args.count)]
+    reloaded = documents[:args.reload_count]
+    shared = SchemaValidator(SchemaRegistry(compile_validators=False))
+    with tempfile.TemporaryDirectory() as cache_dir:
+        compiled = SchemaValidator(SchemaRegistry(cache_dir=cache_dir))
+        # Warm up: load the schemas and build (or compile) every validator.
+        validate(shared, documents[0])
+        validate(compiled, documents[0])
+        assert all(compiled.registry.compiled(section) for section in ACTOR_SECTIONS.values())
+
+        results = [
+            ("reload per call", len(reloaded), lambda: [
+                validate(SchemaValidator(SchemaRegistry(compile_validators=False)), document)
+                for document in reloaded
+            ]),
+            ("shared Draft7Validator", len(documents), lambda: [validate(shared, d) for d in documents]),
+            ("shared, generated", len(documents), lambda: [validate(compiled, d) for d in documents]),
+        ]
+        baseline = None
+        for label, count, function in results:
+            per_actor = best_of(function, repeat=3) / count
+            baseline = baseline or per_actor
+            print(f"{label:24s} {per_actor * 1e6:10.1f} us/actor  {baseline / per_actor:8.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Cost of keeping actor versions (checkpoint_interval): bytes of the
+delta-encoded version logs against keeping a full copy of every save, save
+time with and without versions, and the latency of get_actor(as_of=...)
+and diff() reads.
+
+    python benchmarks/bench_versions.py --count 30 --saves 60 --interval 10 --interval 20
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from common import SECTORS, TACTICS, best_of, make_actors
+
+from core.reference import Reference
+from utils.database import ActorDatabase
+from utils.storage import FileStorage
+
+def change(actor, rng: random.Random, n: int) -> None:
+    """One edit of the kind enrichment makes, plus a version bump."""
+    kind = n % 5
+    if kind == 0:
+        actor.confidence_level = rng.randint(1, 5)
+    elif kind == 1:
+        actor.aliases = actor.aliases + [f"Alias {actor.actor_id}-{n}"]
+    elif kind == 2:
+        actor.references.append(Reference(source="Vendor Report", url=f"https://example.org/{actor.actor_id}/{n}",
+                                          title=f"Update {n}", fields_referenced=["aliases"]))
+    elif kind == 3:
+        actor.attack_patterns = actor.attack_patterns + [
+            {"technique_id": f"T{rng.randint(1000, 1600)}", "technique_name": "Technique",
+             "tactic": rng.choice(TACTICS)}
+        ]
+    else:
+        actor.target_sectors = rng.sample(SECTORS, rng.randint(1, 3))
+    actor.metadata.version_update("minor")
+
+def run(count: int, saves: int, interval, root: Path):
+    """Save every actor saves times; returns the database, full-copy bytes and seconds per save."""
+    directory = root / f"interval-{interval}"
+    db = ActorDatabase(str(directory), storage=FileStorage(directory / "actors", fsync=False),
+                       checkpoint_interval=interval)
+    actors = make_actors(count)
+    rng = random.Random(1)
+    full = 0
+    elapsed = 0.0
+    for n in range(saves):
+        for actor in actors:
+            if n:
+                change(actor, rng, n)
+            start = time.perf_counter()
+            db.save_actor(actor)
+            elapsed += time.perf_counter() - start
+            full += len(db.storage.read(actor.actor_id))
+    return db, full, elapsed / (count * saves)
+
+def directory_bytes(path: Path) -> int:
+    return sum(item.stat().st_size for item in path.rglob("*") if item.is_file())
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=30, help="actors in the corpus")
+    parser.add_argument("--saves", type=int, default=60, help="saves per actor")
+    parser.add_argument("--interval", type=int, action="append",
+                        help="checkpoint_interval to measure (repeatable; default 10, 20 and 50)")
+    args = parser.parse_args()
+
+    root = Path(tempfile.mkdtemp(prefix="stasis-bench-"))
+    try:
+        db, full, baseline = run(args.count, args.saves, None, root)
+        db.close()
+        print(f"{args.count} actors x {args.saves} saves, {full / (args.count * args.saves) / 1024:.1f} KB "
+              f"per record, full copies {full / 1e6:.2f} MB")
+        print(f"  {'no versions':16s} {'':26s} save {baseline * 1e6:7.0f} us")
+        for interval in args.interval or [10, 20, 50]:
+            db, full, per_save = run(args.count, args.saves, interval, root)
+            logs = directory_bytes(db.versions.directory)
+            actor_id = "TA000000"
+            versions = db.list_versions(actor_id)
+            middle = versions[len(versions) // 2]["saved"]
+            as_of = best_of(lambda: db.get_actor(actor_id, as_of=middle))
+            diff = best_of(lambda: db.diff(actor_id, 1, versions[-1]["seq"]))
+            db.close()
+            print(f"  interval {interval:<7d} logs {logs / 1e6:6.2f} MB ({logs / full:5.1%})  "
+                  f"save {per_save * 1e6:7.0f} us  as_of {as_of * 1e3:5.1f} ms  "
+                  f"diff(first, last) {diff * 1e3:5.1f} ms")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Shared setup of the benchmark scripts: app/ on the import path, quiet
+logging, a synthetic actor corpus and timing helpers.
+"""
+import logging
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'app'))
+
+from core.actor import ThreatActor  # noqa: E402
+from core.metadata import Metadata  # noqa: E402
+from core.reference import Reference  # noqa: E402
+
+# Saves and loads log every actor at INFO.
+logging.disable(logging.INFO)
+
+SECTORS = ["Energy", "Defense", "Financial", "Government", "Healthcare", "Technology", "Telecommunications"]
+TACTICS = ["initial-access", "execution", "persistence", "exfiltration"]
+SOURCES = ["MITRE ATT&CK", "AlienVault OTX", "Vendor Report", "CERT Advisory"]
+
+def make_actor(index: int, rng: random.Random, references: int = 10,
+               attack_patterns: int = 5) -> ThreatActor:
+    """A valid actor with the given number of references and techniques."""
+    start = datetime(2010, 1, 1) + timedelta(days=rng.randint(0, 4000))
+    actor = ThreatActor(
+        actor_id=f"TA{index:06d}",
+        name=f"Group {index}",
+        metadata=Metadata(tlp_level=rng.choice(["GREEN", "AMBER", "RED"])),
+        aliases=[f"Alias {index}-{n}" for n in range(rng.randint(0, 3))],
+        first_observed=start,
+        last_observed=rng.choice([None, start + timedelta(days=rng.randint(1, 3000))]),
+        confidence_level=rng.randint(1, 5),
+        capability_level=rng.choice(["Basic", "Intermediate", "Advanced"]),
+        tools_malware=[{"name": f"Tool {rng.randint(0, 50)}", "type": rng.choice(["RAT", "tool", "loader"])}
+                       for _ in range(rng.randint(0, 3))],
+        infrastructure={"domains": [f"c2-{index}.example.net"]},
+        target_sectors=rng.sample(SECTORS, rng.randint(1, 3)),
+        geographic_targeting={rng.choice(["USA", "GBR", "DEU", "JPN"]): {"confidence": 3}},
+        attack_patterns=[{"technique_id": f"T{rng.randint(1000, 1600)}", "technique_name": "Technique",
+                          "tactic": rng.choice(TACTICS)}
+                         for _ in range(attack_patterns)],
+        motivation=rng.choice(["Cyber Espionage", "Financial Gain", "Hacktivism"]),
+        goals=rng.sample(["Intelligence collection", "Revenue", "Disruption"], rng.randint(0, 2)),
+        relationships=[{"related_actor": f"TA{rng.randint(0, index + 1):06d}", "relationship_type": "shares-tools"}
+                       for _ in range(rng.randint(0, 2))],
+    )
+    for n in range(references):
+        actor.references.append(Reference(
+            source=rng.choice(SOURCES), url=f"https://example.org/reports/{index}/{n}",
+            title=f"Report {n}", date=start + timedelta(days=n), confidence=rng.randint(1, 5),
+            tags=["apt"], fields_referenced=["aliases"]
+        ))
+    return actor
+
+def make_actors(count: int, references: int = 10, attack_patterns: int = 5,
+                seed: int = 0) -> List[ThreatActor]:
+    """A reproducible corpus of count actors."""
+    rng = random.Random(seed)
+    return [make_actor(index, rng, references, attack_patterns) for index in range(count)]
+
+def best_of(function: Callable[[], object], repeat: int = 5) -> float:
+    """Fastest of repeat runs of function, in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)